@@ -167,11 +167,11 @@ INSTALLED_APPS = [
 # REST Framework settings and JWT Authentication
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.PermissionClaimsJWTAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.FlexiblePagination',
     'PAGE_SIZE': 25,
 }
 
@@ -190,7 +190,40 @@ SIMPLE_JWT = {
     # Refresh token settings for logout and rotation
     "ROTATE_REFRESH_TOKENS": True,
     "BLACKLIST_AFTER_ROTATION": True,
+    "TOKEN_OBTAIN_SERIALIZER": "users.serializers.PermissionTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "users.serializers.PermissionTokenRefreshSerializer",
 }
+# Embed the user's permission codes in access tokens (authorization without DB lookups).
+# Requires a shared cache backend so every process agrees on the RBAC version.
+RBAC_TOKEN_PERMISSIONS = os.getenv('RBAC_TOKEN_PERMISSIONS', 'False').lower() in ('true', '1', 't')
+
+# Cache
+# Local memory by default; point CACHE_BACKEND/CACHE_LOCATION to a shared backend
+# (e.g. Redis or Memcached) when running several processes or nodes.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# RBAC: lifetime (seconds) of a user's resolved permission codes in the cache
+RBAC_PERMISSION_CACHE_TTL = int(os.getenv('RBAC_PERMISSION_CACHE_TTL', 300))
+
+# Stats/timeline endpoints: lifetime (seconds) of a cached response. Entries are also
+# invalidated as soon as the underlying rows change.
+STATS_CACHE_TTL = int(os.getenv('STATS_CACHE_TTL', 300))
+# Persisted timelines not read for this many days are deleted by the `prune_timelines` command
+TIMELINE_SERIES_TTL_DAYS = int(os.getenv('TIMELINE_SERIES_TTL_DAYS', 30))
+
+# Global search autocomplete: per-process LRU cache of (scope, prefix) results
+SEARCH_AUTOCOMPLETE_CACHE_SIZE = int(os.getenv('SEARCH_AUTOCOMPLETE_CACHE_SIZE', 2048))
+SEARCH_AUTOCOMPLETE_CACHE_TTL = int(os.getenv('SEARCH_AUTOCOMPLETE_CACHE_TTL', 30))
+
+# History retention: simple-history rows older than this many days are moved to the
+# compressed HistoryArchive table by the `archive_history` command
+HISTORY_RETENTION_DAYS = int(os.getenv('HISTORY_RETENTION_DAYS', 365))
+HISTORY_ARCHIVE_BATCH_SIZE = int(os.getenv('HISTORY_ARCHIVE_BATCH_SIZE', 1000))
 
 # Email Configuration for Gmail
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -36,6 +36,7 @@ urlpatterns = [
     path('api/crm/', include('crm.urls')),
     path('api/sales/', include('sales.urls')),
     path('api/receivables/', include('receivables.urls')),
+    path('api/reporting/', include('reporting.urls')),
     
     path('api/login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/logout/', LogoutView.as_view(), name='logout'),
@@ -1,11 +1,22 @@
 """conftest.py"""
 import pytest
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from crm.models import Customer
+from core.services.search_services import autocomplete_cache
 from faker import Faker
 
 fake = Faker()
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """
+    Fixture to start every test with empty caches (primary keys are reused between tests).
+    """
+    cache.clear()
+    autocomplete_cache.clear()
+    yield
+
 @pytest.fixture
 def new_user(db):
     """
@@ -1,3 +1,29 @@
 from django.contrib import admin
+from .models import JobCheckpoint, SearchDocument, KpiRollup, TimelineSeries, HistoryArchive
 
-# Register your models here.
+@admin.register(JobCheckpoint)
+class JobCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('name', 'run_date', 'phase', 'last_pk', 'completed', 'updated_at')
+    readonly_fields = ('updated_at',)
+
+@admin.register(SearchDocument)
+class SearchDocumentAdmin(admin.ModelAdmin):
+    list_display = ('entity_type', 'object_id', 'title', 'status', 'commercial', 'portfolio')
+    list_filter = ('entity_type',)
+    search_fields = ('search_text',)
+
+@admin.register(KpiRollup)
+class KpiRollupAdmin(admin.ModelAdmin):
+    list_display = ('commercial', 'portfolio', 'day', 'sales_count', 'balance', 'overdue_count', 'collected', 'updated_at')
+    list_filter = ('day',)
+
+@admin.register(TimelineSeries)
+class TimelineSeriesAdmin(admin.ModelAdmin):
+    list_display = ('resource', 'granularity', 'dimension', 'materialized_until', 'last_used_at')
+    list_filter = ('resource', 'granularity')
+
+@admin.register(HistoryArchive)
+class HistoryArchiveAdmin(admin.ModelAdmin):
+    list_display = ('resource', 'history_id', 'object_id', 'history_type', 'history_date', 'archived_at')
+    list_filter = ('resource', 'history_type')
+    exclude = ('payload',)
@@ -0,0 +1,40 @@
+"""
+Management command to move simple-history rows older than the retention horizon
+(HISTORY_RETENTION_DAYS) to the compressed HistoryArchive table.
+Meant to run periodically (e.g. nightly); each batch is committed on its own, so an
+interrupted run simply resumes on the next one.
+"""
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services.history_services import archive_history, get_history_models
+
+class Command(BaseCommand):
+    help = "Archive historical rows older than the retention horizon"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help="Retention horizon in days (default: HISTORY_RETENTION_DAYS)")
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Rows moved per transaction (default: HISTORY_ARCHIVE_BATCH_SIZE)")
+        parser.add_argument('--model', action='append', dest='models', default=[],
+                            help="Only archive this history model, e.g. receivables.HistoricalDebt (repeatable)")
+
+    def handle(self, *args, **options):
+        models = None
+        if options['models']:
+            try:
+                models = [apps.get_model(label) for label in options['models']]
+            except (LookupError, ValueError) as exc:
+                raise CommandError(str(exc))
+            unknown = [model._meta.label for model in models if model not in get_history_models()]
+            if unknown:
+                raise CommandError(f"Not history models: {', '.join(unknown)}")
+
+        counts = archive_history(
+            retention_days=options['days'], batch_size=options['batch_size'], models=models
+        )
+        for label, count in counts.items():
+            if count:
+                self.stdout.write(f"  {label}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"✔️  {sum(counts.values())} history rows archived."))
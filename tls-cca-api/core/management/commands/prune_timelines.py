@@ -0,0 +1,20 @@
+"""
+Management command to delete the persisted timelines nobody read for
+TIMELINE_SERIES_TTL_DAYS, so series created for one-off filter combinations do
+not accumulate. Meant to run periodically (e.g. nightly); a pruned series is
+simply rebuilt if it is requested again.
+"""
+from django.core.management.base import BaseCommand
+
+from core.services.stats_services import prune_timeline_series
+
+class Command(BaseCommand):
+    help = "Delete persisted timelines not read recently"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help="Age in days of the last read (default: TIMELINE_SERIES_TTL_DAYS)")
+
+    def handle(self, *args, **options):
+        deleted = prune_timeline_series(max_age_days=options['days'])
+        self.stdout.write(self.style.SUCCESS(f"✔️  {deleted} timeline series pruned."))
@@ -0,0 +1,16 @@
+"""
+Management command to recompute the dashboard KPI rollups from the source tables.
+Must be run once right after deployment to seed the table, and after data was
+modified outside the app. The nightly `update_financial_statuses` job only
+reconciles the days of the debts whose status it changed.
+"""
+from django.core.management.base import BaseCommand
+
+from core.services.kpi_services import rebuild_kpi_rollups
+
+class Command(BaseCommand):
+    help = "Rebuild the KpiRollup rows (one per commercial, portfolio and day)"
+
+    def handle(self, *args, **options):
+        rows = rebuild_kpi_rollups()
+        self.stdout.write(self.style.SUCCESS(f"✔️  {rows} KPI rollup rows rebuilt."))
@@ -0,0 +1,19 @@
+"""
+Management command to recreate the global search documents from the source tables,
+e.g. after the table was added or after data was modified outside the app.
+"""
+from django.core.management.base import BaseCommand
+
+from core.services.search_index_services import rebuild_search_index
+
+class Command(BaseCommand):
+    help = "Rebuild the SearchDocument table (customers, credit sales, debts)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows indexed per batch.")
+
+    def handle(self, *args, **options):
+        counts = rebuild_search_index(batch_size=options['batch_size'])
+        for entity_type, count in counts.items():
+            self.stdout.write(f"{entity_type}: {count}")
+        self.stdout.write(self.style.SUCCESS("✔️  Search index rebuilt."))
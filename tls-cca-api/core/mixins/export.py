@@ -0,0 +1,71 @@
+import tempfile
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from core.services import export_services
+
+
+class ExportMixin:
+    """
+    Mixin to add an 'export' action streaming the filtered list as CSV (or XLSX).
+    The ViewSet must define:
+    - export_fields: list of (column header, field path) tuples, e.g. ('customer', 'sale__customer__display_name')
+    - export_owner_fields: field paths of the owning commercial; users without
+      `dashboard.view_all_stats` only export rows they own (optional)
+
+    Rows are read as tuples through a server-side cursor (`iterator(chunk_size=...)`)
+    and written one by one, so memory stays flat whatever the number of rows.
+    CSV is streamed as it is written; XLSX is built in a temporary file first and
+    is only offered when openpyxl is installed (501 Not Implemented otherwise).
+    """
+    export_fields = []
+    export_owner_fields = ()
+
+    def get_export_rows(self):
+        queryset = export_services.scope_to_owner(
+            self.filter_queryset(self.get_queryset()), self.export_owner_fields, self.request.user
+        )
+        return export_services.iter_export_rows(queryset, self.export_fields)
+
+    def _export_filename(self, extension):
+        return f"{self.resource or 'export'}_{timezone.localdate():%Y%m%d}.{extension}"
+
+    def _xlsx_response(self, rows):
+        if not export_services.XLSX_AVAILABLE:
+            return Response(
+                {"detail": "XLSX export is not available on this server (openpyxl is not installed)."},
+                status=status.HTTP_501_NOT_IMPLEMENTED
+            )
+        # The workbook is complete only after the last row: written to disk, then served
+        output = tempfile.TemporaryFile()
+        export_services.write_xlsx(rows, self.export_fields, output)
+        output.seek(0)
+        return FileResponse(output, as_attachment=True, filename=self._export_filename('xlsx'))
+
+    @extend_schema(
+        summary="Export the filtered list (CSV or XLSX)",
+        parameters=[OpenApiParameter(
+            name='file_format', type=str, enum=export_services.EXPORT_FORMATS, description="Default: csv"
+        )],
+        responses={(200, 'text/csv'): bytes},
+    )
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in ('csv', 'xlsx'):
+            return Response(
+                {"file_format": f"Must be one of: {', '.join(export_services.EXPORT_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        rows = self.get_export_rows()
+        if file_format == 'xlsx':
+            return self._xlsx_response(rows)
+        response = StreamingHttpResponse(
+            export_services.iter_csv_lines(rows, self.export_fields), content_type='text/csv'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{self._export_filename("csv")}"'
+        return response
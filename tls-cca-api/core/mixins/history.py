@@ -0,0 +1,64 @@
+from rest_framework.exceptions import ValidationError
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from core.services import history_services
+
+
+class HistoryArchiveMixin:
+    """
+    Mixin for history list views, reading the rows moved to HistoryArchive by the
+    retention job (see `archive_history`) on demand:
+    - ?archive=exclude (default): live history rows only
+    - ?archive=include: live rows, then archived ones
+    - ?archive=only: archived rows only
+
+    Per-object history views set `history_object_kwarg` to the URL kwarg holding the
+    tracked object's id. Views that scope their rows any further (get_queryset,
+    filters) must apply the same scope to the archive in `get_archive_queryset`;
+    otherwise the archive modes are refused, not answered with unscoped rows.
+
+    Detail (retrieve) reads only see live rows: an archived history id returns 404.
+    """
+    archive_query_param = 'archive'
+    archive_modes = ('exclude', 'include', 'only')
+    history_object_kwarg = None
+
+    def get_archive_mode(self):
+        mode = self.request.query_params.get(self.archive_query_param, 'exclude')
+        if mode not in self.archive_modes:
+            raise ValidationError({self.archive_query_param: f"Must be one of {', '.join(self.archive_modes)}."})
+        return mode
+
+    def get_archive_queryset(self, model):
+        """Archived rows matching the view's scope: by default, its tracked object (if any)."""
+        object_id = self.kwargs.get(self.history_object_kwarg) if self.history_object_kwarg else None
+        return history_services.get_archive_queryset(model, object_id)
+
+    def _is_archive_scoped(self):
+        # Filters the archive cannot reproduce, unless the view maps them itself
+        if type(self).get_archive_queryset is not HistoryArchiveMixin.get_archive_queryset:
+            return True
+        return not any(
+            getattr(self, name, None) for name in ('filterset_class', 'filterset_fields', 'search_fields')
+        )
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if getattr(self, 'action', 'list') != 'list':
+            return queryset
+        mode = self.get_archive_mode()
+        if mode == 'exclude':
+            return queryset
+        if not self._is_archive_scoped():
+            raise ValidationError({self.archive_query_param: "Archived rows are not available on this view."})
+        return history_services.ArchivedHistoryList(
+            queryset.model,
+            None if mode == 'only' else queryset,
+            self.get_archive_queryset(queryset.model),
+        )
+
+    @extend_schema(parameters=[
+        OpenApiParameter('archive', str, enum=['exclude', 'include', 'only'],
+                         description="Whether to read the archived history rows (default: exclude)"),
+    ])
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
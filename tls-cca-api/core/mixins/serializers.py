@@ -1,6 +1,7 @@
 # core/mixins/serializers_mixins.py
 from rest_framework import serializers
 from drf_spectacular.utils import extend_schema_field
+from core.services import history_services
 
 class HistoricalChangesMixin(serializers.Serializer):
     """
@@ -12,16 +13,27 @@ class HistoricalChangesMixin(serializers.Serializer):
     history_type_display = serializers.CharField(source='get_history_type_display', read_only=True)
     changes = serializers.SerializerMethodField()
 
+    def to_representation(self, instance):
+        # Within a list, fetch the predecessors of the whole page in one go
+        if not hasattr(instance, history_services.PREV_RECORD_ATTR):
+            records = self.parent.instance if isinstance(self.parent, serializers.ListSerializer) else None
+            records = list(records) if records is not None else []
+            history_services.prefetch_prev_records(records if instance in records else [instance])
+        return super().to_representation(instance)
+
     @extend_schema_field(serializers.DictField())
     def get_changes(self, obj):
         """
         Return the modified fields and their old/new values
         for objects with a change type of '~' (modification).
         """
-        if obj.history_type != '~' or not hasattr(obj, 'prev_record'):
+        if obj.history_type != '~':
+            return None
+        prev_record = history_services.get_prev_record(obj)
+        if prev_record is None:
             return None
 
-        delta = obj.diff_against(obj.prev_record)
+        delta = obj.diff_against(prev_record)
         changes = {}
         for change in delta.changes:
             changes[change.field] = {
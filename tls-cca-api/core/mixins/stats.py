@@ -1,6 +1,10 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from drf_spectacular.utils import extend_schema
+from drf_spectacular.utils import extend_schema, OpenApiParameter
 from core.services import stats_services
 
 class StatsMixin:
@@ -11,27 +15,133 @@ class StatsMixin:
     - timeline_date_field: str (field name for grouping)
     - timeline_amount_field: str (field name for summing)
     - timeline_amount_alias: str (optional, default 'total_amount')
+    - stats_cache_models: models whose writes invalidate the cached responses
+      (optional, default: the queryset's model)
+    - timeline_live_filters: filters on mutable fields (e.g. statuses); timelines
+      requested with them are always aggregated live (optional). Filters across a
+      relation (e.g. `sale__commercial`) are always live too: writes to the related
+      rows do not invalidate the persisted series.
+
+    Responses are cached per (viewset, user scope, filter params) until one of
+    `stats_cache_models` changes or STATS_CACHE_TTL expires, and carry an ETag and
+    Last-Modified so polling clients get 304 Not Modified.
+
+    The timeline accepts a `granularity` (day, week, month, quarter); its closed
+    periods are persisted (see stats_services.calculate_timeline), per validated
+    filterset values: other query parameters are ignored.
     """
     stats_aggregates = {}
     timeline_date_field = None
     timeline_amount_field = None
     timeline_amount_alias = 'total_amount'
+    stats_cache_models = None
+    timeline_live_filters = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        queryset = getattr(cls, 'queryset', None)
+        if cls.timeline_date_field and queryset is not None:
+            stats_services.register_timeline(queryset.model, cls.timeline_date_field, cls.timeline_amount_field)
+
+    def get_stats_cache_scope(self):
+        """Part of the cache key identifying which rows the user can see."""
+        user = self.request.user
+        if user.is_superuser or user.has_permission('dashboard.view_all_stats'):
+            return 'all'
+        return f'user:{user.pk}'
+
+    def get_timeline_filters(self, queryset):
+        """
+        Validated, non-empty values of the filterset fields of the request, or None
+        when the timeline must be aggregated live (see `timeline_live_filters`).
+        """
+        filterset_class = getattr(self, 'filterset_class', None)
+        if filterset_class is None:
+            return {}
+        filterset = filterset_class(data=self.request.query_params, queryset=queryset, request=self.request)
+        if not filterset.is_valid():
+            return None
+        values = {
+            name: value for name, value in filterset.form.cleaned_data.items()
+            if value not in (None, '', [], ())
+        }
+        live = set(self.timeline_live_filters) | {
+            name for name, field in filterset.filters.items() if '__' in (field.field_name or '')
+        }
+        if live & values.keys():
+            return None
+        return values
+
+    def _cached_stats_response(self, request, compute):
+        models = self.stats_cache_models or [self.get_queryset().model]
+        key = stats_services.get_stats_cache_key(
+            f"{type(self).__module__}.{type(self).__name__}.{self.action}",
+            self.get_stats_cache_scope(),
+            models,
+            request.query_params,
+        )
+        entry = cache.get(key)
+        if entry is None:
+            entry = stats_services.build_stats_cache_entry(compute())
+            cache.set(key, entry, timeout=settings.STATS_CACHE_TTL)
+
+        headers = {
+            'ETag': entry['etag'],
+            'Last-Modified': http_date(entry['last_modified']),
+            'Cache-Control': 'private, no-cache',
+        }
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            etags = {etag.strip().removeprefix('W/') for etag in if_none_match.split(',')}
+            not_modified = '*' in etags or entry['etag'] in etags
+        else:
+            since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+            not_modified = since is not None and entry['last_modified'] <= since
+        if not_modified:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(entry['data'], headers=headers)
 
     @extend_schema(summary="Get aggregated stats for filtered list")
     @action(detail=False, methods=['get'])
     def stats(self, request):
-        queryset = self.filter_queryset(self.get_queryset())
-        stats = stats_services.calculate_stats(queryset, self.stats_aggregates)
-        return Response(stats)
+        def compute():
+            queryset = self.filter_queryset(self.get_queryset())
+            return stats_services.calculate_stats(queryset, self.stats_aggregates)
+        return self._cached_stats_response(request, compute)
 
-    @extend_schema(summary="Get evolution over time")
+    @extend_schema(
+        summary="Get evolution over time",
+        parameters=[OpenApiParameter(
+            name='granularity', type=str, enum=stats_services.TIMELINE_GRANULARITIES,
+            description="Period of each point (default: month)"
+        )],
+    )
     @action(detail=False, methods=['get'])
     def timeline(self, request):
-        queryset = self.filter_queryset(self.get_queryset())
-        data = stats_services.calculate_timeline(
-            queryset, 
-            self.timeline_date_field, 
-            self.timeline_amount_field,
-            self.timeline_amount_alias
-        )
-        return Response(list(data))
\ No newline at end of file
+        granularity = request.query_params.get('granularity', 'month')
+        if granularity not in stats_services.TIMELINE_GRANULARITIES:
+            return Response(
+                {"granularity": f"Must be one of: {', '.join(stats_services.TIMELINE_GRANULARITIES)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        def compute():
+            # Raises a 400 on invalid filter values
+            queryset = self.filter_queryset(self.get_queryset())
+            filters = self.get_timeline_filters(self.get_queryset())
+            dimension = None
+            if filters is not None:
+                dimension = stats_services.get_timeline_dimension(
+                    f"{type(self).__module__}.{type(self).__name__}",
+                    self.get_stats_cache_scope(),
+                    filters,
+                )
+            return stats_services.calculate_timeline(
+                queryset, 
+                self.timeline_date_field, 
+                self.timeline_amount_field,
+                self.timeline_amount_alias,
+                granularity=granularity,
+                dimension=dimension,
+            )
+        return self._cached_stats_response(request, compute)
@@ -0,0 +1,188 @@
+""" Core Models """
+from django.db import models
+from django.conf import settings
+from django.utils import timezone
+
+
+class JobCheckpoint(models.Model):
+    """
+    Progress marker of a long-running batch job, so an interrupted run can resume
+    where it stopped instead of starting over.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    run_date = models.DateField()
+    phase = models.CharField(max_length=50, blank=True)
+    last_pk = models.BigIntegerField(default=0)
+    counts = models.JSONField(default=dict, blank=True)
+    completed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Job checkpoint"
+        verbose_name_plural = "Job checkpoints"
+
+    def __str__(self):
+        state = "completed" if self.completed else f"{self.phase or 'pending'} @ {self.last_pk}"
+        return f"{self.name} ({self.run_date}: {state})"
+
+
+class SearchDocument(models.Model):
+    """
+    Denormalized, searchable copy of a customer, credit sale or debt, with the owners
+    used for RBAC scoping, so global search is a single indexed query.
+    Maintained incrementally by core.signals and core.services.search_index_services.
+    """
+    TYPE_CUSTOMER = 'customer'
+    TYPE_SALE = 'sale'
+    TYPE_DEBT = 'debt'
+    TYPE_CHOICES = [
+        (TYPE_CUSTOMER, 'Customer'),
+        (TYPE_SALE, 'Credit sale'),
+        (TYPE_DEBT, 'Debt'),
+    ]
+
+    entity_type = models.CharField(max_length=10, choices=TYPE_CHOICES)
+    object_id = models.BigIntegerField()
+    title = models.CharField(max_length=255)
+    subtitle = models.CharField(max_length=255, blank=True)
+    # Lower-cased concatenation of every searchable value of the entity
+    search_text = models.TextField()
+    # Lower-cased name the entity is listed under, for prefix (autocomplete) lookups
+    name_key = models.CharField(max_length=255, blank=True)
+    amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    status = models.CharField(max_length=30, blank=True)
+    commercial = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL,
+        null=True, blank=True, related_name='+', db_constraint=False
+    )
+    portfolio = models.ForeignKey(
+        'crm.Portfolio', on_delete=models.SET_NULL,
+        null=True, blank=True, related_name='+', db_constraint=False
+    )
+    sort_date = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Search document"
+        verbose_name_plural = "Search documents"
+        constraints = [
+            models.UniqueConstraint(fields=['entity_type', 'object_id'], name='unique_search_document'),
+        ]
+        indexes = [
+            models.Index(fields=['commercial', 'entity_type']),
+            models.Index(fields=['portfolio', 'entity_type']),
+            models.Index(fields=['name_key'], name='search_document_name_key', opclasses=['varchar_pattern_ops']),
+        ]
+
+    def __str__(self):
+        return f"{self.entity_type} #{self.object_id}: {self.title}"
+
+
+class KpiRollup(models.Model):
+    """
+    Dashboard KPIs of one (commercial, portfolio) pair for one day: one row per pair
+    and day. Adjusted in place by the services that move the figures and reconciled
+    per day by the nightly status job, so the dashboard sums these rows instead of
+    aggregating every sale, debt and recovery. See core.services.kpi_services.
+    """
+    commercial = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    portfolio = models.ForeignKey('crm.Portfolio', on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    # portfolio_id, or 0 without portfolio: NULLs never conflict in a unique constraint
+    portfolio_key = models.BigIntegerField(default=0)
+    # The sale's day for sales and debt figures, the payment's day for collected amounts
+    day = models.DateField(db_index=True)
+    sales_volume = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    sales_count = models.IntegerField(default=0)
+    approved_count = models.IntegerField(default=0)
+    initial_debt = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    overdue_count = models.IntegerField(default=0)
+    collected = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "KPI rollup"
+        verbose_name_plural = "KPI rollups"
+        constraints = [
+            models.UniqueConstraint(fields=['commercial', 'portfolio_key', 'day'], name='unique_kpi_rollup'),
+        ]
+
+    def __str__(self):
+        return f"KPIs — commercial #{self.commercial_id}, portfolio #{self.portfolio_id}, {self.day}"
+
+
+class TimelineSeries(models.Model):
+    """
+    A timeline (sum of an amount per period) of one resource for one scope and set
+    of filters. Its closed periods are persisted as TimelineBucket rows up to
+    `materialized_until`; only the open period is aggregated live. Series not read
+    for TIMELINE_SERIES_TTL_DAYS are pruned (`last_used_at`).
+    See core.services.stats_services.calculate_timeline.
+    """
+    resource = models.CharField(max_length=100, help_text="Model label, e.g. receivables.recovery")
+    dimension = models.CharField(max_length=64, help_text="Hash of the view, user scope and filters")
+    granularity = models.CharField(max_length=10)
+    materialized_until = models.DateField(null=True, blank=True)
+    # Refreshed at most daily by the reads, see stats_services.prune_timeline_series
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = "Timeline series"
+        verbose_name_plural = "Timeline series"
+        constraints = [
+            models.UniqueConstraint(fields=['resource', 'dimension', 'granularity'], name='unique_timeline_series'),
+        ]
+
+    def __str__(self):
+        return f"{self.resource} by {self.granularity} ({self.dimension[:8]})"
+
+
+class TimelineBucket(models.Model):
+    """Total of a closed period of a TimelineSeries."""
+    series = models.ForeignKey(TimelineSeries, on_delete=models.CASCADE, related_name='buckets')
+    period_start = models.DateField()
+    total = models.DecimalField(max_digits=16, decimal_places=2)
+
+    class Meta:
+        verbose_name = "Timeline bucket"
+        verbose_name_plural = "Timeline buckets"
+        ordering = ['period_start']
+        constraints = [
+            models.UniqueConstraint(fields=['series', 'period_start'], name='unique_timeline_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.series} {self.period_start}: {self.total}"
+
+
+class HistoryArchive(models.Model):
+    """
+    A simple-history row moved out of its historical table by the retention job,
+    its field values stored as zlib-compressed JSON.
+    See core.services.history_services.archive_history.
+    """
+    resource = models.CharField(max_length=100, help_text="History model label, e.g. receivables.historicaldebt")
+    history_id = models.BigIntegerField()
+    object_id = models.BigIntegerField()
+    history_date = models.DateTimeField()
+    history_type = models.CharField(max_length=1)
+    history_user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING,
+        null=True, blank=True, db_constraint=False, related_name='+'
+    )
+    payload = models.BinaryField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "History archive"
+        verbose_name_plural = "History archives"
+        ordering = ['-history_date', '-history_id']
+        constraints = [
+            models.UniqueConstraint(fields=['resource', 'history_id'], name='unique_history_archive'),
+        ]
+        indexes = [
+            models.Index(fields=['resource', 'object_id', 'history_date']),
+            models.Index(fields=['resource', 'history_date']),
+        ]
+
+    def __str__(self):
+        return f"{self.resource} #{self.history_id} ({self.history_date:%Y-%m-%d})"
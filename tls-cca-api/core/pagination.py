@@ -0,0 +1,139 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from django.db import connections
+from django.db.models import F, Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+
+class FlexiblePagination(PageNumberPagination):
+    """
+    Default pagination: page numbers, or keyset (cursor) pages on request.
+
+    Keyset mode is used when the request passes `?pagination=keyset` or a `cursor`,
+    or when the view sets `pagination_mode = 'keyset'`. Rows are ordered by the first
+    field of the view's ordering (`keyset_ordering`, else the queryset's / model's
+    ordering, e.g. '-sale_date') with the primary key as tie-breaker, and the next page
+    starts after the (value, pk) of the last row: no OFFSET and no COUNT(*).
+    The total is only computed with `?count=exact`, or estimated with `?count=estimate`
+    (query planner estimate on PostgreSQL).
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    count_query_param = 'count'
+
+    def is_keyset(self, request, view):
+        return (
+            request.query_params.get(self.mode_query_param) == 'keyset'
+            or self.cursor_query_param in request.query_params
+            or getattr(view, 'pagination_mode', None) == 'keyset'
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Keyset pages need a queryset (e.g. not a history list including the archive)
+        self.keyset = self.is_keyset(request, view) and isinstance(queryset, QuerySet)
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        field, descending = self.get_keyset_ordering(queryset, view)
+        self.keyset_field = field
+        order = F(field).desc(nulls_last=True) if descending else F(field).asc(nulls_last=True)
+        ordered = queryset.order_by(order, '-pk' if descending else 'pk')
+
+        self.count = self.get_keyset_count(ordered, request.query_params.get(self.count_query_param))
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            ordered = ordered.filter(self.keyset_filter(queryset.model, field, descending, cursor))
+
+        rows = list(ordered[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page_rows = rows[:page_size]
+        return self.page_rows
+
+    def get_keyset_ordering(self, queryset, view):
+        ordering = (
+            getattr(view, 'keyset_ordering', None)
+            or queryset.query.order_by
+            or queryset.model._meta.ordering
+            or ['pk']
+        )
+        field = next((item for item in ordering if isinstance(item, str)), 'pk')
+        name = field.lstrip('-')
+        if name == 'pk':
+            name = queryset.model._meta.pk.name  # 'pk' is an alias, not a field get_field() knows
+        return name, field.startswith('-')
+
+    def keyset_filter(self, model, field, descending, cursor):
+        try:
+            value, pk = json.loads(urlsafe_b64decode(cursor.encode()))
+            if value is not None:
+                value = model._meta.get_field(field).to_python(value)
+        except Exception:
+            raise NotFound("Invalid cursor.")
+        after = '__lt' if descending else '__gt'
+        if value is None:
+            # NULLs are sorted last: only the remaining NULL rows follow
+            return Q(**{f"{field}__isnull": True, f"pk{after}": pk})
+        return (
+            Q(**{f"{field}{after}": value})
+            | Q(**{field: value, f"pk{after}": pk})
+            | Q(**{f"{field}__isnull": True})
+        )
+
+    def encode_cursor(self, row):
+        value = getattr(row, self.keyset_field)
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()  # Full precision: the next page compares on equality
+        elif value is not None and not isinstance(value, (int, str)):
+            value = str(value)
+        return urlsafe_b64encode(json.dumps([value, row.pk]).encode()).decode()
+
+    def get_keyset_count(self, queryset, mode):
+        if mode == 'exact':
+            return queryset.count()
+        if mode == 'estimate':
+            if connections[queryset.db].vendor == 'postgresql':
+                plan = json.loads(queryset.order_by().explain(format='json'))
+                return plan[0]['Plan']['Plan Rows']
+            return queryset.count()
+        return None
+
+    def get_next_link(self):
+        if not getattr(self, 'keyset', False):
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page_rows[-1]))
+
+    def get_paginated_response(self, data):
+        if not getattr(self, 'keyset', False):
+            return super().get_paginated_response(data)
+        payload = {'next': self.get_next_link(), 'results': data}
+        if self.count is not None:
+            payload = {'count': self.count, **payload}
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        response = super().get_paginated_response_schema(schema)
+        response['required'] = ['results']
+        return response
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {'name': self.mode_query_param, 'required': False, 'in': 'query',
+             'description': "'keyset' for cursor pagination (no COUNT, no OFFSET).",
+             'schema': {'type': 'string', 'enum': ['page', 'keyset']}},
+            {'name': self.cursor_query_param, 'required': False, 'in': 'query',
+             'description': "Keyset cursor, from the 'next' link.", 'schema': {'type': 'string'}},
+            {'name': self.count_query_param, 'required': False, 'in': 'query',
+             'description': "Keyset mode: include the total ('exact') or an estimate ('estimate').",
+             'schema': {'type': 'string', 'enum': ['exact', 'estimate']}},
+        ]
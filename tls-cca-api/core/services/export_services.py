@@ -0,0 +1,64 @@
+"""
+Row-by-row exports of querysets (CSV, XLSX), shared by the export endpoints
+(core.mixins.export) and the report job worker (reporting).
+"""
+import csv
+import importlib.util
+from django.db.models import Q
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+def scope_to_owner(queryset, owner_fields, user):
+    """
+    Restricts the rows to those owned by the user (any of `owner_fields`), unless the
+    user has the global view (same rule as stats_services.get_global_stats).
+    """
+    if not owner_fields or user.is_superuser or user.has_permission('dashboard.view_all_stats'):
+        return queryset
+    scope = Q()
+    for field in owner_fields:
+        scope |= Q(**{field: user})
+    return queryset.filter(scope)
+
+
+def iter_export_rows(queryset, export_fields):
+    """Yields the export columns of each row as a tuple, through a server-side cursor."""
+    paths = [path for _, path in export_fields]
+    return queryset.prefetch_related(None).values_list(*paths).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+class _Echo:
+    """File-like object whose write() returns the value, so csv.writer output can be streamed."""
+    def write(self, value):
+        return value
+
+
+def iter_csv_lines(rows, export_fields):
+    """Yields the CSV lines (header first) of the rows, one at a time."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow([header for header, _ in export_fields])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+# openpyxl is an optional dependency: XLSX exports are only offered when it is installed
+XLSX_AVAILABLE = importlib.util.find_spec('openpyxl') is not None
+EXPORT_FORMATS = ['csv', 'xlsx'] if XLSX_AVAILABLE else ['csv']
+
+
+def write_xlsx(rows, export_fields, output):
+    """
+    Writes the rows to `output` as an XLSX workbook. Write-only workbooks keep a
+    constant memory footprint, but the archive is only complete once every row is
+    written: unlike CSV, it cannot be streamed while the rows are read.
+    Raises ImportError when openpyxl is not installed (see XLSX_AVAILABLE).
+    """
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append([header for header, _ in export_fields])
+    for row in rows:
+        # Excel has no time zones
+        sheet.append([value.replace(tzinfo=None) if getattr(value, 'tzinfo', None) else value for value in row])
+    workbook.save(output)
@@ -0,0 +1,272 @@
+import json
+import zlib
+from collections import defaultdict
+from datetime import timedelta
+from django.apps import apps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import FileField, OuterRef, Q, Subquery, prefetch_related_objects
+from django.utils import timezone
+from core.models import HistoryArchive
+
+PREV_RECORD_ATTR = '_prev_record'
+# Columns kept in clear on HistoryArchive rather than in its payload
+ARCHIVE_COLUMNS = ('history_id', 'history_date', 'history_type', 'history_user_id')
+
+def _match_predecessors(records, rows, object_id) -> list:
+    """
+    Sets on each record the latest of `rows` of the same object dated before it, and
+    returns the records left without one. `rows` must hold exactly predecessors of the
+    records, so the latest earlier one of an object is the immediate predecessor.
+    """
+    by_object = defaultdict(list)
+    for row in sorted(rows, key=lambda row: (row.history_date, row.history_id)):
+        by_object[object_id(row)].append(row)
+    unmatched = []
+    for record in records:
+        candidates = [row for row in by_object[object_id(record)] if row.history_date < record.history_date]
+        setattr(record, PREV_RECORD_ATTR, candidates[-1] if candidates else None)
+        if not candidates:
+            unmatched.append(record)
+    return unmatched
+
+def prefetch_prev_records(records) -> None:
+    """
+    Attaches to each history record (of a single history model, e.g. a page) its
+    predecessor and its history_user, so that diffs can be computed in memory.
+
+    The predecessors of the modification ('~') records are fetched with one query per
+    table: the history ids of the previous rows are resolved by a correlated subquery,
+    and the fetched rows are matched back to their successors by object id and date.
+    Predecessors moved to the archive (see `archive_history`) are looked up there, with
+    one more query only when the page needs it.
+    """
+    records = [record for record in records if not hasattr(record, PREV_RECORD_ATTR)]
+    if not records:
+        return
+    model = type(records[0])
+    pk_name = model.instance_type._meta.pk.attname
+    prefetch_related_objects(records, 'history_user')
+
+    for record in records:
+        setattr(record, PREV_RECORD_ATTR, None)
+    changed = [record for record in records if record.history_type == '~']
+    live = [record for record in changed if not getattr(record, 'is_archived', False)]
+
+    orphans = []
+    if live:
+        previous = (
+            model._default_manager
+            .filter(**{pk_name: OuterRef(pk_name)}, history_date__lt=OuterRef('history_date'))
+            .order_by('-history_date', '-history_id')
+            .values('history_id')[:1]
+        )
+        prev_ids = (
+            model._default_manager
+            .filter(history_id__in=[record.history_id for record in live])
+            .annotate(prev_history_id=Subquery(previous))
+            .values('prev_history_id')
+        )
+        orphans = _match_predecessors(
+            live, model._default_manager.filter(history_id__in=prev_ids), lambda row: getattr(row, pk_name)
+        )
+
+    # Archived records have archived predecessors; archived rows being older than every
+    # live row, the predecessor of a live row with none left is the object's latest archived row
+    archived = [record for record in changed if getattr(record, 'is_archived', False)]
+    if not (orphans or archived):
+        return
+    resource = model._meta.label_lower
+    condition = Q()
+    if archived:
+        previous = (
+            HistoryArchive.objects
+            .filter(resource=resource, object_id=OuterRef('object_id'), history_date__lt=OuterRef('history_date'))
+            .order_by('-history_date', '-history_id')
+            .values('history_id')[:1]
+        )
+        condition |= Q(history_id__in=(
+            HistoryArchive.objects
+            .filter(resource=resource, history_id__in=[record.history_id for record in archived])
+            .annotate(prev_history_id=Subquery(previous))
+            .values('prev_history_id')
+        ))
+    if orphans:
+        latest = (
+            HistoryArchive.objects
+            .filter(resource=resource, object_id=OuterRef('object_id'))
+            .order_by('-history_date', '-history_id')
+            .values('history_id')[:1]
+        )
+        condition |= Q(object_id__in={getattr(record, pk_name) for record in orphans}, history_id=Subquery(latest))
+    rows = [
+        restore_history_record(model, row)
+        for row in HistoryArchive.objects.filter(condition, resource=resource)
+    ]
+    _match_predecessors(orphans + archived, rows, lambda row: getattr(row, pk_name))
+
+def get_prev_record(record):
+    """The predecessor of a history record, from the prefetched ones when available."""
+    if hasattr(record, PREV_RECORD_ATTR):
+        return getattr(record, PREV_RECORD_ATTR)
+    return record.prev_record
+
+def get_history_models() -> list:
+    """Every historical model registered by simple-history."""
+    return [model for model in apps.get_models() if hasattr(model, 'instance_type')]
+
+def _archive_value(field, record):
+    value = field.value_from_object(record)
+    if isinstance(field, FileField):
+        return value.name or None
+    return value
+
+def _compress(values) -> bytes:
+    return zlib.compress(json.dumps(values, cls=DjangoJSONEncoder).encode(), 9)
+
+def build_archive_row(record) -> HistoryArchive:
+    """Builds (without saving) the archive row of a live history record."""
+    model = type(record)
+    return HistoryArchive(
+        resource=model._meta.label_lower,
+        history_id=record.history_id,
+        object_id=getattr(record, model.instance_type._meta.pk.attname),
+        history_date=record.history_date,
+        history_type=record.history_type,
+        history_user_id=record.history_user_id,
+        payload=_compress({
+            field.attname: _archive_value(field, record)
+            for field in model._meta.concrete_fields
+            if field.attname not in ARCHIVE_COLUMNS
+        }),
+    )
+
+def restore_history_record(model, row):
+    """
+    Rebuilds an (unsaved) history record from its archive row, so that it can be
+    serialized and diffed like a live one. It is flagged with `is_archived`.
+    """
+    values = json.loads(zlib.decompress(bytes(row.payload)))
+    record = model(
+        history_id=row.history_id,
+        history_date=row.history_date,
+        history_type=row.history_type,
+        history_user_id=row.history_user_id,
+        **{
+            field.attname: field.to_python(values[field.attname])
+            for field in model._meta.concrete_fields
+            if field.attname in values
+        },
+    )
+    record.is_archived = True
+    return record
+
+def get_archive_queryset(model, object_id=None):
+    """Archived rows of a history model (optionally of a single object), most recent first."""
+    queryset = HistoryArchive.objects.filter(resource=model._meta.label_lower)
+    if object_id is not None:
+        queryset = queryset.filter(object_id=object_id)
+    return queryset.order_by('-history_date', '-history_id')
+
+class ArchivedHistoryList:
+    """
+    Read-only sequence of live history records followed by archived ones, restored as
+    history records, e.g. for pagination. Both parts are ordered most recent first.
+
+    Archived rows are normally older than the live ones, so a slice reads the live
+    queryset and/or the archive with an OFFSET, never both tables in full. When they
+    overlap (back-dated history rows, retention raised after a run), a slice merges
+    the first rows of both parts by date instead.
+    """
+    def __init__(self, model, live, archive):
+        self.model = model
+        self.live = live
+        self.archive = archive
+        self._live_count = None
+        self._overlaps = None
+
+    @property
+    def overlaps(self) -> bool:
+        """Whether some live row is not more recent than the newest archived row."""
+        if self._overlaps is None:
+            oldest_live = None
+            if self.live is not None:
+                oldest_live = self.live.order_by('history_date').values_list('history_date', flat=True).first()
+            newest_archived = self.archive.values_list('history_date', flat=True).first()
+            self._overlaps = bool(oldest_live and newest_archived and oldest_live <= newest_archived)
+        return self._overlaps
+
+    def _merged(self, start, stop):
+        items = list(self.live[:stop]) + [
+            restore_history_record(self.model, row) for row in self.archive[:stop]
+        ]
+        items.sort(key=lambda record: (record.history_date, record.history_id), reverse=True)
+        return items[start:stop]
+
+    @property
+    def live_count(self) -> int:
+        if self._live_count is None:
+            self._live_count = self.live.count() if self.live is not None else 0
+        return self._live_count
+
+    def count(self) -> int:
+        return self.live_count + self.archive.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            items = self[index:index + 1]
+            if not items:
+                raise IndexError(index)
+            return items[0]
+        start, stop = index.start or 0, index.stop
+        if self.overlaps:
+            return self._merged(start, stop)
+        items = []
+        if start < self.live_count:
+            items += list(self.live[start:stop])
+        archive_start = max(start - self.live_count, 0)
+        archive_stop = None if stop is None else stop - self.live_count
+        if archive_stop is None or archive_stop > archive_start:
+            items += [
+                restore_history_record(self.model, row)
+                for row in self.archive[archive_start:archive_stop]
+            ]
+        return items
+
+    def __iter__(self):
+        return iter(self[0:None])
+
+def archive_history(retention_days=None, batch_size=None, models=None) -> dict:
+    """
+    Moves the history rows older than the retention horizon (HISTORY_RETENTION_DAYS)
+    out of the simple-history tables into HistoryArchive.
+
+    Rows are moved oldest first, `batch_size` at a time, each batch in its own
+    transaction (bulk INSERT into the archive, then DELETE by history_id): an
+    interrupted run leaves no half-moved batch and the next run resumes from the
+    remaining rows. Returns the number of archived rows per history model label.
+    """
+    retention_days = settings.HISTORY_RETENTION_DAYS if retention_days is None else retention_days
+    batch_size = batch_size or settings.HISTORY_ARCHIVE_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    counts = {}
+
+    for model in models or get_history_models():
+        expired = model._default_manager.filter(history_date__lt=cutoff).order_by('history_date', 'history_id')
+        archived = 0
+        while True:
+            batch = list(expired[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                HistoryArchive.objects.bulk_create(
+                    [build_archive_row(record) for record in batch], ignore_conflicts=True
+                )
+                model._default_manager.filter(history_id__in=[record.history_id for record in batch]).delete()
+            archived += len(batch)
+        counts[model._meta.label_lower] = archived
+    return counts
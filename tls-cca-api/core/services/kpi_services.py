@@ -0,0 +1,181 @@
+"""
+Materialized dashboard KPIs (KpiRollup): one row per (commercial, portfolio, day).
+
+A row holds the figures of the day they belong to: the sale's day for the sales and
+debt figures (volume, counts, initial debt, balance, overdue debts), the payment's
+day for the collected amounts. The totals of a scope are the sum of its rows.
+
+- `apply_kpi_deltas` / `apply_kpi_delta_groups` adjust the rows of the days a service
+  moves a figure on (sale or debt creation or deletion, approval, recovery), with a
+  single multi-row upsert.
+- `reconcile_kpi_rollups` recomputes the rows of given days from the source tables
+  (nightly status job, for the days of the debts it changed); without days it rebuilds
+  every row (`rebuild_kpi_rollups` command). The table must be seeded with it once
+  after deployment: rows created by deltas start from zero.
+- `get_rollup_totals` sums the rows of the pairs in the user's scope.
+
+Edits of a sale's amount, date or owners, and changes made outside the services
+(admin, raw updates), are only reflected once their days are reconciled.
+"""
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from django.db import connection, transaction
+from django.db.models import F, Q, Sum, Count
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from core.models import KpiRollup
+from sales.models import CreditSale, CreditSaleStatus
+from receivables.models import Debt, DebtStatus, Recovery
+
+KPI_FIELDS = [
+    'sales_volume', 'sales_count', 'approved_count',
+    'initial_debt', 'balance', 'overdue_count', 'collected',
+]
+
+
+def kpi_day(value=None):
+    """The rollup day of a date or datetime (local date), today if None."""
+    if value is None:
+        return timezone.localdate()
+    if isinstance(value, datetime):
+        return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+    return value
+
+
+def kpi_delta_groups():
+    """Accumulator for `apply_kpi_delta_groups`: {(commercial id, portfolio id, day): {field: delta}}."""
+    return defaultdict(lambda: defaultdict(int))
+
+
+def apply_kpi_deltas(commercial_id, portfolio_id, day, **deltas) -> None:
+    """Adds `deltas` (KPI field -> amount) to the row of a pair and day, creating it if needed."""
+    apply_kpi_delta_groups({(commercial_id, portfolio_id, day): deltas})
+
+
+def apply_kpi_delta_groups(groups) -> None:
+    """
+    Adds the deltas of many rows ({(commercial id, portfolio id, day): deltas}) with a
+    single INSERT ... ON CONFLICT DO UPDATE: concurrent first changes of a row cannot
+    collide on the unique constraint, and the rows are listed in a fixed order so that
+    concurrent batches lock them in the same order.
+    """
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    params, count = [], 0
+    for commercial_id, portfolio_id, day in sorted(groups, key=lambda key: (key[0] or 0, key[1] or 0, key[2])):
+        deltas = {field: value for field, value in groups[(commercial_id, portfolio_id, day)].items() if value}
+        if deltas:
+            params += [
+                commercial_id, portfolio_id, portfolio_id or 0, connection.ops.adapt_datefield_value(day), now,
+                *(deltas.get(field, 0) for field in KPI_FIELDS),
+            ]
+            count += 1
+    if not count:
+        return
+    table = connection.ops.quote_name(KpiRollup._meta.db_table)
+    columns = ['commercial_id', 'portfolio_id', 'portfolio_key', 'day', 'updated_at', *KPI_FIELDS]
+    values = ', '.join([f"({', '.join(['%s'] * len(columns))})"] * count)
+    increments = ', '.join(
+        f"{field} = {table}.{field} + EXCLUDED.{field}" for field in KPI_FIELDS
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES {values} "
+            f"ON CONFLICT (commercial_id, portfolio_key, day) DO UPDATE SET {increments}, "
+            f"updated_at = EXCLUDED.updated_at",
+            params,
+        )
+
+
+def get_debt_kpi_days(debt_ids) -> set:
+    """The rollup days holding the figures of the given debts (their sales' days)."""
+    return set(
+        Debt.objects.filter(pk__in=debt_ids).annotate(kpi_day=TruncDate('sale__sale_date'))
+        .values_list('kpi_day', flat=True).distinct()
+    )
+
+
+def reconcile_kpi_rollups(days=None) -> int:
+    """
+    Recomputes the rows of the given days (every row if None) from the sales, debts
+    and recoveries tables, with one grouped query per table. Rows of those days that
+    no longer have data are reset to zero.
+
+    The rollup table is locked (PostgreSQL) before the source tables are read, so a
+    delta is either already counted in the aggregates or applied after the
+    reconciliation, never overwritten by it. Returns the number of rows written.
+    """
+    if days is not None:
+        days = set(days)
+        if not days:
+            return 0
+    rows = {}
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"LOCK TABLE {connection.ops.quote_name(KpiRollup._meta.db_table)} IN SHARE ROW EXCLUSIVE MODE"
+                )
+
+        sales = CreditSale.objects.annotate(kpi_day=TruncDate('sale_date')).values(
+            'kpi_day', kpi_commercial=F('commercial_id'), kpi_portfolio=F('portfolio_id')
+        ).annotate(
+            sales_volume=Coalesce(Sum('total_amount'), Decimal('0')),
+            sales_count=Count('id'),
+            approved_count=Count('id', filter=Q(status=CreditSaleStatus.APPROVED)),
+        ).order_by()
+        debts = Debt.objects.annotate(kpi_day=TruncDate('sale__sale_date')).values(
+            'kpi_day', kpi_commercial=F('sale__commercial_id'), kpi_portfolio=F('sale__portfolio_id')
+        ).annotate(
+            initial_debt=Coalesce(Sum('init_amount'), Decimal('0')),
+            balance=Coalesce(Sum('balance'), Decimal('0')),
+            overdue_count=Count('id', filter=Q(debt_status=DebtStatus.OVERDUE)),
+        ).order_by()
+        recoveries = Recovery.objects.annotate(kpi_day=TruncDate('recovery_date')).values(
+            'kpi_day',
+            kpi_commercial=F('term__debt__sale__commercial_id'), kpi_portfolio=F('term__debt__sale__portfolio_id'),
+        ).annotate(collected=Coalesce(Sum('amount'), Decimal('0'))).order_by()
+        existing = KpiRollup.objects.all()
+        if days is not None:
+            sales, debts, recoveries = (
+                aggregates.filter(kpi_day__in=days) for aggregates in (sales, debts, recoveries)
+            )
+            existing = existing.filter(day__in=days)
+
+        for aggregates in (sales, debts, recoveries):
+            for group in aggregates:
+                key = (group.pop('kpi_commercial'), group.pop('kpi_portfolio'), group.pop('kpi_day'))
+                rows.setdefault(key, dict.fromkeys(KPI_FIELDS, 0)).update(group)
+        # Rows without data any more are reset to zero
+        for key in existing.values_list('commercial_id', 'portfolio_id', 'day'):
+            rows.setdefault(key, dict.fromkeys(KPI_FIELDS, 0))
+
+        KpiRollup.objects.bulk_create(
+            [
+                KpiRollup(
+                    commercial_id=commercial_id, portfolio_id=portfolio_id,
+                    portfolio_key=portfolio_id or 0, day=day, **values
+                )
+                for (commercial_id, portfolio_id, day), values in rows.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['commercial', 'portfolio_key', 'day'],
+            update_fields=[*KPI_FIELDS, 'updated_at'],
+        )
+    return len(rows)
+
+
+def rebuild_kpi_rollups() -> int:
+    """Recomputes every row from the source tables, see `reconcile_kpi_rollups`."""
+    return reconcile_kpi_rollups()
+
+
+def get_rollup_totals(scope=None) -> dict:
+    """
+    Sums the rows of the (commercial, portfolio) pairs matching `scope` (a Q on KpiRollup),
+    one aggregate over the pairs' daily rows.
+    """
+    return KpiRollup.objects.filter(scope or Q()).aggregate(
+        **{field: Coalesce(Sum(field), 0 if field.endswith('_count') else Decimal('0')) for field in KPI_FIELDS}
+    )
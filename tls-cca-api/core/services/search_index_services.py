@@ -0,0 +1,167 @@
+"""
+Maintenance of the denormalized SearchDocument table used by global search.
+Documents are upserted from model signals (core.signals) and from the service
+functions that bypass them (bulk updates); `rebuild_search_index` reindexes everything.
+"""
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from core.models import SearchDocument
+from crm.models import Customer
+from sales.models import CreditSale
+from receivables.models import Debt
+
+UPSERT_FIELDS = ['title', 'subtitle', 'search_text', 'name_key', 'amount', 'status', 'commercial', 'portfolio', 'sort_date']
+
+
+def _search_text(*values) -> str:
+    return " ".join(str(v) for v in values if v).lower()
+
+
+def _customer_values(customer):
+    """Searchable values of a customer: name, contacts and identification numbers."""
+    values = [customer.display_name, customer.email, customer.phone, customer.mobile]
+    physical = getattr(customer, 'physical_detail', None)
+    if physical:
+        values.append(physical.id_document_number)
+    moral = getattr(customer, 'moral_detail', None)
+    if moral:
+        values += [moral.business_name, moral.registration_number]
+    return values
+
+
+def build_customer_document(customer) -> SearchDocument:
+    return SearchDocument(
+        entity_type=SearchDocument.TYPE_CUSTOMER,
+        object_id=customer.pk,
+        title=customer.display_name or str(customer),
+        subtitle=customer.email,
+        search_text=_search_text(*_customer_values(customer)),
+        name_key=customer.display_name.lower(),
+        portfolio_id=customer.portfolio_id,
+        sort_date=customer.created_at,
+    )
+
+
+def build_sale_document(sale) -> SearchDocument:
+    customer_name = sale.customer.display_name
+    return SearchDocument(
+        entity_type=SearchDocument.TYPE_SALE,
+        object_id=sale.pk,
+        title=f"Vente #{sale.pk} - {customer_name}",
+        search_text=_search_text(f"#{sale.pk}", customer_name),
+        name_key=customer_name.lower(),
+        amount=sale.total_amount,
+        status=sale.status,
+        commercial_id=sale.commercial_id,
+        portfolio_id=sale.portfolio_id,
+        sort_date=sale.sale_date,
+    )
+
+
+def build_debt_document(debt) -> SearchDocument:
+    sale = debt.sale
+    customer_name = sale.customer.display_name
+    return SearchDocument(
+        entity_type=SearchDocument.TYPE_DEBT,
+        object_id=debt.pk,
+        title=f"Dette #{debt.pk} - {customer_name}",
+        search_text=_search_text(f"#{sale.pk}", customer_name),
+        name_key=customer_name.lower(),
+        amount=debt.balance,
+        status=debt.debt_status,
+        commercial_id=sale.commercial_id,
+        portfolio_id=sale.portfolio_id,
+        sort_date=sale.sale_date,
+    )
+
+
+def _upsert(documents):
+    if documents:
+        SearchDocument.objects.bulk_create(
+            documents,
+            update_conflicts=True,
+            unique_fields=['entity_type', 'object_id'],
+            update_fields=UPSERT_FIELDS,
+        )
+    return len(documents)
+
+
+def index_customers(customer_ids) -> int:
+    customers = Customer.objects.filter(pk__in=customer_ids).select_related('physical_detail', 'moral_detail')
+    return _upsert([build_customer_document(c) for c in customers])
+
+
+def index_sales(sale_ids) -> int:
+    sales = CreditSale.objects.filter(pk__in=sale_ids).select_related('customer')
+    return _upsert([build_sale_document(s) for s in sales])
+
+
+def index_debts(debt_ids) -> int:
+    debts = Debt.objects.filter(pk__in=debt_ids).select_related('sale__customer')
+    return _upsert([build_debt_document(d) for d in debts])
+
+
+def index_customer_trees(customer_ids, only_renamed=False) -> None:
+    """
+    Reindexes customers and the sales/debts whose documents carry their name.
+    With `only_renamed`, the sales and debts are only reindexed for the customers
+    whose name differs from the one in their indexed document.
+    """
+    if only_renamed:
+        indexed = dict(
+            SearchDocument.objects.filter(entity_type=SearchDocument.TYPE_CUSTOMER, object_id__in=customer_ids)
+            .values_list('object_id', 'name_key')
+        )
+        names = Customer.objects.filter(pk__in=customer_ids).values_list('pk', 'display_name')
+        renamed = [pk for pk, name in names if indexed.get(pk) != name.lower()]
+    else:
+        renamed = customer_ids
+    index_customers(customer_ids)
+    if renamed:
+        index_sales(CreditSale.objects.filter(customer_id__in=renamed).values('pk'))
+        index_debts(Debt.objects.filter(sale__customer_id__in=renamed).values('pk'))
+
+
+def refresh_debt_documents(debt_ids=None) -> int:
+    """
+    Copies balance and status of the given debts (all if None) into their documents
+    in a single UPDATE, for services that change debts without firing post_save.
+    """
+    debt = Debt.objects.filter(pk=OuterRef('object_id'))
+    documents = SearchDocument.objects.filter(entity_type=SearchDocument.TYPE_DEBT)
+    if debt_ids is not None:
+        documents = documents.filter(object_id__in=debt_ids)
+    return documents.update(
+        amount=Subquery(debt.values('balance')[:1]),
+        status=Subquery(debt.values('debt_status')[:1]),
+    )
+
+
+def remove_documents(entity_type, object_ids) -> int:
+    deleted, _ = SearchDocument.objects.filter(entity_type=entity_type, object_id__in=object_ids).delete()
+    return deleted
+
+
+def rebuild_search_index(batch_size: int = 1000) -> dict:
+    """
+    Recreates every search document from the source tables, in batches.
+    Returns the number of documents indexed per entity type.
+    """
+    sources = [
+        (SearchDocument.TYPE_CUSTOMER, Customer.objects.select_related('physical_detail', 'moral_detail'),
+         build_customer_document),
+        (SearchDocument.TYPE_SALE, CreditSale.objects.select_related('customer'), build_sale_document),
+        (SearchDocument.TYPE_DEBT, Debt.objects.select_related('sale__customer'), build_debt_document),
+    ]
+    counts = {}
+    with transaction.atomic():
+        SearchDocument.objects.all().delete()
+        for entity_type, queryset, build in sources:
+            batch, counts[entity_type] = [], 0
+            for obj in queryset.order_by('pk').iterator(chunk_size=batch_size):
+                batch.append(build(obj))
+                if len(batch) >= batch_size:
+                    counts[entity_type] += _upsert(batch)
+                    batch = []
+            counts[entity_type] += _upsert(batch)
+    return counts
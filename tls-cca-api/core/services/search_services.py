@@ -1,102 +1,271 @@
-from django.db.models import Q
-from sales.models import CreditSale
-from receivables.models import Debt
-from crm.models import Customer
+import logging
+from django.conf import settings
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.models import F, Q, Case, When, Value, IntegerField, Window
+from django.db.models.functions import Greatest, RowNumber
+from core.models import SearchDocument
+from core.utils.cache import LRUCache
 
-def search_global(user, query):
+logger = logging.getLogger(__name__)
+
+SEARCH_LIMIT = 5  # Results per entity type
+AUTOCOMPLETE_CANDIDATES = 50  # Matches kept per entity type and prefix, to refine longer prefixes
+
+# (scope, prefix) -> candidates per entity type, see `autocomplete`
+autocomplete_cache = LRUCache(
+    maxsize=settings.SEARCH_AUTOCOMPLETE_CACHE_SIZE,
+    ttl=settings.SEARCH_AUTOCOMPLETE_CACHE_TTL,
+)
+
+# Columns covered by a trigram (GIN) index on PostgreSQL, which also serves
+# the LIKE '%...%' filter below. Created by `create_search_indexes`.
+TRIGRAM_INDEXED_FIELDS = [
+    (SearchDocument, 'search_text'),
+]
+
+RESULT_KEYS = {
+    SearchDocument.TYPE_SALE: "sales",
+    SearchDocument.TYPE_DEBT: "debts",
+    SearchDocument.TYPE_CUSTOMER: "customers",
+}
+
+
+TRIGRAM_EXTENSION_SQL = "CREATE EXTENSION IF NOT EXISTS pg_trgm"
+
+# Database alias -> whether pg_trgm is installed, see `has_trigram_extension`
+_trigram_extension = {}
+
+
+def has_trigram_extension(using='default') -> bool:
+    """Whether the pg_trgm extension is installed (checked once per process)."""
+    if using not in _trigram_extension:
+        conn = connections[using]
+        if conn.vendor != 'postgresql':
+            _trigram_extension[using] = False
+        else:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                _trigram_extension[using] = cursor.fetchone() is not None
+    return _trigram_extension[using]
+
+
+def create_search_indexes(using='default'):
+    """
+    Creates the pg_trgm extension and the trigram indexes of TRIGRAM_INDEXED_FIELDS.
+    Does nothing on other databases (e.g. SQLite in tests), which fall back to plain scans.
+
+    Creating an extension needs privileges the application role may not have: the
+    error is then logged with the SQL to run as a superuser, and search falls back
+    to the portable ranking until the next migrate finds the extension installed.
+    """
+    conn = connections[using]
+    if conn.vendor != 'postgresql':
+        return
+    _trigram_extension.pop(using, None)
+    if not has_trigram_extension(using):
+        try:
+            with transaction.atomic(using=using), conn.cursor() as cursor:
+                cursor.execute(TRIGRAM_EXTENSION_SQL)
+        except DatabaseError as exc:
+            logger.warning(
+                "Could not create the pg_trgm extension (%s). Run as a database superuser: %s;",
+                exc, TRIGRAM_EXTENSION_SQL,
+            )
+            return
+        _trigram_extension[using] = True
+    with conn.cursor() as cursor:
+        for model, field_name in TRIGRAM_INDEXED_FIELDS:
+            table = model._meta.db_table
+            column = model._meta.get_field(field_name).column
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS "{table}_{column}_trgm" '
+                f'ON "{table}" USING gin ("{column}" gin_trgm_ops)'
+            )
+
+
+def _rank(query, *fields):
     """
-    Performs a federated search across multiple models (Sales, Debts).
-    Respects the user's scope (RBAC).
+    Relevance of a row for the query, best of the given fields.
+    PostgreSQL with pg_trgm: trigram word similarity. Otherwise: exact > prefix > contains.
     """
-    results = {
-        "sales": [],
-        "debts": [],
-        "customers": []
+    if connection.vendor == 'postgresql' and has_trigram_extension(connection.alias):
+        from django.contrib.postgres.search import TrigramWordSimilarity
+        scores = [TrigramWordSimilarity(query, field) for field in fields]
+        return Greatest(*scores) if len(scores) > 1 else scores[0]
+
+    whens = []
+    for field in fields:
+        whens += [When(**{f"{field}__iexact": query}, then=Value(3))]
+    for field in fields:
+        whens += [When(**{f"{field}__istartswith": query}, then=Value(2))]
+    return Case(*whens, default=Value(1), output_field=IntegerField())
+
+
+def _has_global_view(user) -> bool:
+    # We reuse the logic from stats_services to ensure consistency
+    return user.is_superuser or user.has_permission('dashboard.view_all_stats')
+
+
+def _customer_scope(user) -> str:
+    if user.is_superuser or user.has_permission('customer.list_all'):
+        return 'all'
+    if user.has_permission('customer.list'):
+        return 'own'
+    return 'none'
+
+
+def get_search_scope(user) -> Q:
+    """
+    Single predicate on SearchDocument restricting results to what the user may see (RBAC):
+    sales and debts of the whole company or of the user's sales/portfolios, and
+    all customers, the customers of the user's portfolios, or none.
+    """
+    owned = Q(commercial=user) | Q(portfolio__commercial=user)
+    operations = Q(entity_type__in=[SearchDocument.TYPE_SALE, SearchDocument.TYPE_DEBT])
+    if not _has_global_view(user):
+        operations &= owned
+
+    customers = Q(entity_type=SearchDocument.TYPE_CUSTOMER)
+    customer_scope = _customer_scope(user)
+    if customer_scope == 'all':
+        return operations | customers
+    if customer_scope == 'own':
+        return operations | (customers & Q(portfolio__commercial=user))
+    return operations
+
+
+def get_search_scope_key(user) -> str:
+    """Cache key part identifying the rows `get_search_scope` lets the user see."""
+    operations = 'all' if _has_global_view(user) else f'u{user.pk}'
+    customers = _customer_scope(user)
+    if customers == 'own':
+        customers = f'u{user.pk}'
+    return f"{operations}|{customers}"
+
+
+def _format_result(document) -> dict:
+    result = {
+        "id": document.object_id,
+        "title": document.title,
+        "type": document.entity_type,
     }
+    if document.entity_type == SearchDocument.TYPE_SALE:
+        result["subtitle"] = f"Montant: {document.amount}"
+        result["url"] = f"/sales/creditsales/{document.object_id}/"
+    elif document.entity_type == SearchDocument.TYPE_DEBT:
+        result["subtitle"] = f"Reste: {document.amount}"
+        result["status"] = document.status
+        result["url"] = f"/receivables/debts/{document.object_id}/"
+    else:
+        result["subtitle"] = document.subtitle
+        result["url"] = f"/crm/customers/{document.object_id}/"
+    return result
+
+
+def search_global(user, query):
+    """
+    Performs a federated search across Sales, Debts and Customers in one query on
+    the SearchDocument table. Respects the user's scope (RBAC). Results are ranked
+    by relevance, SEARCH_LIMIT per entity type.
+    """
+    results = {key: [] for key in RESULT_KEYS.values()}
 
     if not query or len(query) < 2:
         return results
 
-    # --- 1. Search Scope Definition ---
-    # We reuse the logic from stats_services to ensure consistency
-    has_global_view = user.is_superuser or user.has_permission('dashboard.view_all_stats')
+    # Search text covers sale numbers ('#12'), names, email, phones and ID/registration numbers
+    hits = (
+        SearchDocument.objects
+        .filter(get_search_scope(user), search_text__contains=query.lower())
+        .annotate(rank=_rank(query.lower(), 'search_text'))
+        .annotate(position=Window(
+            RowNumber(),
+            partition_by=F('entity_type'),
+            order_by=[F('rank').desc(), F('sort_date').desc(nulls_last=True)],
+        ))
+        .filter(position__lte=SEARCH_LIMIT)
+        .order_by('entity_type', 'position')
+    )
 
-    # --- 2. Search in Credit Sales ---
-    if has_global_view:
-        sales_qs = CreditSale.objects.all()
-    else:
-        sales_qs = CreditSale.objects.filter(
-            Q(commercial=user) | Q(portfolio__commercial=user)
-        ).distinct()
-
-    # Filter by query (Code, or linked Customer Name)
-    # Adaptez 'code' et 'customer__name' selon vos vrais noms de champs
-    sales_hits = sales_qs.filter(
-        Q(code__icontains=query) 
-        # | Q(customer__name__icontains=query) 
-    ).select_related('commercial')[:5] # Limit to 5 results for performance
-
-    results["sales"] = [
-        {
-            "id": sale.id,
-            "title": f"Vente {sale.code}",
-            "subtitle": f"Montant: {sale.total_amount}",
-            "type": "sale",
-            "url": f"/sales/creditsales/{sale.id}/"
-        }
-        for sale in sales_hits
-    ]
+    for document in hits:
+        results[RESULT_KEYS[document.entity_type]].append(_format_result(document))
+    return results
 
-    # --- 3. Search in Debts ---
-    if has_global_view:
-        debts_qs = Debt.objects.all()
-    else:
-        # Debts linked to visible sales
-        debts_qs = Debt.objects.filter(sale__in=sales_qs)
-
-    # Filter by query (Code, Reference)
-    debts_hits = debts_qs.filter(
-        Q(sale__code__icontains=query)
-        # | Q(sale__customer__name__icontains=query)
-    )[:5]
-
-    results["debts"] = [
-        {
-            "id": debt.id,
-            "title": f"Dette {debt.code}",
-            "subtitle": f"Reste: {debt.balance}",
-            "type": "debt",
-            "status": debt.debt_status,
-            "url": f"/receivables/debts/{debt.id}/"
-        }
-        for debt in debts_hits
-    ]
 
-    # --- 4. Search in Customers ---
-    # RBAC: Admin/Consultant sees all, Commercial sees own
-    if user.is_superuser or user.has_permission('customer.list_all'):
-        customers_qs = Customer.objects.all()
-    elif user.has_permission('customer.list'):
-        customers_qs = Customer.objects.filter(commercial=user)
-    else:
-        customers_qs = Customer.objects.none()
-
-    # Filter by query (Name, Email)
-    customer_hits = customers_qs.filter(
-        Q(first_name__icontains=query) | 
-        Q(last_name__icontains=query) |
-        Q(email__icontains=query)
-    )[:5]
-
-    results["customers"] = [
-        {
-            "id": customer.id,
-            "title": f"{customer.first_name} {customer.last_name}",
-            "subtitle": customer.email,
-            "type": "customer",
-            "url": f"/crm/customers/{customer.id}/"
-        }
-        for customer in customer_hits
+def _normalize_prefix(prefix) -> str:
+    return " ".join((prefix or "").lower().split())
+
+
+def _autocomplete_candidates(user, prefix, entity_types) -> dict:
+    """
+    Prefix matches (name or first search token, e.g. '#12') per entity type, in
+    autocomplete order, as {entity_type: (complete, entries)}. `complete` tells
+    whether every match fits in AUTOCOMPLETE_CANDIDATES.
+    """
+    hits = (
+        SearchDocument.objects
+        .filter(get_search_scope(user), entity_type__in=entity_types)
+        .filter(Q(name_key__startswith=prefix) | Q(search_text__startswith=prefix))
+        .annotate(position=Window(
+            RowNumber(),
+            partition_by=F('entity_type'),
+            order_by=[F('name_key').asc(), F('sort_date').desc(nulls_last=True)],
+        ))
+        .filter(position__lte=AUTOCOMPLETE_CANDIDATES + 1)
+        .order_by('entity_type', 'position')
+    )
+    candidates = {entity_type: (True, []) for entity_type in entity_types}
+    for document in hits:
+        entries = candidates[document.entity_type][1]
+        if len(entries) == AUTOCOMPLETE_CANDIDATES:
+            candidates[document.entity_type] = (False, entries)
+            continue
+        entries.append({
+            'name_key': document.name_key,
+            'search_text': document.search_text,
+            'result': _format_result(document),
+        })
+    return candidates
+
+
+def _refine(entries, prefix):
+    return [
+        entry for entry in entries
+        if entry['name_key'].startswith(prefix) or entry['search_text'].startswith(prefix)
     ]
 
-    return results
\ No newline at end of file
+
+def autocomplete(user, prefix, limit=SEARCH_LIMIT):
+    """
+    Top `limit` prefix matches per entity type for search-as-you-type, within the
+    user's scope (RBAC).
+
+    Results are cached per (scope, normalized prefix) for a short time. When a shorter
+    prefix of the same scope is cached with all its matches, the longer prefix is
+    filtered from it instead of querying the database again.
+    """
+    results = {key: [] for key in RESULT_KEYS.values()}
+    prefix = _normalize_prefix(prefix)
+    if len(prefix) < 2:
+        return results
+
+    scope = get_search_scope_key(user)
+    candidates = autocomplete_cache.get((scope, prefix))
+    if candidates is None:
+        candidates = {}
+        for length in range(len(prefix) - 1, 1, -1):
+            shorter = autocomplete_cache.get((scope, prefix[:length]))
+            if shorter is not None:
+                candidates = {
+                    entity_type: (True, _refine(entries, prefix))
+                    for entity_type, (complete, entries) in shorter.items() if complete
+                }
+                break
+        missing = [entity_type for entity_type in RESULT_KEYS if entity_type not in candidates]
+        if missing:
+            candidates.update(_autocomplete_candidates(user, prefix, missing))
+        autocomplete_cache.set((scope, prefix), candidates)
+
+    for entity_type, (_, entries) in candidates.items():
+        results[RESULT_KEYS[entity_type]] = [entry['result'] for entry in entries[:limit]]
+    return results
@@ -1,62 +1,60 @@
-from django.db.models import Sum, Q, Count
-from django.db.models.functions import Coalesce, TruncMonth
-from sales.models import CreditSale, CreditSaleStatus
-from receivables.models import Debt, DebtStatus, Recovery
+import hashlib
+import json
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Sum, Q, DateField, DateTimeField, signals
+from django.db.models.functions import Coalesce, Trunc
+from django.utils import timezone
+from core.models import TimelineSeries, TimelineBucket
+from core.services import kpi_services
+
+STATS_CACHE_VERSION_KEY = 'stats:version:{model}'
 
 def get_global_stats(user):
     """
     Aggregates global statistics (KPIs) for the dashboard.
     Filters data based on the user's role (Admin vs Commercial).
+
+    Figures come from the materialized KpiRollup rows (see kpi_services),
+    one per (commercial, portfolio) pair, instead of the transaction tables.
     """
     
     # 1. Determine Scope based on permissions
     # If superuser or has specific permission, view ALL data.
-    # Otherwise, view only data related to the user (Commercial scope).
+    # Otherwise, view only data related to the user (Commercial scope):
+    # sales owned directly OR in their Portfolio.
     if user.is_superuser or user.has_permission('dashboard.view_all_stats'):
-        sales_qs = CreditSale.objects.all()
-        debts_qs = Debt.objects.all()
-        recoveries_qs = Recovery.objects.all()
+        scope = None
     else:
-        # Commercial Scope
-        # Sales: Owned directly OR in their Portfolio
-        sales_qs = CreditSale.objects.filter(
-            Q(commercial=user) | Q(portfolio__commercial=user)
-        ).distinct()
-        
-        # Debts: Linked to the visible sales
-        debts_qs = Debt.objects.filter(sale__in=sales_qs)
-        
-        # Recoveries: Linked to the visible debts
-        recoveries_qs = Recovery.objects.filter(term__debt__in=debts_qs)
-
-    # 2. Aggregate Sales Data
-    sales_metrics = sales_qs.aggregate(
-        total_volume=Coalesce(Sum('total_amount'), 0.0),
-        total_count=Count('id'),
-        approved_count=Count('id', filter=Q(status=CreditSaleStatus.APPROVED))
-    )
-
-    # 3. Aggregate Debt Data
-    debt_metrics = debts_qs.aggregate(
-        total_initial=Coalesce(Sum('init_amount'), 0.0),
-        total_balance=Coalesce(Sum('balance'), 0.0),
-        overdue_count=Count('id', filter=Q(debt_status=DebtStatus.OVERDUE))
-    )
+        scope = Q(commercial=user) | Q(portfolio__commercial=user)
 
-    # 4. Aggregate Recovery Data
-    recovery_metrics = recoveries_qs.aggregate(
-        total_collected=Coalesce(Sum('amount'), 0.0)
-    )
+    # 2. Read the pre-aggregated Sales, Debt and Recovery figures
+    totals = kpi_services.get_rollup_totals(scope)
+    sales_metrics = {
+        "total_volume": totals['sales_volume'],
+        "total_count": totals['sales_count'],
+        "approved_count": totals['approved_count'],
+    }
+    debt_metrics = {
+        "total_initial": totals['initial_debt'],
+        "total_balance": totals['balance'],
+        "overdue_count": totals['overdue_count'],
+    }
 
-    # 5. Calculate Ratios & Formatting
+    # 3. Calculate Ratios & Formatting
     total_initial_debt = debt_metrics['total_initial']
-    total_collected = recovery_metrics['total_collected']
+    total_collected = totals['collected']
     
     recovery_rate = 0.0
     if total_initial_debt > 0:
         recovery_rate = (float(total_collected) / float(total_initial_debt)) * 100
 
-    # 6. Construct Response Dictionary
+    # 4. Construct Response Dictionary
     return {
         "sales": sales_metrics,
         "debts": debt_metrics,
@@ -74,14 +72,234 @@ def calculate_stats(queryset, aggregates):
         return {}
     return queryset.aggregate(**aggregates)
 
-def calculate_timeline(queryset, date_field, amount_field, alias='total_amount'):
+TIMELINE_GRANULARITIES = ('day', 'week', 'month', 'quarter')
+
+# Model -> fields read by its timelines (date and amount), see `invalidate_timelines`
+TIMELINE_TRACKED_FIELDS = {}
+# Model -> date fields of its timelines, whose loaded values are kept on the instances
+TIMELINE_DATE_FIELDS = {}
+LOADED_DATES_ATTR = '_timeline_loaded_dates'
+
+# A series read more recently than this is not touched again (see `prune_timeline_series`)
+TIMELINE_TOUCH_INTERVAL = timedelta(days=1)
+
+
+def register_timeline(model, date_field, amount_field):
+    TIMELINE_TRACKED_FIELDS.setdefault(model, set()).update({date_field, amount_field})
+    if model not in TIMELINE_DATE_FIELDS:
+        signals.post_init.connect(_remember_loaded_dates, sender=model, weak=False)
+    TIMELINE_DATE_FIELDS.setdefault(model, set()).add(date_field)
+
+
+def _remember_loaded_dates(sender, instance, **kwargs):
+    # The periods a row leaves when its date is edited must be invalidated too
+    loaded = instance.__dict__
+    instance.__dict__[LOADED_DATES_ATTR] = [
+        loaded[field] for field in TIMELINE_DATE_FIELDS[sender] if field in loaded
+    ]
+
+
+def period_start(day, granularity):
+    """First day of the period (of the given granularity) containing `day`."""
+    if granularity == 'day':
+        return day
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'quarter':
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    raise ValueError(f"Unknown granularity '{granularity}'.")
+
+
+def _date_lookup(queryset, date_field, lookup):
+    field = queryset.model._meta.get_field(date_field)
+    if isinstance(field, DateTimeField):
+        return f"{date_field}__date__{lookup}"
+    return f"{date_field}__{lookup}"
+
+
+def _aggregate_periods(queryset, date_field, amount_field, granularity) -> dict:
+    """{period start: total} of the queryset, one GROUP BY query."""
+    rows = (
+        queryset
+        .annotate(period=Trunc(date_field, granularity, output_field=DateField()))
+        .values('period')
+        .annotate(total=Coalesce(Sum(amount_field), Decimal('0')))
+        .order_by('period')
+    )
+    return {row['period']: row['total'] for row in rows}
+
+
+def calculate_timeline(queryset, date_field, amount_field, alias='total_amount',
+                       granularity='month', dimension=None):
+    """
+    Generic function to generate a timeline: the sum of `amount_field` per period
+    ('day', 'week', 'month' or 'quarter') of `date_field`, as a list of
+    {granularity: period start, alias: total}.
+
+    With a `dimension` (identifying the scope and filters of `queryset`), closed periods
+    are persisted in a TimelineSeries the first time they are requested and read back
+    afterwards; only the open period (and periods closed since the last call) is
+    aggregated from the source table.
     """
-    Generic function to generate a monthly timeline.
+    if granularity not in TIMELINE_GRANULARITIES:
+        raise ValueError(f"Unknown granularity '{granularity}'.")
+
+    if dimension is None:
+        totals = _aggregate_periods(queryset, date_field, amount_field, granularity)
+    else:
+        open_start = period_start(timezone.localdate(), granularity)
+        series, _ = TimelineSeries.objects.get_or_create(
+            resource=queryset.model._meta.label_lower, dimension=dimension, granularity=granularity
+        )
+        now = timezone.now()
+        if series.last_used_at < now - TIMELINE_TOUCH_INTERVAL:
+            TimelineSeries.objects.filter(pk=series.pk).update(last_used_at=now)
+        if series.materialized_until is None or series.materialized_until < open_start:
+            # Persist the periods closed since the last call
+            newly_closed = queryset.filter(**{_date_lookup(queryset, date_field, 'lt'): open_start})
+            if series.materialized_until is not None:
+                newly_closed = newly_closed.filter(
+                    **{_date_lookup(queryset, date_field, 'gte'): series.materialized_until}
+                )
+            with transaction.atomic():
+                TimelineBucket.objects.bulk_create(
+                    [
+                        TimelineBucket(series=series, period_start=start, total=total)
+                        for start, total in _aggregate_periods(
+                            newly_closed, date_field, amount_field, granularity
+                        ).items()
+                    ],
+                    ignore_conflicts=True,
+                )
+                series.materialized_until = open_start
+                series.save(update_fields=['materialized_until'])
+
+        totals = dict(series.buckets.values_list('period_start', 'total'))
+        live = queryset.filter(**{_date_lookup(queryset, date_field, 'gte'): open_start})
+        totals.update(_aggregate_periods(live, date_field, amount_field, granularity))
+
+    return [{granularity: start, alias: totals[start]} for start in sorted(totals)]
+
+
+def invalidate_timelines(model, instance, update_fields=None):
     """
-    return (
-        queryset
-        .annotate(month=TruncMonth(date_field))
-        .values('month')
-        .annotate(**{alias: Coalesce(Sum(amount_field), 0.0)})
-        .order_by('month')
-    )
\ No newline at end of file
+    Drops the persisted buckets of `model` covering a row of a closed period that
+    changed (back-dated row, edited amount or date: the periods of its old and new
+    dates), so they are recomputed on next read. Changes to other fields and rows
+    of the open period leave them untouched.
+    """
+    fields = TIMELINE_TRACKED_FIELDS.get(model)
+    if not fields or (update_fields is not None and not fields & set(update_fields)):
+        return
+    current = [getattr(instance, field, None) for field in TIMELINE_DATE_FIELDS[model]]
+    invalidate_timelines_for_dates(model, current + instance.__dict__.get(LOADED_DATES_ATTR, []))
+    instance.__dict__[LOADED_DATES_ATTR] = current
+
+
+def invalidate_timelines_for_dates(model, dates):
+    """
+    Bulk counterpart of `invalidate_timelines`: deletes the buckets of the closed
+    periods containing the given dates, in every persisted timeline of `model`.
+    The series are rewound to the earliest of these periods: the next read
+    aggregates from there and only fills the missing buckets.
+    """
+    if model not in TIMELINE_TRACKED_FIELDS:
+        return
+    dates = {timezone.localdate(d) if isinstance(d, datetime) else d for d in dates if isinstance(d, date)}
+    if not dates:
+        return
+    today = timezone.localdate()
+    for granularity in TIMELINE_GRANULARITIES:
+        open_start = period_start(today, granularity)
+        starts = {start for start in (period_start(d, granularity) for d in dates) if start < open_start}
+        if not starts:
+            continue
+        series = TimelineSeries.objects.filter(
+            resource=model._meta.label_lower, granularity=granularity, materialized_until__gt=min(starts)
+        )
+        TimelineBucket.objects.filter(series__in=series, period_start__in=starts).delete()
+        series.update(materialized_until=min(starts))
+
+
+def prune_timeline_series(max_age_days=None) -> int:
+    """
+    Deletes the persisted timelines (and their buckets) not read for `max_age_days`
+    (default: TIMELINE_SERIES_TTL_DAYS), so one-off filter combinations do not pile up.
+    Returns the number of series deleted.
+    """
+    max_age_days = settings.TIMELINE_SERIES_TTL_DAYS if max_age_days is None else max_age_days
+    _, deleted = TimelineSeries.objects.filter(
+        last_used_at__lt=timezone.now() - timedelta(days=max_age_days)
+    ).delete()
+    return deleted.get(TimelineSeries._meta.label, 0)
+
+def _stats_version_key(model) -> str:
+    return STATS_CACHE_VERSION_KEY.format(model=model._meta.label_lower)
+
+
+def get_stats_cache_versions(models) -> list:
+    """
+    Returns the current cache version of each model (written whenever the model's rows
+    change), initialising the ones the cache lost.
+    """
+    keys = [_stats_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Time-based seed so a lost key never revives entries from an old version
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate_stats_cache(*models):
+    """
+    Invalidates the cached stats/timeline responses computed from the given models,
+    once the current transaction commits: bumped earlier, a concurrent request could
+    still aggregate the old rows and cache them under the new version.
+    """
+    transaction.on_commit(lambda: _bump_stats_versions(models))
+
+
+def _bump_stats_versions(models):
+    for model in models:
+        key = _stats_version_key(model)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+
+
+def get_stats_cache_key(prefix, scope, models, params) -> str:
+    """
+    Cache key of a stats/timeline response: the view and action (`prefix`), the user's
+    scope, the data versions of `models` and the normalized query parameters.
+    """
+    normalized = sorted((name, sorted(values)) for name, values in params.lists())
+    digest = hashlib.md5(
+        json.dumps([scope, get_stats_cache_versions(models), normalized]).encode()
+    ).hexdigest()
+    return f"stats:{prefix}:{digest}"
+
+
+def get_timeline_dimension(view, scope, filters) -> str:
+    """
+    Identifier of a persisted timeline: the view, the user's scope and the validated
+    filter values (filter name -> cleaned value), so equivalent requests share a series.
+    """
+    normalized = sorted((name, getattr(value, 'pk', value)) for name, value in filters.items())
+    return hashlib.md5(
+        json.dumps([view, scope, normalized], cls=DjangoJSONEncoder).encode()
+    ).hexdigest()
+
+
+def build_stats_cache_entry(data) -> dict:
+    """Wraps computed stats with the validators (ETag, Last-Modified) served with them."""
+    payload = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+    return {
+        'data': data,
+        'etag': f'"{hashlib.md5(payload.encode()).hexdigest()}"',
+        'last_modified': int(time.time()),
+    }
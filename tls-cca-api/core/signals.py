@@ -0,0 +1,127 @@
+from django.db.models.signals import post_migrate, post_save, post_delete
+from django.dispatch import receiver
+from core.models import SearchDocument
+from core.services import search_index_services, kpi_services, stats_services
+from core.services.search_services import create_search_indexes
+from crm.models import Customer, PhysicalPersonDetail, MoralPersonDetail
+from sales.models import CreditSale, CreditSaleStatus
+from receivables.models import Debt, DebtStatus, Term, Recovery
+
+
+
+@receiver(post_migrate)
+def create_trigram_indexes(sender, using='default', **kwargs):
+    """Keeps the global search trigram indexes in place after each migrate (PostgreSQL only)."""
+    if sender.name != 'core':
+        return
+    create_search_indexes(using=using)
+
+
+@receiver(post_save, sender=Customer)
+def index_customer(sender, instance, **kwargs):
+    # Sales and debts carry the customer's name: reindexed only when it changed
+    search_index_services.index_customer_trees([instance.pk], only_renamed=True)
+
+
+@receiver(post_save, sender=PhysicalPersonDetail)
+@receiver(post_save, sender=MoralPersonDetail)
+def index_customer_details(sender, instance, **kwargs):
+    # The customer's document carries the detail columns. A new name is indexed
+    # (with the sales and debts) by the customer's save in refresh_display_name
+    search_index_services.index_customer_trees([instance.customer_id], only_renamed=True)
+
+
+@receiver(post_delete, sender=PhysicalPersonDetail)
+@receiver(post_delete, sender=MoralPersonDetail)
+def refresh_customer_name(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Customer):
+        return  # Deleted with its customer
+    # Reloaded: the instance's customer may still hold the deleted detail
+    customer = Customer.objects.filter(pk=instance.customer_id).first()
+    if customer is not None:
+        customer.refresh_display_name()
+
+
+@receiver(post_save, sender=CreditSale)
+def index_sale(sender, instance, **kwargs):
+    search_index_services.index_sales([instance.pk])
+    search_index_services.index_debts(Debt.objects.filter(sale_id=instance.pk).values('pk'))
+
+
+@receiver(post_save, sender=Debt)
+def index_debt(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'sale' not in update_fields:
+        # e.g. payments: only balance/status can change, no need to reload the sale and customer
+        SearchDocument.objects.filter(entity_type=SearchDocument.TYPE_DEBT, object_id=instance.pk).update(
+            amount=instance.balance, status=instance.debt_status
+        )
+        return
+    search_index_services.index_debts([instance.pk])
+
+
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=CreditSale)
+@receiver(post_delete, sender=Debt)
+def remove_search_document(sender, instance, **kwargs):
+    entity_type = {
+        Customer: SearchDocument.TYPE_CUSTOMER,
+        CreditSale: SearchDocument.TYPE_SALE,
+        Debt: SearchDocument.TYPE_DEBT,
+    }[sender]
+    search_index_services.remove_documents(entity_type, [instance.pk])
+
+
+@receiver(post_save, sender=CreditSale)
+def record_sale_kpis(sender, instance, created, **kwargs):
+    if created:
+        kpi_services.apply_kpi_deltas(
+            instance.commercial_id, instance.portfolio_id, kpi_services.kpi_day(instance.sale_date),
+            sales_volume=instance.total_amount,
+            sales_count=1,
+            approved_count=int(instance.status == CreditSaleStatus.APPROVED),
+        )
+
+
+@receiver(post_save, sender=Debt)
+def record_debt_kpis(sender, instance, created, **kwargs):
+    if created:
+        sale = instance.sale
+        kpi_services.apply_kpi_deltas(
+            sale.commercial_id, sale.portfolio_id, kpi_services.kpi_day(sale.sale_date),
+            initial_debt=instance.init_amount,
+            balance=instance.balance,
+            overdue_count=int(instance.debt_status == DebtStatus.OVERDUE),
+        )
+
+
+@receiver(post_delete, sender=CreditSale)
+def remove_sale_kpis(sender, instance, **kwargs):
+    kpi_services.apply_kpi_deltas(
+        instance.commercial_id, instance.portfolio_id, kpi_services.kpi_day(instance.sale_date),
+        sales_volume=-instance.total_amount,
+        sales_count=-1,
+        approved_count=-int(instance.status == CreditSaleStatus.APPROVED),
+    )
+
+
+@receiver(post_delete, sender=Debt)
+def remove_debt_kpis(sender, instance, **kwargs):
+    # Deleted with its sale: the sale row is still there until the cascade reaches it
+    owners = CreditSale.objects.filter(pk=instance.sale_id).values(
+        'commercial_id', 'portfolio_id', 'sale_date'
+    ).first()
+    if owners:
+        kpi_services.apply_kpi_deltas(
+            owners['commercial_id'], owners['portfolio_id'], kpi_services.kpi_day(owners['sale_date']),
+            initial_debt=-instance.init_amount,
+            balance=-instance.balance,
+            overdue_count=-int(instance.debt_status == DebtStatus.OVERDUE),
+        )
+
+
+@receiver([post_save, post_delete], sender=Debt)
+@receiver([post_save, post_delete], sender=Term)
+@receiver([post_save, post_delete], sender=Recovery)
+def invalidate_stats(sender, instance, update_fields=None, **kwargs):
+    stats_services.invalidate_stats_cache(sender)
+    stats_services.invalidate_timelines(sender, instance, update_fields)
@@ -0,0 +1,49 @@
+"""core/tests/test_models.py"""
+import pytest
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
+from core.models import SearchDocument
+from crm.models import PhysicalPersonDetail, Portfolio
+from receivables.models import Debt, DebtStatus
+from receivables.services import debt_services
+from sales.models import CreditSale
+
+@pytest.mark.django_db
+def test_search_documents_follow_source_rows(new_user, new_customer):
+    """
+    Test search documents are maintained on save/update/delete and can be rebuilt.
+    """
+    portfolio = Portfolio.objects.create(ref='PF_SEARCH', commercial=new_user)
+    sale = CreditSale.objects.create(
+        customer=new_customer, commercial=new_user, portfolio=portfolio, total_amount=Decimal('500.00')
+    )
+    debt = Debt.objects.create(sale=sale, init_amount=Decimal('500.00'), balance=Decimal('500.00'))
+
+    PhysicalPersonDetail.objects.create(customer=new_customer, first_name='Awa', last_name='Traore')
+    document = SearchDocument.objects.get(entity_type=SearchDocument.TYPE_DEBT, object_id=debt.pk)
+    assert document.title == f"Dette #{debt.pk} - Awa Traore"
+    assert f"#{sale.pk}" in document.search_text and document.portfolio_id == portfolio.pk
+
+    # Only the documents of the debts whose status changed are refreshed
+    Debt.objects.filter(pk=debt.pk).update(
+        balance=Decimal('120.00'), debt_status=DebtStatus.NOT_STARTED, start_date=date.today()
+    )
+    debt_services.update_financial_statuses()
+    document.refresh_from_db()
+    assert (document.amount, document.status) == (Decimal('120.00'), DebtStatus.ONGOING)
+
+    # Saving a customer without renaming it leaves the documents of its sales alone
+    SearchDocument.objects.filter(entity_type=SearchDocument.TYPE_SALE).update(title='untouched')
+    new_customer.save()
+    assert SearchDocument.objects.get(entity_type=SearchDocument.TYPE_SALE).title == 'untouched'
+
+    SearchDocument.objects.all().delete()
+    out = StringIO()
+    call_command('rebuild_search_index', stdout=out)
+    assert SearchDocument.objects.count() == 3
+    assert "Search index rebuilt" in out.getvalue()
+
+    debt.delete()
+    assert not SearchDocument.objects.filter(entity_type=SearchDocument.TYPE_DEBT).exists()
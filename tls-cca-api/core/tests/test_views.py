@@ -0,0 +1,158 @@
+"""core/tests/test_views.py"""
+import pytest
+from datetime import date
+from decimal import Decimal
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from core.services import kpi_services
+from crm.models import Customer, PhysicalPersonDetail, MoralPersonDetail, Portfolio
+from receivables.models import Debt, Term, RecoveryPaymentMode
+from receivables.services.recovery_services import create_recovery
+from sales.models import CreditSale, CreditSaleStatus
+from sales.services.creditsale_services import update_credit_sale_status
+from users.models import User
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+@pytest.mark.django_db
+class TestGlobalSearchView:
+    def test_search_ranks_customers_and_matches_details(self, api_client, new_user):
+        """Test customers are found by detail columns and ranked exact > prefix > contains."""
+        contains = Customer.objects.create(phone='111', email='x@example.com')
+        PhysicalPersonDetail.objects.create(customer=contains, first_name='Alice', last_name='Martin')
+        exact = Customer.objects.create(customer_type=Customer.TYPE_MORAL, phone='222')
+        MoralPersonDetail.objects.create(customer=exact, business_name='Martin', registration_number='RC-42')
+        by_id = Customer.objects.create(phone='333')
+        PhysicalPersonDetail.objects.create(customer=by_id, first_name='Bob', id_document_number='ID-9981')
+
+        api_client.force_authenticate(user=new_user)
+        response = api_client.get(reverse('global-search'), {'q': 'martin'})
+        assert response.status_code == 200
+        assert [c['id'] for c in response.data['customers']] == [exact.id, contains.id]
+
+        response = api_client.get(reverse('global-search'), {'q': 'ID-9981'})
+        assert [c['id'] for c in response.data['customers']] == [by_id.id]
+
+    def test_search_sales_by_number_and_customer(self, api_client, new_user, new_customer):
+        """Test sales are found by their number or their customer's name."""
+        sale = CreditSale.objects.create(
+            customer=new_customer, commercial=new_user, total_amount=Decimal('100.00')
+        )
+        api_client.force_authenticate(user=new_user)
+
+        response = api_client.get(reverse('global-search'), {'q': f'#{sale.id}'})
+        assert [s['id'] for s in response.data['sales']] == [sale.id]
+
+        response = api_client.get(reverse('global-search'), {'q': new_customer.display_name[:5]})
+        assert sale.id in [s['id'] for s in response.data['sales']]
+
+    def test_search_is_scoped_to_the_commercial(self, api_client, new_user, new_customer):
+        """Test a commercial without global view only finds their own sales."""
+        other = CreditSale.objects.create(customer=new_customer, commercial=new_user, total_amount=Decimal('10.00'))
+        commercial = User.objects.create_user(username='search_commercial', password='password123')
+        own = CreditSale.objects.create(customer=new_customer, commercial=commercial, total_amount=Decimal('20.00'))
+        api_client.force_authenticate(user=commercial)
+
+        response = api_client.get(reverse('global-search'), {'q': new_customer.display_name[:5]})
+        assert [s['id'] for s in response.data['sales']] == [own.id]
+        assert other.id not in [s['id'] for s in response.data['sales']]
+        assert response.data['customers'] == []
+
+    def test_autocomplete_refines_cached_prefix(self, api_client, new_user):
+        """Test autocomplete matches prefixes and refines longer ones from the cached shorter one."""
+        for first_name in ('Mariam', 'Marius', 'Moussa'):
+            customer = Customer.objects.create(phone='123456789')
+            PhysicalPersonDetail.objects.create(customer=customer, first_name=first_name)
+        api_client.force_authenticate(user=new_user)
+        url = reverse('search-autocomplete')
+
+        response = api_client.get(url, {'q': 'Ma'})
+        assert response.status_code == 200
+        assert [c['title'] for c in response.data['customers']] == ['Mariam', 'Marius']
+
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get(url, {'q': '  MARIU ', 'limit': 1})
+        assert [c['title'] for c in response.data['customers']] == ['Marius']
+        assert not [q for q in queries.captured_queries if 'core_searchdocument' in q['sql']]
+
+
+@pytest.mark.django_db
+class TestDashboardViews:
+    def test_summary_reads_incremental_rollups(self, api_client, new_user, new_customer):
+        """Test the dashboard summary follows sales, approvals and payments, and matches a rebuild."""
+        portfolio = Portfolio.objects.create(ref='PF_KPI', commercial=new_user)
+        sale = CreditSale.objects.create(
+            customer=new_customer, commercial=new_user, portfolio=portfolio, total_amount=Decimal('1000.00')
+        )
+        debt = Debt.objects.create(sale=sale, init_amount=Decimal('1000.00'), balance=Decimal('1000.00'))
+        term = Term.objects.create(debt=debt, term_date=date.today(), except_amount=Decimal('1000.00'))
+        update_credit_sale_status(sale, CreditSaleStatus.APPROVED)
+        create_recovery(new_user, term, Decimal('200.00'), RecoveryPaymentMode.CASH)
+
+        url = reverse('dashboard-summary')
+        api_client.force_authenticate(user=new_user)
+        response = api_client.get(url)
+        assert response.status_code == 200
+        assert response.data['sales'] == {
+            'total_volume': Decimal('1000.00'), 'total_count': 1, 'approved_count': 1
+        }
+        assert response.data['debts']['total_balance'] == Decimal('800.00')
+        assert response.data['recoveries'] == {'total_collected': Decimal('200.00'), 'recovery_rate': 20.0}
+
+        kpi_services.rebuild_kpi_rollups()
+        assert api_client.get(url).data == response.data
+
+        sale.delete()
+        deleted = api_client.get(url).data
+        assert deleted['sales']['total_count'] == 0 and deleted['debts']['total_balance'] == 0
+
+        other = User.objects.create_user(username='kpi_commercial', password='password123')
+        api_client.force_authenticate(user=other)
+        assert api_client.get(url).data['sales']['total_count'] == 0
+
+
+@pytest.mark.django_db
+class TestKeysetPagination:
+    def test_keyset_pages_are_stable_on_ties(self, api_client, new_user, new_customer):
+        """Test keyset pages walk rows sharing the same sort value, without COUNT(*)."""
+        sales = [
+            CreditSale.objects.create(customer=new_customer, commercial=new_user, total_amount=Decimal('10.00'))
+            for _ in range(5)
+        ]
+        CreditSale.objects.filter(pk__in=[s.pk for s in sales[1:4]]).update(sale_date=sales[0].sale_date)
+        api_client.force_authenticate(user=new_user)
+
+        url, seen = reverse('creditsale-list'), []
+        params = {'pagination': 'keyset', 'page_size': 2}
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = api_client.get(url, params)
+            assert response.status_code == 200 and 'count' not in response.data
+            assert not [q for q in queries.captured_queries if 'COUNT(' in q['sql']]
+            seen += [sale['id'] for sale in response.data['results']]
+            url, params = response.data['next'], None
+
+        assert seen == [sales[4].pk, sales[3].pk, sales[2].pk, sales[1].pk, sales[0].pk]
+
+        response = api_client.get(reverse('creditsale-list'), {'pagination': 'keyset', 'count': 'exact'})
+        assert response.data['count'] == 5
+        assert api_client.get(reverse('creditsale-list'), {'cursor': 'bogus'}).status_code == 404
+
+    def test_keyset_pages_walk_unordered_querysets(self, api_client, new_user):
+        """Test the next cursor of an unordered list (pk fallback) opens the following page."""
+        customers = [Customer.objects.create(phone=str(i)) for i in range(5)]
+        api_client.force_authenticate(user=new_user)
+
+        url, seen = reverse('customer-list-all'), []
+        params = {'pagination': 'keyset', 'page_size': 2}
+        while url:
+            response = api_client.get(url, params)
+            assert response.status_code == 200
+            seen += [customer['id'] for customer in response.data['results']]
+            url, params = response.data['next'], None
+
+        assert seen == [customer.pk for customer in customers]
@@ -1,11 +1,12 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
-from .views import DashboardViewSet, GlobalSearchView
+from .views import DashboardViewSet, GlobalSearchView, SearchAutocompleteView
 
 router = DefaultRouter()
 router.register(r'dashboard', DashboardViewSet, basename='dashboard')
 
 urlpatterns = [
     path('search/', GlobalSearchView.as_view(), name='global-search'),
+    path('search/autocomplete/', SearchAutocompleteView.as_view(), name='search-autocomplete'),
     *router.urls
 ]
\ No newline at end of file
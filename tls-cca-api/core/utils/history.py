@@ -0,0 +1,221 @@
+import copy
+import threading
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Value, signals
+from django.utils import timezone
+from simple_history.models import HistoricalRecords
+
+SNAPSHOT_ATTR = '_history_snapshot'
+UNCHANGED_ATTR = '_history_unchanged'
+
+_local = threading.local()
+
+# Model -> its SelectiveHistoricalRecords, see `update_with_history`
+CAPTURE_POLICIES = {}
+
+
+class SelectiveHistoricalRecords(HistoricalRecords):
+    """
+    HistoricalRecords with a capture policy, for high-churn models:
+    - skip_unchanged: a save that changes none of the saved fields (all tracked
+      fields, or `update_fields`) writes no history row. Saves whose values differ
+      from those loaded (or last saved) are recorded without a query; the others are
+      confirmed against the database row with one primary key lookup, so a stale
+      instance (saved after another write to the row) is still recorded.
+    - coalesce: inside a `coalesce_history()` block, the saves of a row write a single
+      history row, with its final state, when the block exits.
+    - bulk_updates: set-based updates made through `update_with_history` write their
+      history rows in bulk; without it they write none, like a plain `update()`.
+    """
+
+    def __init__(self, *args, skip_unchanged=True, coalesce=True, bulk_updates=True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.skip_unchanged = skip_unchanged
+        self.coalesce = coalesce
+        self.bulk_updates = bulk_updates
+        self._attnames = None
+
+    def finalize(self, sender, **kwargs):
+        super().finalize(sender, **kwargs)
+        if self.cls is not sender:
+            return
+        CAPTURE_POLICIES[sender] = self
+        if self.skip_unchanged:
+            signals.post_init.connect(self.take_snapshot, sender=sender, weak=False)
+            signals.pre_save.connect(self.pre_save, sender=sender, weak=False)
+
+    def take_snapshot(self, instance, **kwargs):
+        # Only a hint (see `is_unchanged`), kept cheap since it runs for every loaded row
+        if self._attnames is None:
+            self._attnames = [field.attname for field in self.fields_included(instance)]
+        loaded = instance.__dict__
+        instance.__dict__[SNAPSHOT_ATTR] = {name: loaded[name] for name in self._attnames if name in loaded}
+
+    def is_unchanged(self, instance, update_fields=None, using=None):
+        """Whether the row in the database already holds the values about to be saved."""
+        # An instance built in memory (even with a pk) may be an insert
+        if instance._state.adding or instance.pk is None:
+            return False
+        loaded = instance.__dict__
+        fields = [field for field in self.fields_included(instance) if field.attname in loaded]
+        if update_fields is not None:
+            names = set(update_fields)
+            fields = [field for field in fields if field.name in names or field.attname in names]
+        snapshot = getattr(instance, SNAPSHOT_ATTR, None) or {}
+        if any(field.attname in snapshot and snapshot[field.attname] != loaded[field.attname] for field in fields):
+            return False
+        lookups = {}
+        for field in fields:
+            value = loaded[field.attname]
+            if value is None:
+                lookups[f"{field.attname}__isnull"] = True
+            else:
+                lookups[field.attname] = value
+        manager = type(instance)._base_manager.db_manager(using or instance._state.db)
+        return manager.filter(pk=instance.pk, **lookups).exists()
+
+    def pre_save(self, instance, update_fields=None, raw=False, using=None, **kwargs):
+        # Compared before saving: `_state.adding` is reset by then in post_save
+        if not raw:
+            instance.__dict__[UNCHANGED_ATTR] = self.is_unchanged(instance, update_fields, using)
+
+    def post_save(self, instance, created, using=None, **kwargs):
+        unchanged = instance.__dict__.pop(UNCHANGED_ATTR, False)
+        if self.skip_unchanged:
+            self.take_snapshot(instance)
+        if (
+            not getattr(settings, "SIMPLE_HISTORY_ENABLED", True)
+            or hasattr(instance, "skip_history_when_saving")
+            or kwargs.get("raw", False)
+            or unchanged
+        ):
+            return
+
+        pending = getattr(_local, 'pending', None)
+        if self.coalesce and pending is not None:
+            key = (type(instance), instance.pk)
+            history_type = pending[key][1] if key in pending else ("+" if created else "~")
+            record = copy.copy(instance)
+            record._history_user = self.get_history_user(instance)
+            pending[key] = (self, history_type, record, using)
+            return
+        self.create_historical_record(instance, "+" if created else "~", using=using)
+
+    def post_delete(self, instance, using=None, **kwargs):
+        # Write the coalesced row of the deleted instance first, to keep rows in order
+        pending = getattr(_local, 'pending', None)
+        if pending is not None:
+            entry = pending.pop((type(instance), instance.pk), None)
+            if entry is not None:
+                _write_pending([entry])
+        super().post_delete(instance, using=using, **kwargs)
+
+
+def _write_pending(entries):
+    """Writes coalesced history rows, one bulk INSERT per model and history type."""
+    groups = {}
+    for records, history_type, instance, using in entries:
+        groups.setdefault((records, history_type), []).append(instance)
+    now = timezone.now()
+    for (records, history_type), instances in groups.items():
+        getattr(records.cls, records.manager_name).bulk_history_create(
+            instances, update=history_type == "~", default_date=now
+        )
+
+
+@contextmanager
+def coalesce_history():
+    """
+    Within this block, the saves of models using SelectiveHistoricalRecords (with
+    `coalesce`) write one history row per saved row, when the outermost block exits.
+    Meant to wrap a transaction: the rows are written inside it when nested in
+    `transaction.atomic()`, and dropped if the block raises.
+    """
+    if getattr(_local, 'pending', None) is not None:
+        yield
+        return
+    _local.pending = {}
+    try:
+        yield
+        entries = list(_local.pending.values())
+    finally:
+        _local.pending = None
+    _write_pending(entries)
+
+
+def update_with_history(queryset, change_reason="", on_batch=None, **values):
+    """
+    Set-based counterpart of `queryset.update(**values)` that keeps the audit trail:
+    in one transaction, the history rows of the matching rows are written with their
+    new values by a single INSERT ... SELECT (locking the rows on PostgreSQL), then
+    the rows they record are changed by a single UPDATE. `on_batch`, if given, is
+    called inside the transaction with the primary keys of the updated rows (a
+    subquery, or a list for models without history). Returns the number of updated rows.
+
+    For models without history, or whose policy disables `bulk_updates`, this is a
+    plain `update`.
+    """
+    model = queryset.model
+    manager_name = getattr(model._meta, 'simple_history_manager_attribute', None)
+    policy = CAPTURE_POLICIES.get(model)
+    if (
+        manager_name is None
+        or (policy is not None and not policy.bulk_updates)
+        or not getattr(settings, "SIMPLE_HISTORY_ENABLED", True)
+    ):
+        if on_batch is None:
+            return queryset.update(**values)
+        with transaction.atomic():
+            pks = list(queryset.select_for_update().values_list('pk', flat=True))
+            queryset.model._default_manager.filter(pk__in=pks).update(**values)
+            on_batch(pks)
+        return len(pks)
+
+    history = getattr(model, manager_name).model
+    now = timezone.now()
+    with transaction.atomic(using=queryset.db):
+        _insert_history_rows(queryset, history, values, change_reason, now)
+        # The rows just recorded: the history date of this call tells them apart
+        pks = history._default_manager.using(queryset.db).filter(
+            history_date=now, history_type="~", history_change_reason=change_reason
+        ).values(model._meta.pk.attname)
+        updated = model._default_manager.using(queryset.db).filter(pk__in=pks).update(**values)
+        if on_batch is not None:
+            on_batch(pks)
+    return updated
+
+
+def _insert_history_rows(queryset, history, values, change_reason, date):
+    """Copies the rows of `queryset`, with `values` applied, into `history` in one statement."""
+    model = queryset.model
+    attnames = {field.attname for field in model._meta.concrete_fields}
+    constants = {
+        'history_date': (date, history._meta.get_field('history_date')),
+        'history_type': ("~", history._meta.get_field('history_type')),
+        'history_change_reason': (change_reason, history._meta.get_field('history_change_reason')),
+    }
+    columns, select = [], {}
+    for field in history._meta.concrete_fields:
+        if field.attname in constants:
+            value, output_field = constants[field.attname]
+            expression = Value(value, output_field=output_field)
+        elif field.attname in attnames:
+            value = values.get(field.name, values.get(field.attname, F(field.attname)))
+            expression = value if hasattr(value, 'resolve_expression') else Value(value, output_field=field)
+        else:
+            continue  # history_id, history_user: their defaults
+        columns.append(field.column)
+        select[f"_history_{len(columns)}"] = expression
+    rows = queryset.select_for_update().order_by('pk').annotate(**select).values(*select)
+    compiler = rows.query.get_compiler(queryset.db)
+    sql, params = compiler.as_sql()
+    # Name the columns in the order the SELECT lists them
+    order = [alias for _, _, alias in compiler.select]
+    columns = [columns[int(alias.rsplit('_', 1)[1]) - 1] for alias in order]
+    quote = connections[queryset.db].ops.quote_name
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote(history._meta.db_table)} ({', '.join(map(quote, columns))}) {sql}", params
+        )
@@ -39,4 +39,35 @@ class GlobalSearchView(views.APIView):
             return Response({"detail": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
             
         results = search_services.search_global(request.user, query)
-        return Response(results, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response(results, status=status.HTTP_200_OK)
+
+@extend_schema(tags=["Search"])
+class SearchAutocompleteView(views.APIView):
+    """
+    Search-as-you-type endpoint: prefix matches grouped like the global search,
+    cached per scope and prefix for a short time.
+    """
+    permission_classes = []
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(name='q', description='Prefix typed so far', required=True, type=str),
+            OpenApiParameter(
+                name='limit', type=int,
+                description=f'Results per type (default {search_services.SEARCH_LIMIT}, '
+                            f'max {search_services.AUTOCOMPLETE_CANDIDATES})'
+            ),
+        ],
+        responses={200: dict}
+    )
+    def get(self, request):
+        if not request.user.is_authenticated:
+            return Response({"detail": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
+        try:
+            limit = int(request.query_params.get('limit', search_services.SEARCH_LIMIT))
+        except ValueError:
+            return Response({"detail": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, search_services.AUTOCOMPLETE_CANDIDATES))
+
+        results = search_services.autocomplete(request.user, request.query_params.get('q', ''), limit=limit)
+        return Response(results, status=status.HTTP_200_OK)
@@ -19,9 +19,9 @@ class MoralPersonDetailInline(admin.StackedInline):
 @admin.register(Customer)
 class CustomerAdmin(admin.ModelAdmin):
     list_display = ('id', 'display_name', 'customer_type', 'email', 'phone', 'portfolio', 'created_at')
-    search_fields = ('email', 'phone', 'physical_detail__first_name', 'physical_detail__last_name', 'moral_detail__business_name')
+    search_fields = ('display_name', 'email', 'phone', 'physical_detail__first_name', 'physical_detail__last_name', 'moral_detail__business_name')
     list_filter = ('customer_type', 'portfolio')
-    readonly_fields = ('created_at',)
+    readonly_fields = ('created_at', 'display_name')
     inlines = [PhysicalPersonDetailInline, MoralPersonDetailInline]
 
     # Ajout de JavaScript pour afficher/masquer les inlines dynamiquement
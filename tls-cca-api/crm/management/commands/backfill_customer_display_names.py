@@ -0,0 +1,17 @@
+"""
+Management command to (re)compute the persisted display_name of every customer,
+e.g. after the column was added or after details were modified outside the app.
+"""
+from django.core.management.base import BaseCommand
+
+from crm.services.customer_services import backfill_display_names
+
+class Command(BaseCommand):
+    help = "Backfill Customer.display_name from the physical/moral details"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Customers processed per batch.")
+
+    def handle(self, *args, **options):
+        updated = backfill_display_names(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"✔️  {updated} customer display names updated."))
@@ -1,5 +1,5 @@
 """ CRM Models"""
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from simple_history.models import HistoricalRecords
@@ -28,6 +28,8 @@ class Customer(models.Model):
     address = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     is_active = models.BooleanField(default=True)
+    # Denormalized from the physical/moral details, kept up to date on save (see compute_display_name)
+    display_name = models.CharField(max_length=255, blank=True, db_index=True, editable=False)
     history = HistoricalRecords()
 
     class Meta:
@@ -35,13 +37,32 @@ class Customer(models.Model):
         verbose_name_plural = 'Customers'
     
     def __str__(self):
-        return self.display_name
+        return self.display_name or f"Customer #{self.pk or 'unsaved'}"
 
-    @property
-    def display_name(self) -> str:
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'email', 'phone', 'customer_type'} & set(update_fields):
+            self.display_name = self.compute_display_name()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'display_name'}
+        super().save(*args, **kwargs)
+
+    def refresh_display_name(self) -> str:
+        """
+        Recomputes the persisted display name (e.g. after its details changed)
+        and saves it only if it differs, so the customer's post_save handlers
+        (search index) see the new name.
+        """
+        display_name = self.compute_display_name()
+        if display_name != self.display_name:
+            self.display_name = display_name
+            self.save(update_fields=['display_name'])
+        return display_name
+
+    def compute_display_name(self) -> str:
         """
         Returns a readable display name for admin/logs.
-        Priority: Physical person (first name + last name) > Moral person (business_name) > email > phone > fallback.
+        Priority: Physical person (first name + last name) > Moral person (business_name) > email > phone.
         """
         # Physical detail (OneToOne) — protected access against DoesNotExist
         try: pd = self.physical_detail
@@ -61,7 +82,7 @@ class Customer(models.Model):
         # Fallbacks
         if self.email: return self.email
         if self.phone: return self.phone
-        return f"Customer #{self.pk or 'unsaved'}"
+        return ""
 
 class PhysicalPersonDetail(models.Model):
     customer = models.OneToOneField('Customer', on_delete=models.CASCADE, related_name='physical_detail')
@@ -81,6 +102,12 @@ class PhysicalPersonDetail(models.Model):
         verbose_name = "Physical person detail"
         verbose_name_plural = "Physical person details"
 
+    def save(self, *args, **kwargs):
+        # The name is computed once the detail is written: before, a new detail is not found
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.customer.refresh_display_name()
+
     def __str__(self):
         # Initialy show the customer name
         return f"Physical details for {self.customer}"
@@ -102,6 +129,12 @@ class MoralPersonDetail(models.Model):
         verbose_name = "Moral person detail"
         verbose_name_plural = "Moral person details"
 
+    def save(self, *args, **kwargs):
+        # The name is computed once the detail is written: before, a new detail is not found
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.customer.refresh_display_name()
+
     def __str__(self):
         return self.business_name or f"Moral details for {self.customer}"
 
@@ -47,7 +47,6 @@ class CustomerSerializer(serializers.ModelSerializer):
     """
     physical_detail = PhysicalPersonDetailSerializer(required=False, allow_null=True)
     moral_detail = MoralPersonDetailSerializer(required=False, allow_null=True)
-    display_name = serializers.CharField(source='get_display_name', read_only=True)
 
     class Meta:
         model = Customer
@@ -1,12 +1,14 @@
 # crm/services/customer_services.py
+from django.core.exceptions import ObjectDoesNotExist
 from django.db import transaction, models
 from django.utils import timezone
 from datetime import timedelta
-from django.db.models import Subquery, OuterRef
+from django.db.models import Exists, OuterRef
 
 from ..models import Customer, PhysicalPersonDetail, MoralPersonDetail, Portfolio
 from sales.models import CreditSale
 from receivables.models import Debt
+from core.services.search_index_services import index_customer_trees
 
 
 def create_customer(validated_data: dict, creator=None) -> Customer:
@@ -55,13 +57,52 @@ def update_customer(instance: Customer, validated_data: dict) -> Customer:
 
     # Update nested details
     if instance.customer_type == Customer.TYPE_PHYSICAL and physical_detail_data:
-        PhysicalPersonDetail.objects.update_or_create(customer=instance, defaults=physical_detail_data)
+        _update_or_create_detail(instance, 'physical_detail', PhysicalPersonDetail, physical_detail_data)
     elif instance.customer_type == Customer.TYPE_MORAL and moral_detail_data:
-        MoralPersonDetail.objects.update_or_create(customer=instance, defaults=moral_detail_data)
+        _update_or_create_detail(instance, 'moral_detail', MoralPersonDetail, moral_detail_data)
 
     return instance
 
 
+def _update_or_create_detail(customer: Customer, related_name: str, model, data: dict):
+    """
+    Updates (or creates) a customer's physical/moral detail through the customer
+    instance itself, so saving the detail refreshes this instance's display_name.
+    """
+    try:
+        detail = getattr(customer, related_name)
+    except ObjectDoesNotExist:
+        detail = model(customer=customer)
+    for attr, value in data.items():
+        setattr(detail, attr, value)
+    detail.save()
+    return detail
+
+
+def backfill_display_names(batch_size: int = 1000) -> int:
+    """
+    Recomputes the persisted display_name of every customer, in batches.
+    Returns the number of customers whose display name changed.
+    """
+    updated = 0
+    last_pk = 0
+    queryset = Customer.objects.select_related('physical_detail', 'moral_detail').order_by('pk')
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return updated
+        changed = []
+        for customer in batch:
+            display_name = customer.compute_display_name()
+            if display_name != customer.display_name:
+                customer.display_name = display_name
+                changed.append(customer)
+        Customer.objects.bulk_update(changed, ['display_name'])
+        index_customer_trees([customer.pk for customer in changed])
+        updated += len(changed)
+        last_pk = batch[-1].pk
+
+
 def activate_customer(customer: Customer) -> Customer:
     """ Set customer as active """
     if not customer.is_active:
@@ -76,7 +117,7 @@ def deactivate_customer(customer: Customer) -> Customer:
         customer.save(update_fields=['is_active'])
     return customer
 
-def auto_deactivate_inactive_customers() -> tuple[int, int]:
+def auto_deactivate_inactive_customers(dry_run: bool = False) -> tuple[int, int]:
     """
     Deactivates customers who have been inactive for more than 4 years.
 
@@ -85,58 +126,30 @@ def auto_deactivate_inactive_customers() -> tuple[int, int]:
     - Or has a debt that was closed within the last 4 years.
     - Or was created within the last 4 years.
 
+    The deactivation is a single set-based UPDATE: a customer is inactive when
+    none of the three activity dates is recent, which is checked with NOT EXISTS
+    anti-joins rather than computing the latest date per customer.
+    With `dry_run`, nothing is updated and only the counts are returned.
+
     Returns a tuple of (number of customers checked, number of customers deactivated).
     """
     four_years_ago = timezone.now() - timedelta(days=4*365)
 
-    # Subquery to find the last sale date for a customer
-    last_sale_date = CreditSale.objects.filter(
-        customer=OuterRef('pk')
-    ).order_by('-sale_date').values('sale_date')[:1]
-
-    # Subquery to find the last debt close date for a customer
-    last_debt_close_date = Debt.objects.filter(
-        sale__customer=OuterRef('pk')
-    ).order_by('-close_date').values('close_date')[:1]
-
-    # Get all active customers to check
-    customers_to_check = Customer.objects.filter(is_active=True)
-    total_checked = customers_to_check.count()
-    deactivated_count = 0
-    
-    # Annotate with the latest activity dates
-    customers_with_activity = customers_to_check.annotate(
-        last_sale=Subquery(last_sale_date, output_field=models.DateTimeField()),
-        last_debt_close=Subquery(last_debt_close_date, output_field=models.DateField())
-    )
-
-    customers_to_deactivate_pks = []
-    for customer in customers_with_activity:
-        # Determine the last activity date, considering all might be None
-        last_activity_date = customer.created_at
-        
-        if customer.last_sale:
-            # Pytz adds timezone info to the datetime object, so we make created_at aware too
-            aware_created_at = timezone.make_aware(
-                customer.created_at, timezone.get_default_timezone()
-            ) if timezone.is_naive(customer.created_at) else customer.created_at
-            last_activity_date = max(aware_created_at, customer.last_sale)
-
-        if customer.last_debt_close:
-            # Convert date to datetime to compare with other activity dates
-            debt_close_datetime = timezone.make_aware(
-                timezone.datetime.combine(customer.last_debt_close, timezone.datetime.min.time())
-            )
-            last_activity_date = max(last_activity_date, debt_close_datetime)
-
-        # If the last activity was more than 4 years ago, deactivate
-        if last_activity_date < four_years_ago:
-            customers_to_deactivate_pks.append(customer.pk)
-
-    if customers_to_deactivate_pks:
-        deactivated_count = Customer.objects.filter(pk__in=customers_to_deactivate_pks).update(is_active=False)
-
-    return total_checked, deactivated_count
+    # A credit sale within the last 4 years
+    recent_sale = CreditSale.objects.filter(customer=OuterRef('pk'), sale_date__gte=four_years_ago)
+    # A debt closed within the last 4 years (close_date is a date, compared at midnight)
+    recent_debt_close = Debt.objects.filter(sale__customer=OuterRef('pk'), close_date__gt=four_years_ago.date())
+
+    active_customers = Customer.objects.filter(is_active=True)
+    total_checked = active_customers.count()
+
+    inactive_customers = active_customers.filter(
+        created_at__lt=four_years_ago,
+    ).exclude(Exists(recent_sale)).exclude(Exists(recent_debt_close))
+
+    if dry_run:
+        return total_checked, inactive_customers.count()
+    return total_checked, inactive_customers.update(is_active=False)
 
 
 def get_customers_for_user(user) -> models.QuerySet[Customer]:
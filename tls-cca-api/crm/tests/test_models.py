@@ -1,5 +1,8 @@
 import pytest
+from io import StringIO
+from django.core.management import call_command
 from crm.models import Customer, PhysicalPersonDetail, MoralPersonDetail
+from crm.services.customer_services import create_customer, update_customer
 
 @pytest.mark.django_db
 def test_customer_physical_person_display_name():
@@ -50,3 +53,38 @@ def test_customer_display_name_fallbacks():
         phone='444555666'
     )
     assert customer_phone.display_name == '444555666'
+
+@pytest.mark.django_db
+def test_customer_display_name_is_persisted():
+    """
+    Test the display name column follows detail updates and can be backfilled.
+    """
+    customer = create_customer({
+        'customer_type': Customer.TYPE_PHYSICAL,
+        'phone': '1234567890',
+        'physical_detail': {'first_name': 'John', 'last_name': 'Doe'},
+    })
+    assert Customer.objects.filter(display_name='John Doe').get() == customer
+
+    update_customer(customer, {'physical_detail': {'first_name': 'Jane'}})
+    assert customer.display_name == 'Jane Doe'
+    assert Customer.objects.get(pk=customer.pk).display_name == 'Jane Doe'
+
+    # Rows written behind the model's back are fixed by the backfill command
+    Customer.objects.filter(pk=customer.pk).update(display_name='')
+    call_command('backfill_customer_display_names', stdout=StringIO())
+    assert Customer.objects.get(pk=customer.pk).display_name == 'Jane Doe'
+
+@pytest.mark.django_db
+def test_customer_display_name_follows_detail_rows():
+    """
+    Test a detail created by customer id names the customer, and its deletion falls back.
+    """
+    customer = Customer.objects.create(email='named@example.com')
+    assert customer.display_name == 'named@example.com'
+
+    detail = PhysicalPersonDetail.objects.create(customer_id=customer.pk, first_name='Awa', last_name='Diop')
+    assert Customer.objects.get(pk=customer.pk).display_name == 'Awa Diop'
+
+    detail.delete()
+    assert Customer.objects.get(pk=customer.pk).display_name == 'named@example.com'
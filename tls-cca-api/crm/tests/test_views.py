@@ -1,8 +1,12 @@
 """crm/tests/test_views.py"""
 import pytest
+from datetime import timedelta
+from decimal import Decimal
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APIClient
 from crm.models import Customer, PhysicalPersonDetail
+from sales.models import CreditSale
 
 @pytest.fixture
 def api_client():
@@ -49,4 +53,25 @@ class TestCustomerViews:
         api_client.force_authenticate(user=new_user)
         response = api_client.get(url)
         assert response.status_code == 200
-        assert response.data['email'] == new_customer.email
\ No newline at end of file
+        assert response.data['email'] == new_customer.email
+
+    def test_bulk_deactivate_inactive_customers(self, api_client, new_user):
+        """Test the auto-deactivation dry run and actual run."""
+        old = timezone.now() - timedelta(days=5 * 365)
+        inactive = Customer.objects.create(phone='1111111', email='inactive@example.com')
+        recent_buyer = Customer.objects.create(phone='2222222', email='buyer@example.com')
+        Customer.objects.create(phone='3333333', email='new@example.com')
+        Customer.objects.filter(pk__in=[inactive.pk, recent_buyer.pk]).update(created_at=old)
+        CreditSale.objects.create(customer=recent_buyer, commercial=new_user, total_amount=Decimal('100.00'))
+
+        url = reverse('customer-bulk-deactivate')
+        api_client.force_authenticate(user=new_user)
+        response = api_client.post(f'{url}?dry_run=true')
+        assert response.status_code == 200
+        assert response.data['checked_customers'] == 3
+        assert response.data['deactivated_customers'] == 1
+        assert Customer.objects.filter(is_active=False).count() == 0
+
+        response = api_client.post(url)
+        assert response.data['deactivated_customers'] == 1
+        assert list(Customer.objects.filter(is_active=False)) == [inactive]
@@ -10,6 +10,7 @@ router.register(r'customers-histories', CustomerHistoryViewSet, basename="custom
 router.register(r'portfolios-histories', PortfolioHistoryViewSet, basename="portfolio-histories")
 
 urlpatterns = [
-    *router.urls,
+    # Declared before the router, otherwise 'bulk-deactivate' is matched as a customer pk
     path('customers/bulk-deactivate/', CustomerBulkDeactivationView.as_view(), name='customer-bulk-deactivate'),
+    *router.urls,
 ]
\ No newline at end of file
@@ -7,6 +7,7 @@ from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 
 from rbac.services.permission_services import AutoPermissionMixin
+from core.mixins.history import HistoryArchiveMixin
 from .models import *
 from .serializers import *
 from .filters import CustomerFilter
@@ -88,12 +89,14 @@ class CustomerBulkDeactivationView(AutoPermissionMixin, APIView):
     
     @extend_schema(
         summary="Auto-deactivate Inactive Customers",
+        parameters=[OpenApiParameter(name='dry_run', description='Only count the customers to deactivate', required=False, type=bool)],
         responses={
             200: OpenApiParameter(
                 name='Deactivation Summary',
                 type={'type': 'object', 'properties': {
                     'checked_customers': {'type': 'integer'},
                     'deactivated_customers': {'type': 'integer'},
+                    'dry_run': {'type': 'boolean'},
                     'detail': {'type': 'string'}
                 }}
             )
@@ -103,12 +106,15 @@ class CustomerBulkDeactivationView(AutoPermissionMixin, APIView):
         """
         Triggers the service to find and deactivate customers inactive for over 4 years.
         """
-        total_checked, deactivated_count = auto_deactivate_inactive_customers()
+        dry_run = request.query_params.get('dry_run', '').lower() in ('true', '1')
+        total_checked, deactivated_count = auto_deactivate_inactive_customers(dry_run=dry_run)
         
+        verb = 'Would deactivate' if dry_run else 'Deactivated'
         response_data = {
             'checked_customers': total_checked,
             'deactivated_customers': deactivated_count,
-            'detail': f'Checked {total_checked} active customers. Deactivated {deactivated_count} inactive customers.'
+            'dry_run': dry_run,
+            'detail': f'Checked {total_checked} active customers. {verb} {deactivated_count} inactive customers.'
         }
         return Response(response_data, status=status.HTTP_200_OK)
 
@@ -132,7 +138,7 @@ class PortfolioViewSet(
     serializer_class = PortfolioSerializer
 
 @extend_schema(tags=["Customers"])
-class CustomerHistoryViewSet(AutoPermissionMixin, viewsets.ReadOnlyModelViewSet):
+class CustomerHistoryViewSet(AutoPermissionMixin, HistoryArchiveMixin, viewsets.ReadOnlyModelViewSet):
     """
 
     """
@@ -141,7 +147,7 @@ class CustomerHistoryViewSet(AutoPermissionMixin, viewsets.ReadOnlyModelViewSet)
     serializer_class = HistoricalCustomerSerializer
 
 @extend_schema(tags=["Portfolios"])
-class PortfolioHistoryViewSet(AutoPermissionMixin, viewsets.ReadOnlyModelViewSet):
+class PortfolioHistoryViewSet(AutoPermissionMixin, HistoryArchiveMixin, viewsets.ReadOnlyModelViewSet):
     """
     
     """
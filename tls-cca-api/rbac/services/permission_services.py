@@ -1,6 +1,9 @@
 # Generic DRF permissions
 from rest_framework.permissions import BasePermission
 from rest_framework.permissions import IsAuthenticated
+import time
+from django.core.cache import cache
+from django.db import transaction
 from django.db.models import Q
 from django.conf import settings
 
@@ -95,4 +98,66 @@ def get_user_permissions(user: User):
     """
     return Permission.objects.filter(
         Q(roles__users=user) | Q(roles__groups__users=user)
-    ).distinct()
\ No newline at end of file
+    ).distinct()
+
+# ----- Permission cache -----
+# Resolved permission codes are cached per user under a global version number.
+# Any RBAC change (see rbac/signals.py) bumps the version, which makes every
+# cached entry unreachable at once instead of tracking which users are affected.
+PERMISSION_CACHE_VERSION_KEY = 'rbac:permissions:version'
+PERMISSION_CACHE_KEY = 'rbac:permissions:{version}:{user_id}'
+
+def get_permission_cache_version() -> int:
+    """Returns the current RBAC version, initialising it if the cache lost it."""
+    version = cache.get(PERMISSION_CACHE_VERSION_KEY)
+    if version is None:
+        # Time-based seed so a lost key never revives entries from an old version
+        cache.add(PERMISSION_CACHE_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(PERMISSION_CACHE_VERSION_KEY)
+    return version
+
+
+def invalidate_permission_cache():
+    """
+    Invalidates the resolved permissions of every user, once the current transaction
+    commits: bumped earlier, a concurrent request could still read the old grants and
+    cache them under the new version.
+    """
+    transaction.on_commit(_bump_permission_cache_version)
+
+
+def _bump_permission_cache_version():
+    try:
+        cache.incr(PERMISSION_CACHE_VERSION_KEY)
+    except ValueError:
+        cache.set(PERMISSION_CACHE_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def get_user_permission_codes(user: User) -> frozenset[str]:
+    """
+    Returns the set of permission codes granted to a user.
+    The set is memoized on the user instance (i.e. for the request) and shared
+    across requests through the cache, both under the RBAC version: any RBAC change,
+    made by any process, drops them.
+    """
+    if not user or not user.pk:
+        return frozenset()
+
+    version = get_permission_cache_version()
+    memo = getattr(user, '_permission_codes', None)
+    if memo is not None and memo[0] == version:
+        return memo[1]
+
+    key = PERMISSION_CACHE_KEY.format(version=version, user_id=user.pk)
+    codes = cache.get(key)
+    if codes is None:
+        codes = frozenset(get_user_permissions(user).values_list('code', flat=True))
+        cache.set(key, codes, getattr(settings, 'RBAC_PERMISSION_CACHE_TTL', 300))
+
+    memoize_permission_codes(user, codes, version)
+    return codes
+
+
+def memoize_permission_codes(user: User, codes: frozenset[str], version: int) -> None:
+    """Memoizes codes resolved at an RBAC version on a user instance (e.g. from token claims)."""
+    user._permission_codes = (version, codes)
@@ -1,7 +1,11 @@
 import json
 from django.dispatch import receiver
-from django.db.models.signals import m2m_changed
-from .models import Role
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.contrib.auth import get_user_model
+from .models import Role, Group, Permission
+from .services.permission_services import invalidate_permission_cache
+
+User = get_user_model()
 
 
 @receiver(m2m_changed, sender=Role.permissions.through)
@@ -27,3 +31,27 @@ def save_permissions_in_role_history(sender, instance, action, **kwargs):
         data['permissions'] = current_permission_codes
         latest_history.history_change_reason = json.dumps(data)
         latest_history.save(update_fields=['history_change_reason'])
+
+
+# Invalidate the resolved permission cache whenever the RBAC graph changes:
+# role <-> permission, group <-> role, user <-> role and user <-> group links.
+# The version is bumped when the transaction commits (see invalidate_permission_cache).
+@receiver(m2m_changed, sender=Role.permissions.through)
+@receiver(m2m_changed, sender=Group.roles.through)
+@receiver(m2m_changed, sender=User.roles.through)
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_permissions_on_m2m_change(sender, instance, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        # Also drops the codes memoized on loaded users, in every process and
+        # whichever side of the link (user.roles or role.users) was changed
+        invalidate_permission_cache()
+
+
+# Deleting a permission, role or group removes its links without m2m_changed,
+# and renaming a permission code changes what the cached sets contain.
+@receiver(post_delete, sender=Permission)
+@receiver(post_delete, sender=Role)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Permission)
+def invalidate_permissions_on_rbac_change(sender, **kwargs):
+    invalidate_permission_cache()
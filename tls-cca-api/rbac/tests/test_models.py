@@ -27,3 +27,40 @@ def test_role_permission_assignment():
     # Check the reverse relationship
     assert permission.roles.count() == 1
     assert permission.roles.first().name == "Support Level 1"
+
+@pytest.mark.django_db
+def test_user_permission_codes_are_cached_and_invalidated(django_assert_num_queries, django_capture_on_commit_callbacks):
+    """
+    Test that resolved permissions are served from the cache and refreshed
+    when the role's permissions change.
+    """
+    from users.models import User
+
+    permission = Permission.objects.create(code="debt.list", label="List debts")
+    role = Role.objects.create(name="Collector")
+    role.permissions.add(permission)
+    user = User.objects.create_user(username='collector', email='collector@example.com', password='password')
+    user.roles.add(role)
+
+    assert user.has_permission("debt.list") is True
+
+    # Same request (same instance) and a new request (fresh instance) hit no table
+    with django_assert_num_queries(0):
+        assert user.has_permission("debt.view") is False
+    with django_assert_num_queries(0):
+        assert User(pk=user.pk).has_permission("debt.list") is True
+
+    # The version is only bumped once the change commits
+    with django_capture_on_commit_callbacks() as callbacks:
+        role.permissions.remove(permission)
+        assert User.objects.get(pk=user.pk).has_permission("debt.list") is True
+    for callback in callbacks:
+        callback()
+    assert User.objects.get(pk=user.pk).has_permission("debt.list") is False
+
+    # A link added from the role's side drops the codes memoized on loaded users too
+    auditor = Role.objects.create(name="Auditor")
+    auditor.permissions.add(Permission.objects.create(code="debt.view", label="View a debt"))
+    with django_capture_on_commit_callbacks(execute=True):
+        auditor.users.add(user)
+    assert user.has_permission("debt.view") is True
@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from .models import Group, Role, Permission
 from .serializers import *
 from .services.permission_services import AutoPermissionMixin
+from core.mixins.history import HistoryArchiveMixin
 from .services import assignment_services, group_services, role_services
 
 from drf_spectacular.utils import extend_schema_view, extend_schema
@@ -156,13 +157,14 @@ class RemoveUserFromGroupView(BaseUserGroupView):
 
 # ----- Historical Read -----
 
-class BaseHistoryListView(generics.ListAPIView):
+class BaseHistoryListView(HistoryArchiveMixin, generics.ListAPIView):
     """
     Base view to handle historical listing by primary key (for single object)
     or for all objects if `get_all` is set to True.
     """
     model = None  # Must be defined in subclass
     get_all = False
+    history_object_kwarg = 'pk'
 
     def get_queryset(self):
         if self.get_all:
@@ -195,7 +197,7 @@ class RoleHistoryListView(AutoPermissionMixin, BaseHistoryListView):
     resource = "role_history"
 
 @extend_schema_view(get=extend_schema(operation_id="all_role_history", tags=["Roles"]))
-class AllRoleHistoryListView(AutoPermissionMixin, generics.ListAPIView):
+class AllRoleHistoryListView(AutoPermissionMixin, HistoryArchiveMixin, generics.ListAPIView):
     serializer_class = HistoricalRoleSerializer
     resource = "role_history"
     queryset = Role.history.all().order_by('-history_date')
@@ -210,7 +212,7 @@ class GroupHistoryListView(AutoPermissionMixin, BaseHistoryListView):
 
 @extend_schema_view(get=extend_schema( operation_id="all_group_history" ))
 @extend_schema(tags=["Groups"])
-class AllGroupHistoryListView(AutoPermissionMixin, generics.ListAPIView):
+class AllGroupHistoryListView(AutoPermissionMixin, HistoryArchiveMixin, generics.ListAPIView):
     serializer_class = HistoricalGroupSerializer
     resource = "group_history"
     queryset = Group.history.all().order_by('-history_date')
\ No newline at end of file
@@ -17,4 +17,4 @@ class RecoveryFilter(BaseDateRangeFilter):
     class Meta:
         model = Recovery
         fields = ['payment_mode', 'commercial']
-        date_field = 'date'
\ No newline at end of file
+        date_field = 'recovery_date'
\ No newline at end of file
@@ -0,0 +1,24 @@
+"""
+Management command to run the nightly Debt/Term status update outside of an HTTP request.
+The tables are processed in primary-key chunks, each committed separately, and an
+interrupted run resumes from its last checkpoint.
+"""
+from django.core.management.base import BaseCommand
+
+from receivables.services import debt_services
+
+class Command(BaseCommand):
+    help = "Update Debt and Term statuses (OVERDUE, ONGOING, ...) in resumable chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows per chunk (primary-key range).")
+        parser.add_argument('--restart', action='store_true', help="Ignore an unfinished run and start over.")
+
+    def handle(self, *args, **options):
+        counts = debt_services.update_financial_statuses(
+            batch_size=options['batch_size'],
+            restart=options['restart'],
+        )
+        for key, count in counts.items():
+            self.stdout.write(f"{key}: {count}")
+        self.stdout.write(self.style.SUCCESS("✔️  Financial statuses updated."))
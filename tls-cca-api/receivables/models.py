@@ -1,8 +1,9 @@
 """ Receivables Models """
-from datetime import date
+from datetime import date, timedelta
 from django.db import models
 from django.conf import settings
 from simple_history.models import HistoricalRecords
+from core.utils.history import SelectiveHistoricalRecords
 from django.core.validators import MinValueValidator
 from django.utils.translation import gettext_lazy as _
 
@@ -37,16 +38,37 @@ class Debt(models.Model):
     month_duration = models.PositiveIntegerField(default=1)
     regulation_mode = models.CharField(max_length=50)
     debt_status = models.CharField(max_length=20, choices=DebtStatus.choices, default=DebtStatus.ONGOING)
-    history = HistoricalRecords()
+    # Theoretical deadline, derived from start_date and month_duration on save
+    due_date = models.DateField(null=True, blank=True, editable=False)
+    # High-churn table: no-op saves are not recorded, see SelectiveHistoricalRecords
+    history = SelectiveHistoricalRecords()
+
+    # Approximation: 30.44 days per month
+    DAYS_PER_MONTH = 30.44
 
     class Meta:
         verbose_name = "Debt"
         verbose_name_plural = "Debts"
         ordering = ['-start_date']
+        indexes = [
+            models.Index(fields=['debt_status', 'due_date']),
+        ]
 
     def __str__(self):
         return f"Debt for sale #{self.sale.pk} ({self.balance}/{self.init_amount})"
 
+    def compute_due_date(self):
+        if not self.start_date:
+            return None
+        return self.start_date + timedelta(days=int(self.month_duration * self.DAYS_PER_MONTH))
+
+    def save(self, *args, **kwargs):
+        self.due_date = self.compute_due_date()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'start_date', 'month_duration'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'due_date'}
+        super().save(*args, **kwargs)
+
 # Echéances
 class Term(models.Model):
     debt = models.ForeignKey(Debt, on_delete=models.CASCADE, related_name='terms')
@@ -55,12 +77,15 @@ class Term(models.Model):
     pay_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     payment_date = models.DateTimeField(null=True, blank=True)
     term_status = models.CharField(max_length=20, choices=TermStatus.choices, default=TermStatus.UNPAID)
-    history = HistoricalRecords()
+    history = SelectiveHistoricalRecords()
 
     class Meta:
         verbose_name = "Term"
         verbose_name_plural = "Terms"
         ordering = ['term_date']
+        indexes = [
+            models.Index(fields=['term_status', 'term_date']),
+        ]
 
     def __str__(self):
         return f"Term on {self.term_date} for debt #{self.debt.pk}"
@@ -74,6 +99,8 @@ class Recovery(models.Model):
     recovery_date = models.DateTimeField(auto_now_add=True)
     payment_mode = models.CharField(max_length=50, choices=RecoveryPaymentMode.choices, default=RecoveryPaymentMode.CASH)
     receipt = models.FileField(upload_to='receipts/', null=True, blank=True)
+    # Client-generated key making retried postings safe (unique index, NULLs allowed)
+    idempotency_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
     history = HistoricalRecords()
 
     class Meta:
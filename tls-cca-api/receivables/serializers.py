@@ -1,9 +1,10 @@
 # receivables/serializers.py
+from decimal import Decimal
 from rest_framework import serializers
 
 from core.mixins.serializers import HistoricalChangesMixin
-from .models import Debt, Term, Recovery
-from .services import recovery_services
+from .models import Debt, Term, Recovery, RecoveryPaymentMode
+from .services import recovery_services, term_services
 
 class TermSerializer(serializers.ModelSerializer):
     """
@@ -32,35 +33,86 @@ class DebtSerializer(serializers.ModelSerializer):
         model = Debt
         fields = [
             'id', 'sale', 'customer_display_name', 'init_amount', 'balance', 'start_date', 'close_date', 
-            'monthly_payment', 'month_duration', 'regulation_mode', 'debt_status', 'terms'
+            'due_date', 'monthly_payment', 'month_duration', 'regulation_mode', 'debt_status', 'terms'
         ]
 
         read_only_fields = ('terms', 'sale', 'customer_display_name', 'init_amount', 'balance')
 
 
+class DebtRescheduleItemSerializer(serializers.Serializer):
+    """
+    The renegotiated conditions of a single debt; omitted fields are left unchanged.
+    """
+    debt = serializers.IntegerField()
+    start_date = serializers.DateField(required=False)
+    month_duration = serializers.IntegerField(required=False, min_value=1)
+    monthly_payment = serializers.DecimalField(max_digits=12, decimal_places=2, required=False, min_value=Decimal('0'))
+
+
+class DebtRescheduleSerializer(serializers.Serializer):
+    """
+    Serializer for a batch of debt renegotiations; the unpaid terms are regenerated.
+    """
+    debts = DebtRescheduleItemSerializer(many=True, allow_empty=False, max_length=1000)
+
+    def create(self, validated_data):
+        return term_services.reschedule_debts(
+            validated_data['debts'],
+            user=self.context['request'].user
+        )
+
+
 class RecoverySerializer(serializers.ModelSerializer):
     """
     Serializer for the Recovery model.
     Handles the creation of a recovery payment.
     """
     commercial_name = serializers.CharField(source='commercial.get_full_name', read_only=True)
+    # Declared explicitly so a replayed key reaches the service instead of failing uniqueness validation
+    idempotency_key = serializers.CharField(max_length=64, required=False, allow_null=True)
 
     class Meta:
         model = Recovery
         fields = [
             'id', 'term', 'commercial', 'commercial_name', 'amount', 
-            'recovery_date', 'payment_mode', 'receipt'
+            'recovery_date', 'payment_mode', 'receipt', 'idempotency_key'
         ]
         read_only_fields = ('recovery_date', 'commercial', 'commercial_name')
 
     def create(self, validated_data):
-        commercial = self.context['request'].user
+        request = self.context['request']
+        # The key may also be sent as an 'Idempotency-Key' header
+        if not validated_data.get('idempotency_key'):
+            validated_data['idempotency_key'] = request.headers.get('Idempotency-Key') or None
         # Delegate creation to the recovery service to handle business logic
         return recovery_services.create_recovery(
-            commercial=commercial,
+            commercial=request.user,
             **validated_data
         )
 
+class RecoveryBulkItemSerializer(serializers.Serializer):
+    """
+    A single payment of a bulk upload.
+    The term is given by id and resolved by the service for the whole batch.
+    """
+    term = serializers.IntegerField()
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0.01'))
+    payment_mode = serializers.ChoiceField(choices=RecoveryPaymentMode.choices, default=RecoveryPaymentMode.CASH)
+    idempotency_key = serializers.CharField(max_length=64, required=False, allow_null=True)
+
+
+class RecoveryBulkSerializer(serializers.Serializer):
+    """
+    Serializer for a batch of recovery payments (e.g. field collector sync).
+    """
+    recoveries = RecoveryBulkItemSerializer(many=True, allow_empty=False, max_length=1000)
+
+    def create(self, validated_data):
+        return recovery_services.create_recoveries(
+            commercial=self.context['request'].user,
+            items=validated_data['recoveries']
+        )
+
 """
 Historical Serializers
 """
@@ -90,5 +142,5 @@ class HistoricalRecoverySerializer(serializers.ModelSerializer, HistoricalChange
         fields = [
             'history_id', 'history_date', 'history_type_display', 
             'history_user', 'changes', 'term', 'commercial', 
-            'amount', 'recovery_date', 'payment_mode', 'receipt'
+            'amount', 'recovery_date', 'payment_mode', 'receipt', 'idempotency_key'
         ]
\ No newline at end of file
@@ -1,50 +1,132 @@
-from datetime import timedelta
+from django.db import transaction
+from django.db.models import Max
 from django.utils import timezone
+
+from core.models import JobCheckpoint
+from core.services.search_index_services import refresh_debt_documents
+from core.services.kpi_services import get_debt_kpi_days, reconcile_kpi_rollups
+from core.services.stats_services import invalidate_stats_cache
+from core.utils.history import update_with_history
 from receivables.models import Debt, DebtStatus, Term, TermStatus
 
-def update_financial_statuses():
+STATUS_JOB_NAME = 'receivables.update_financial_statuses'
+
+def backfill_due_dates(batch_size=1000):
+    """
+    Fills `due_date` on debts saved before the column existed.
+    Only rows with a NULL due_date are touched, so this is a no-op once done.
+    """
+    filled = 0
+    pending = Debt.objects.filter(due_date__isnull=True, start_date__isnull=False).only(
+        'id', 'start_date', 'month_duration'
+    )
+    while True:
+        batch = list(pending[:batch_size])
+        if not batch:
+            return filled
+        for debt in batch:
+            debt.due_date = debt.compute_due_date()
+        Debt.objects.bulk_update(batch, ['due_date'])
+        filled += len(batch)
+
+def _status_transitions(today):
+    """
+    Returns the ordered (key, queryset, new values) status transitions for a given day.
+    """
+    return [
+        # --- 1. TERMS STATUSES ---
+        # UNPAID -> OVERDUE if the date has passed
+        ('terms_overdue',
+         Term.objects.filter(term_status=TermStatus.UNPAID, term_date__lt=today),
+         {'term_status': TermStatus.OVERDUE}),
+        # PARTIALLY_PAID -> PARTIALLY_OVERDUE if the date has passed
+        ('terms_partially_overdue',
+         Term.objects.filter(term_status=TermStatus.PARTIALLY_PAID, term_date__lt=today),
+         {'term_status': TermStatus.PARTIALLY_OVERDUE}),
+        # --- 2. DEBTS STATUSES ---
+        # NOT_STARTED -> ONGOING if start_date is reached
+        ('debts_ongoing',
+         Debt.objects.filter(debt_status=DebtStatus.NOT_STARTED, start_date__lte=today),
+         {'debt_status': DebtStatus.ONGOING}),
+        # ONGOING -> OVERDUE if the theoretical deadline (due_date) is passed and balance > 0
+        ('debts_overdue',
+         Debt.objects.filter(debt_status=DebtStatus.ONGOING, due_date__lt=today, balance__gt=0),
+         {'debt_status': DebtStatus.OVERDUE}),
+    ]
+
+def _refresh_debts(debt_ids):
+    """
+    Refreshes what the status of the given debts feeds: their search documents, and
+    the KPI rollups of their days (overdue counts).
+    """
+    refresh_debt_documents(debt_ids)
+    reconcile_kpi_rollups(get_debt_kpi_days(debt_ids))
+
+def _on_batch(queryset):
+    """Debts whose status changed are refreshed with them, see `_refresh_debts`."""
+    return _refresh_debts if queryset.model is Debt else None
+
+def update_financial_statuses(batch_size=None, restart=False):
     """
     Updates the statuses of Debts and Terms based on the current date.
     This function is intended to be called periodically (e.g., daily via a cron job).
+
+    Each transition is a set-based UPDATE whose history rows are written in bulk
+    (see `update_with_history`); the KPI rollups of the days of the changed debts
+    are reconciled in the same transaction. With `batch_size`, the tables are
+    walked in primary-key ranges: every chunk commits on its own and records a
+    checkpoint, and an unfinished run of the same day is resumed unless `restart`.
+
+    Returns the number of rows changed per transition.
     """
+    if batch_size:
+        return _update_financial_statuses_chunked(batch_size, restart)
+
+    backfill_due_dates()
     today = timezone.now().date()
+    counts = {
+        key: update_with_history(queryset, change_reason=key, on_batch=_on_batch(queryset), **values)
+        for key, queryset, values in _status_transitions(today)
+    }
+    invalidate_stats_cache(Debt, Term)
+    return counts
+
+def _update_financial_statuses_chunked(batch_size, restart):
+    today = timezone.now().date()
+    checkpoint, created = JobCheckpoint.objects.get_or_create(name=STATUS_JOB_NAME, defaults={'run_date': today})
+    if restart or checkpoint.completed or checkpoint.run_date != today:
+        # Start a new run for today: an unfinished run of an earlier day is dropped,
+        # its cutoff would miss the rows that became due since
+        checkpoint.run_date = today
+        checkpoint.phase, checkpoint.last_pk, checkpoint.counts = '', 0, {}
+        checkpoint.completed = False
+        checkpoint.save()
+
+    backfill_due_dates(batch_size)
+    # A resumed run keeps the date it started with
+    transitions = _status_transitions(checkpoint.run_date)
+    keys = [key for key, _, _ in transitions]
+    counts = {key: checkpoint.counts.get(key, 0) for key in keys}
+
+    for key, queryset, values in transitions:
+        if checkpoint.phase and keys.index(key) < keys.index(checkpoint.phase):
+            continue  # Already done by the interrupted run
+        start = checkpoint.last_pk if checkpoint.phase == key else 0
+        max_pk = queryset.model.objects.aggregate(max_pk=Max('pk'))['max_pk'] or 0
+
+        while start < max_pk:
+            end = start + batch_size
+            with transaction.atomic():
+                counts[key] += update_with_history(
+                    queryset.filter(pk__gt=start, pk__lte=end), change_reason=key,
+                    on_batch=_on_batch(queryset), **values
+                )
+                checkpoint.phase, checkpoint.last_pk, checkpoint.counts = key, end, counts
+                checkpoint.save(update_fields=['phase', 'last_pk', 'counts', 'updated_at'])
+            start = end
 
-    # --- 1. TERMS STATUSES ---
-    # UNPAID -> OVERDUE if the date has passed
-    Term.objects.filter(
-        term_status=TermStatus.UNPAID,
-        term_date__lt=today
-    ).update(term_status=TermStatus.OVERDUE)
-
-    # PARTIALLY_PAID -> PARTIALLY_OVERDUE if the date has passed
-    Term.objects.filter(
-        term_status=TermStatus.PARTIALLY_PAID,
-        term_date__lt=today
-    ).update(term_status=TermStatus.PARTIALLY_OVERDUE)
-
-
-    # --- 2. DEBTS STATUSES ---
-    # NOT_STARTED -> ONGOING if start_date is reached
-    Debt.objects.filter(
-        debt_status=DebtStatus.NOT_STARTED,
-        start_date__lte=today
-    ).update(debt_status=DebtStatus.ONGOING)
-
-    # ONGOING -> OVERDUE
-    # Logic: If the theoretical deadline is passed and balance > 0.
-    # Since close_date is used for "Date Paid", we calculate deadline = start_date + month_duration
-    ongoing_debts = Debt.objects.filter(debt_status=DebtStatus.ONGOING)
-    
-    debts_to_update = []
-    for debt in ongoing_debts:
-        if debt.start_date:
-            # Approximation: 30.44 days per month
-            deadline = debt.start_date + timedelta(days=int(debt.month_duration * 30.44))
-            if deadline < today and debt.balance > 0:
-                debt.debt_status = DebtStatus.OVERDUE
-                debts_to_update.append(debt)
-    
-    if debts_to_update:
-        Debt.objects.bulk_update(debts_to_update, ['debt_status'])
-    
-    return len(debts_to_update)
\ No newline at end of file
+    invalidate_stats_cache(Debt, Term)
+    checkpoint.completed = True
+    checkpoint.counts = counts
+    checkpoint.save(update_fields=['completed', 'counts', 'updated_at'])
+    return counts
@@ -1,74 +1,299 @@
-from django.db import transaction
-from django.db.models import F
-from rest_framework.exceptions import ValidationError
+from collections import defaultdict
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import F, Case, When, Value, DecimalField
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
 from django.utils import timezone
+from simple_history.utils import bulk_create_with_history, bulk_update_with_history
 
 from receivables.models import ( 
         Recovery, Term, Debt, 
-        TermStatus, DebtStatus
+        TermStatus, DebtStatus, RecoveryPaymentMode
     )
 from crm.models import Portfolio
+from core.services.search_index_services import refresh_debt_documents
+from core.services.kpi_services import apply_kpi_delta_groups, kpi_day, kpi_delta_groups
+from core.services.stats_services import invalidate_stats_cache
+from core.utils.history import coalesce_history
 
-def create_recovery(commercial, term, amount, payment_mode, receipt=None):
+def _apply_term_payment(term, amount, now):
+    """
+    Adds a payment to a (locked) term and resolves its new status.
+    Returns the list of modified fields.
+    """
+    term.pay_amount += amount
+    fields = ['pay_amount']
+
+    if term.pay_amount >= term.except_amount:
+        # Fully Paid
+        if term.term_status != TermStatus.PAID:
+            term.term_status = TermStatus.PAID
+            term.payment_date = now
+            fields += ['term_status', 'payment_date']
+    elif term.pay_amount > 0:
+        # Partially Paid, or partially overdue if the term date has passed
+        new_status = TermStatus.PARTIALLY_PAID
+        if term.term_date and term.term_date < now.date():
+            new_status = TermStatus.PARTIALLY_OVERDUE
+        if term.term_status != new_status:
+            term.term_status = new_status
+            fields.append('term_status')
+    return fields
+
+def _apply_debt_payment(debt, amount, now):
+    """
+    Subtracts a payment from a (locked) debt balance and closes it when fully paid.
+    Returns the list of modified fields.
+    """
+    debt.balance -= amount
+    fields = ['balance']
+
+    if debt.balance <= 0 and debt.debt_status != DebtStatus.PAID:
+        debt.debt_status = DebtStatus.PAID
+        debt.close_date = now.date()
+        fields += ['debt_status', 'close_date']
+    return fields
+
+class IdempotencyConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "This idempotency key was already used for a different recovery."
+    default_code = 'idempotency_conflict'
+
+def _replay(posted, commercial_id, term_id, amount):
+    """
+    Returns the recovery already posted with an idempotency key, if the retry is the
+    same posting (term, amount and commercial); raises IdempotencyConflict otherwise.
+    """
+    if (posted.term_id, posted.amount, posted.commercial_id) != (term_id, amount, commercial_id):
+        raise IdempotencyConflict()
+    return posted
+
+def _lock_debts_and_terms(term_ids):
+    """
+    Locks the debts of the given terms, then the terms, each in primary key order:
+    the single and bulk postings take their locks in the same order, so they cannot
+    deadlock each other. Returns the locked terms by id, sharing one Debt (with its
+    sale) per debt.
+    """
+    debts = (
+        Debt.objects.select_related('sale').select_for_update(of=('self',))
+        .filter(pk__in=Term.objects.filter(pk__in=term_ids).values('debt_id'))
+        .order_by('pk').in_bulk()
+    )
+    terms = {}
+    for term in Term.objects.select_for_update().filter(pk__in=term_ids).order_by('pk'):
+        term.debt = debts[term.debt_id]
+        terms[term.pk] = term
+    return terms
+
+def create_recovery(commercial, term, amount, payment_mode, receipt=None, idempotency_key=None):
     """
     Creates a recovery record and updates the related term and debt balances
     within a single atomic transaction.
+
+    The debt and then the term are locked up front (see `_lock_debts_and_terms`),
+    so the new balances and statuses are computed from the locked rows and written
+    with a single UPDATE each.
+
+    If a recovery was already posted with the same `idempotency_key`, it is
+    returned as is and no balance is touched; a different posting under the same
+    key raises IdempotencyConflict (409).
     """
     if amount <= 0:
         raise ValidationError("Recovery amount must be positive.")
 
-    # Ensure all database operations succeed or fail together
-    with transaction.atomic():
-        # 1. Create the recovery record
-        recovery = Recovery.objects.create(
+    # Ensure all database operations succeed or fail together; the term and debt
+    # history rows are written once, with their final state
+    with transaction.atomic(), coalesce_history():
+        # 1. Lock the debt (with the sale's portfolio id) and the term
+        locked_term = _lock_debts_and_terms([term.pk]).get(term.pk)
+        if locked_term is None:
+            raise Term.DoesNotExist("Term matching query does not exist.")
+        debt = locked_term.debt
+        now = timezone.now()
+
+        # A retry of a posting that already went through: replay its result.
+        # Checked under the term lock, so concurrent retries of the same term are serialized.
+        if idempotency_key:
+            existing = Recovery.objects.filter(idempotency_key=idempotency_key).first()
+            if existing:
+                return _replay(existing, commercial.pk, locked_term.pk, amount)
+
+        # 2. Create the recovery record. The same key posted concurrently for another
+        # term fails the unique constraint (in a savepoint): the winner is replayed.
+        recovery = Recovery(
             commercial=commercial,
-            term=term,
+            term=locked_term,
             amount=amount,
             payment_mode=payment_mode,
-            receipt=receipt
+            receipt=receipt,
+            idempotency_key=idempotency_key
         )
+        if not idempotency_key:
+            recovery.save()
+        else:
+            try:
+                with transaction.atomic():
+                    recovery.save()
+            except IntegrityError:
+                existing = Recovery.objects.get(idempotency_key=idempotency_key)
+                return _replay(existing, commercial.pk, locked_term.pk, amount)
 
-        # 2. Update the paid amount on the related term
-        Term.objects.filter(pk=term.id).update(pay_amount=F('pay_amount') + amount)
+        # 3. Update the paid amount and status of the term
+        locked_term.save(update_fields=_apply_term_payment(locked_term, amount, now))
 
-        # 3. Re-fetch the debt to get its portfolio
-        debt = Debt.objects.select_related('sale__portfolio').get(pk=term.debt_id)
-
-        # 4. Subtract the amount from the total debt balance
-        debt.balance = F('balance') - amount
-        debt.save(update_fields=['balance'])
-        debt.refresh_from_db() # Get the updated balance value
+        # 4. Subtract the amount from the debt balance, closing it if fully paid
+        was_overdue = debt.debt_status == DebtStatus.OVERDUE
+        debt.save(update_fields=_apply_debt_payment(debt, amount, now))
 
         # 5. Subtract the amount from the portfolio balance, if it exists
-        if debt.sale and debt.sale.portfolio:
-            Portfolio.objects.filter(pk=debt.sale.portfolio.id).update(balance=F('balance') - amount)
-
-        # 6. Re-fetch the term to check its updated state
-        updated_term = Term.objects.select_for_update().get(pk=term.id)
-
-        # 7. Update term status
-        if updated_term.pay_amount >= updated_term.except_amount:
-            # Fully Paid
-            if updated_term.term_status != TermStatus.PAID:
-                updated_term.term_status = TermStatus.PAID
-                updated_term.payment_date = timezone.now()
-                updated_term.save(update_fields=['term_status', 'payment_date'])
-        elif updated_term.pay_amount > 0:
-            # Partially Paid
-            today = timezone.now().date()
-            new_status = TermStatus.PARTIALLY_PAID
-            
-            # If the term date has passed, it's partially overdue, not just partially paid
-            if updated_term.term_date and updated_term.term_date < today:
-                new_status = TermStatus.PARTIALLY_OVERDUE
-            
-            if updated_term.term_status != new_status:
-                updated_term.term_status = new_status
-                updated_term.save(update_fields=['term_status'])
-
-        # 8. Update debt status if fully paid
-        if debt.balance <= 0 and debt.debt_status != DebtStatus.PAID:
-            debt.debt_status = DebtStatus.PAID
-            debt.close_date = timezone.now().date() # Use .date() for DateField
-            debt.save(update_fields=['debt_status', 'close_date'])
-    return recovery
\ No newline at end of file
+        if debt.sale.portfolio_id:
+            Portfolio.objects.filter(pk=debt.sale.portfolio_id).update(balance=F('balance') - amount)
+
+        # 6. Move the dashboard figures of the sale's commercial/portfolio: the debt's
+        # on the sale's day, the collected amount on the payment's day
+        kpi_deltas = kpi_delta_groups()
+        owners = (debt.sale.commercial_id, debt.sale.portfolio_id)
+        kpi_deltas[(*owners, kpi_day(debt.sale.sale_date))].update(
+            balance=-amount,
+            overdue_count=-int(was_overdue and debt.debt_status != DebtStatus.OVERDUE),
+        )
+        kpi_deltas[(*owners, kpi_day(recovery.recovery_date))]['collected'] += amount
+        apply_kpi_delta_groups(kpi_deltas)
+
+    return recovery
+
+
+def create_recoveries(commercial, items):
+    """
+    Creates many recoveries at once (e.g. a field collector's offline batch)
+    within a single atomic transaction.
+
+    Each item is a dict with `term` (Term or id), `amount`, and optionally
+    `payment_mode`, `receipt` and `idempotency_key`. All terms and debts are
+    locked with one query; their new balances are aggregated in memory and
+    written back with one bulk UPDATE per table, and the recoveries are
+    inserted with one bulk INSERT. Items whose key was already posted (before,
+    or earlier in the batch) are replayed, not applied again.
+
+    Returns one result per item, in input order.
+    """
+    if any(item['amount'] <= 0 for item in items):
+        raise ValidationError("Recovery amount must be positive.")
+
+    term_ids = {getattr(item['term'], 'pk', item['term']) for item in items}
+    results = [None] * len(items)
+
+    with transaction.atomic():
+        # 1. Lock every debt, then every term, in a consistent (primary key) order
+        terms = _lock_debts_and_terms(term_ids)
+        now = timezone.now()
+
+        # Recoveries already posted with one of the batch's idempotency keys
+        keys = {item['idempotency_key'] for item in items if item.get('idempotency_key')}
+        posted = {
+            recovery.idempotency_key: recovery
+            for recovery in Recovery.objects.filter(idempotency_key__in=keys)
+        } if keys else {}
+
+        # 2. Apply the payments in memory, one shared Debt instance per debt
+        debts = {}
+        overdue_debts = {}  # debt id -> was overdue before this batch
+        replayed = []
+        term_fields, debt_fields = set(), set()
+        portfolio_deltas = defaultdict(Decimal)
+        pending = []
+        for index, item in enumerate(items):
+            term_id = getattr(item['term'], 'pk', item['term'])
+            term = terms.get(term_id)
+            if term is None:
+                results[index] = {'index': index, 'term': term_id, 'error': "Term not found."}
+                continue
+
+            key = item.get('idempotency_key')
+            amount = item['amount']
+            if key in posted:
+                try:
+                    replayed.append((index, _replay(posted[key], commercial.pk, term_id, amount)))
+                except IdempotencyConflict as exc:
+                    results[index] = {'index': index, 'term': term_id, 'error': str(exc.detail)}
+                continue
+
+            if term.debt_id not in debts:
+                overdue_debts[term.debt_id] = term.debt.debt_status == DebtStatus.OVERDUE
+            debt = debts.setdefault(term.debt_id, term.debt)
+            term_fields.update(_apply_term_payment(term, amount, now))
+            debt_fields.update(_apply_debt_payment(debt, amount, now))
+            if debt.sale.portfolio_id:
+                portfolio_deltas[debt.sale.portfolio_id] += amount
+
+            pending.append((index, Recovery(
+                commercial=commercial,
+                term=term,
+                amount=amount,
+                payment_mode=item.get('payment_mode', RecoveryPaymentMode.CASH),
+                receipt=item.get('receipt'),
+                idempotency_key=key,
+            )))
+            if key:
+                # A duplicate later in the same batch replays this one
+                posted[key] = pending[-1][1]
+
+        # 3. Write everything back with set-based statements
+        recoveries = bulk_create_with_history(
+            [recovery for _, recovery in pending], Recovery, default_user=commercial
+        ) if pending else []
+        updated_terms = {recovery.term_id: recovery.term for _, recovery in pending}
+        if updated_terms:
+            bulk_update_with_history(list(updated_terms.values()), Term, list(term_fields), default_user=commercial)
+            bulk_update_with_history(list(debts.values()), Debt, list(debt_fields), default_user=commercial)
+            refresh_debt_documents(list(debts))
+            invalidate_stats_cache(Recovery, Term, Debt)
+
+        if portfolio_deltas:
+            # Locked in primary key order first: the UPDATE alone takes its row locks in
+            # no given order, and could deadlock with a concurrent batch
+            locked = list(
+                Portfolio.objects.select_for_update().filter(pk__in=portfolio_deltas)
+                .order_by('pk').values_list('pk', flat=True)
+            )
+            Portfolio.objects.filter(pk__in=locked).update(balance=F('balance') - Case(
+                *[When(pk=pk, then=Value(portfolio_deltas[pk])) for pk in locked],
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            ))
+
+        # 4. Move the dashboard figures, one upsert for every commercial/portfolio/day row
+        kpi_deltas = kpi_delta_groups()
+        for _, recovery in pending:
+            sale = debts[recovery.term.debt_id].sale
+            kpi_deltas[(sale.commercial_id, sale.portfolio_id, kpi_day(sale.sale_date))]['balance'] -= recovery.amount
+            kpi_deltas[(sale.commercial_id, sale.portfolio_id, kpi_day(recovery.recovery_date))]['collected'] += (
+                recovery.amount
+            )
+        for debt_id, was_overdue in overdue_debts.items():
+            debt = debts[debt_id]
+            if was_overdue and debt.debt_status != DebtStatus.OVERDUE:
+                sale = debt.sale
+                kpi_deltas[(sale.commercial_id, sale.portfolio_id, kpi_day(sale.sale_date))]['overdue_count'] -= 1
+        apply_kpi_delta_groups(kpi_deltas)
+
+    for (index, _), recovery in zip(pending, recoveries):
+        results[index] = {
+            'replayed': False,
+            'index': index,
+            'id': recovery.pk,
+            'term': recovery.term_id,
+            'amount': recovery.amount,
+            'term_status': recovery.term.term_status,
+            'debt_balance': debts[recovery.term.debt_id].balance,
+        }
+    for index, recovery in replayed:
+        results[index] = {
+            'replayed': True,
+            'index': index,
+            'id': recovery.pk,
+            'term': recovery.term_id,
+            'amount': recovery.amount,
+        }
+    return results
@@ -0,0 +1,195 @@
+import calendar
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal, ROUND_DOWN
+from django.db import transaction
+from django.db.models import Count, Max, Sum, F, Q, Value
+from django.utils import timezone
+from django.db.models.functions import Coalesce
+from rest_framework.exceptions import ValidationError
+from simple_history.utils import bulk_create_with_history, bulk_update_with_history
+
+from receivables.models import Debt, Term
+from core.services.stats_services import invalidate_stats_cache, invalidate_timelines_for_dates
+
+CENT = Decimal('0.01')
+
+def add_months(day: date, months: int) -> date:
+    """
+    Steps `day` by a number of calendar months, clamping to the last day of the target
+    month (Jan 31 + 1 month -> Feb 28/29).
+    """
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, calendar.monthrange(year, month)[1]))
+
+def split_amount(total, count, instalment=None) -> list:
+    """
+    Splits `total` into `count` instalments whose sum is exactly `total`.
+
+    With an `instalment` amount (the debt's monthly payment), every instalment but the
+    last is that amount and the last one takes the rest; otherwise (or when the monthly
+    payment does not fit the total) the total is split evenly, rounded down to the cent,
+    and the last instalment absorbs the rounding.
+    """
+    total = Decimal(total).quantize(CENT)
+    count = max(int(count), 1)
+    if instalment:
+        instalment = Decimal(instalment).quantize(CENT)
+        if 0 < instalment * (count - 1) < total:
+            return [instalment] * (count - 1) + [total - instalment * (count - 1)]
+    base = (total / count).quantize(CENT, rounding=ROUND_DOWN)
+    return [base] * (count - 1) + [total - base * (count - 1)]
+
+def months_between(start: date, end: date) -> int:
+    """Number of calendar months from `start`'s month to `end`'s month."""
+    return (end.year - start.year) * 12 + end.month - start.month
+
+def build_schedule(debt, amount=None, first_index=1, count=None) -> list:
+    """
+    Builds (without saving) the instalment plan of a debt: one Term per month from
+    `start_date`, the n-th term falling n calendar months after it.
+
+    `amount`, `first_index` and `count` default to the full plan of the debt
+    (init_amount over month_duration terms); a partial plan is used on regeneration.
+    """
+    count = count if count is not None else debt.month_duration
+    amount = amount if amount is not None else debt.init_amount
+    start = debt.start_date or timezone.localdate()
+    return [
+        Term(debt=debt, term_date=add_months(start, first_index + offset), except_amount=part)
+        for offset, part in enumerate(split_amount(amount, count, debt.monthly_payment))
+    ]
+
+def _insert_terms(terms, deleted_dates=(), user=None):
+    """Inserts terms (and their history rows) in bulk and invalidates the term statistics."""
+    if terms:
+        bulk_create_with_history(terms, Term, batch_size=1000, default_user=user)
+    if terms or deleted_dates:
+        invalidate_stats_cache(Term)
+        invalidate_timelines_for_dates(Term, [term.term_date for term in terms] + list(deleted_dates))
+    return terms
+
+def generate_schedules(debts, user=None) -> list:
+    """
+    Generates the instalment plan of every debt given that has no terms yet.
+
+    Existing schedules are detected with one query and all the new terms are inserted
+    with a single bulk INSERT (plus one for their history), whatever the number of debts.
+    Returns the created terms.
+    """
+    debts = [debt for debt in debts if debt.init_amount > 0]
+    if not debts:
+        return []
+    scheduled = set(
+        Term.objects.filter(debt__in=[debt.pk for debt in debts])
+        .values_list('debt_id', flat=True).distinct()
+    )
+    with transaction.atomic():
+        return _insert_terms([
+            term
+            for debt in debts if debt.pk not in scheduled
+            for term in build_schedule(debt)
+        ], user=user)
+
+def regenerate_schedules(debts, user=None) -> list:
+    """
+    Rebuilds the schedules of renegotiated debts from their current `start_date`,
+    `month_duration` and `monthly_payment`.
+
+    Terms that already received a payment are kept as they are; the untouched ones are
+    deleted and replaced by a new plan covering the rest of the balance over the
+    remaining months (at least one term), starting the month after the latest kept
+    term. Whatever the number of debts, this runs one aggregate query over the kept
+    terms, one DELETE (the history of the removed terms is still recorded) and one
+    bulk INSERT.
+    Returns the created terms.
+    """
+    debts = list(debts)
+    if not debts:
+        return []
+    debt_ids = [debt.pk for debt in debts]
+    kept = {
+        row['debt_id']: row
+        for row in (
+            Term.objects.filter(debt__in=debt_ids, pay_amount__gt=0)
+            .values('debt_id')
+            .annotate(
+                count=Count('id'),
+                last_date=Max('term_date'),
+                # Part of the balance still expected on the kept (partially paid) terms
+                outstanding=Coalesce(
+                    Sum(F('except_amount') - F('pay_amount'), filter=Q(except_amount__gt=F('pay_amount'))),
+                    Value(Decimal('0')),
+                ),
+            )
+        )
+    }
+
+    with transaction.atomic():
+        unpaid = Term.objects.filter(debt__in=debt_ids, pay_amount=0)
+        deleted_dates = list(unpaid.values_list('term_date', flat=True))
+        unpaid.delete()
+
+        terms = []
+        for debt in debts:
+            paid = kept.get(debt.pk, {'count': 0, 'outstanding': Decimal('0'), 'last_date': None})
+            remaining = debt.balance - paid['outstanding']
+            if remaining <= 0:
+                continue
+            # Kept terms need not be the first ones: the plan resumes after the latest
+            first_index = 1
+            if paid['last_date'] and debt.start_date:
+                first_index = max(months_between(debt.start_date, paid['last_date']) + 1, 1)
+            terms += build_schedule(
+                debt,
+                amount=remaining,
+                first_index=first_index,
+                count=max(debt.month_duration - paid['count'], 1),
+            )
+        return _insert_terms(terms, deleted_dates, user=user)
+
+def reschedule_debts(items, user=None) -> list:
+    """
+    Applies renegotiated conditions to debts and regenerates their schedules,
+    within a single atomic transaction.
+
+    Each item is a dict with `debt` (Debt or id) and optionally the new `start_date`,
+    `month_duration` and `monthly_payment`. The debts are locked with one query,
+    updated with one bulk UPDATE per set of changed fields, then rescheduled together
+    by `regenerate_schedules`. Returns the updated debts, in input order.
+    """
+    debt_ids = {getattr(item['debt'], 'pk', item['debt']) for item in items}
+    by_fields = defaultdict(list)
+    debts = []
+    moved_dates = []  # Old and new start dates, read by the debt timelines
+
+    with transaction.atomic():
+        locked = Debt.objects.select_for_update().filter(pk__in=debt_ids).order_by('pk').in_bulk()
+        missing = debt_ids - set(locked)
+        if missing:
+            raise ValidationError(f"Unknown debts: {sorted(missing)}.")
+
+        for item in items:
+            debt = locked[getattr(item['debt'], 'pk', item['debt'])]
+            fields = [name for name in ('start_date', 'month_duration', 'monthly_payment') if name in item]
+            if 'start_date' in fields:
+                moved_dates += [debt.start_date, item['start_date']]
+            for name in fields:
+                setattr(debt, name, item[name])
+            if {'start_date', 'month_duration'} & set(fields):
+                debt.due_date = debt.compute_due_date()
+                fields.append('due_date')
+            if fields:
+                by_fields[tuple(fields)].append(debt)
+            debts.append(debt)
+
+        for fields, group in by_fields.items():
+            bulk_update_with_history(group, Debt, list(fields), default_user=user)
+        regenerate_schedules(list({debt.pk: debt for debt in debts}.values()), user=user)
+
+    if by_fields:
+        invalidate_stats_cache(Debt)
+        if moved_dates:
+            invalidate_timelines_for_dates(Debt, moved_dates)
+    return debts
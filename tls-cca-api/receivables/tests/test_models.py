@@ -1,7 +1,13 @@
 import pytest
+from datetime import date
 from decimal import Decimal
-from receivables.models import Debt
-from sales.models import CreditSale
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from receivables.models import Debt, Term
+from receivables.services import term_services, debt_services
+from core.utils.history import coalesce_history, update_with_history
+from sales.models import CreditSale, CreditSaleStatus
+from sales.services.creditsale_services import update_credit_sale_status
 from crm.models import Customer
 from users.models import User
 
@@ -48,3 +54,159 @@ def test_debt_creation():
     # Check reverse relationship
     assert hasattr(sale, 'debts')
     assert sale.debts == debt
+
+
+def test_add_months_clamps_to_month_end():
+    """Test calendar month stepping clamps to the last day of shorter months."""
+    assert term_services.add_months(date(2024, 1, 31), 1) == date(2024, 2, 29)
+    assert term_services.add_months(date(2023, 1, 31), 1) == date(2023, 2, 28)
+    assert term_services.add_months(date(2024, 1, 31), 3) == date(2024, 4, 30)
+    assert term_services.add_months(date(2024, 11, 15), 3) == date(2025, 2, 15)
+
+
+def test_split_amount_is_decimal_exact():
+    """Test instalments always sum to the total, the last one absorbing the rounding."""
+    assert term_services.split_amount(Decimal('100.00'), 3) == [Decimal('33.33'), Decimal('33.33'), Decimal('33.34')]
+    assert term_services.split_amount(Decimal('1000.00'), 4, Decimal('300.00')) == [
+        Decimal('300.00'), Decimal('300.00'), Decimal('300.00'), Decimal('100.00')
+    ]
+    # A monthly payment too large for the total falls back to an even split
+    assert term_services.split_amount(Decimal('100.00'), 3, Decimal('80.00')) == [
+        Decimal('33.33'), Decimal('33.33'), Decimal('33.34')
+    ]
+
+
+@pytest.mark.django_db
+class TestScheduleGeneration:
+    def _debt(self, user, customer, amount, months, start, monthly_payment=Decimal('0')):
+        sale = CreditSale.objects.create(customer=customer, commercial=user, total_amount=amount)
+        return Debt.objects.create(
+            sale=sale, init_amount=amount, balance=amount, month_duration=months,
+            start_date=start, monthly_payment=monthly_payment
+        )
+
+    def test_generate_schedules_in_bulk(self, new_user, new_customer):
+        """Test the plans of many debts are inserted with a constant number of queries."""
+        debts = [
+            self._debt(new_user, new_customer, Decimal('1000.00'), 3, date(2024, 1, 31))
+            for _ in range(5)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            terms = term_services.generate_schedules(debts)
+        assert len(terms) == 15
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT')]
+        assert len(inserts) == 2  # terms and their history
+
+        schedule = list(Term.objects.filter(debt=debts[0]).values_list('term_date', 'except_amount'))
+        assert schedule == [
+            (date(2024, 2, 29), Decimal('333.33')),
+            (date(2024, 3, 31), Decimal('333.33')),
+            (date(2024, 4, 30), Decimal('333.34')),
+        ]
+        # Already scheduled debts are skipped
+        assert term_services.generate_schedules(debts) == []
+
+    def test_approval_generates_schedule(self, new_user, new_customer):
+        """Test approving a sale creates its debt and instalment plan."""
+        sale = CreditSale.objects.create(
+            customer=new_customer, commercial=new_user,
+            total_amount=Decimal('1100.00'), deposit=Decimal('100.00')
+        )
+        update_credit_sale_status(sale, CreditSaleStatus.APPROVED)
+        debt = Debt.objects.get(sale=sale)
+        assert debt.debt_status == 'not_started'
+        assert list(debt.terms.values_list('except_amount', flat=True)) == [Decimal('1000.00')]
+
+    def test_regenerate_keeps_paid_terms(self, new_user, new_customer):
+        """Test renegotiation replaces only the unpaid terms, over the remaining balance."""
+        debt = self._debt(new_user, new_customer, Decimal('900.00'), 3, date(2024, 1, 15))
+        term_services.generate_schedules([debt])
+        first = debt.terms.order_by('term_date').first()
+        first.pay_amount = Decimal('300.00')
+        first.save()
+        Debt.objects.filter(pk=debt.pk).update(balance=Decimal('600.00'))
+
+        term_services.reschedule_debts([{'debt': debt.pk, 'month_duration': 5}])
+        terms = list(debt.terms.order_by('term_date').values_list('term_date', 'except_amount'))
+        assert terms == [
+            (date(2024, 2, 15), Decimal('300.00')),
+            (date(2024, 3, 15), Decimal('150.00')),
+            (date(2024, 4, 15), Decimal('150.00')),
+            (date(2024, 5, 15), Decimal('150.00')),
+            (date(2024, 6, 15), Decimal('150.00')),
+        ]
+        debt.refresh_from_db()
+        assert debt.month_duration == 5
+
+    def test_regenerate_resumes_after_latest_paid_term(self, new_user, new_customer):
+        """Test a plan whose paid term is not the first resumes the month after it."""
+        debt = self._debt(new_user, new_customer, Decimal('900.00'), 3, date(2024, 1, 15))
+        term_services.generate_schedules([debt])
+        Term.objects.filter(debt=debt, term_date=date(2024, 3, 15)).update(pay_amount=Decimal('300.00'))
+        Debt.objects.filter(pk=debt.pk).update(balance=Decimal('600.00'))
+
+        term_services.reschedule_debts([{'debt': debt.pk, 'month_duration': 3}])
+        terms = list(debt.terms.order_by('term_date').values_list('term_date', 'except_amount'))
+        assert terms == [
+            (date(2024, 3, 15), Decimal('300.00')),
+            (date(2024, 4, 15), Decimal('300.00')),
+            (date(2024, 5, 15), Decimal('300.00')),
+        ]
+
+
+@pytest.mark.django_db
+class TestSelectiveHistory:
+    def _debt(self, user, customer):
+        sale = CreditSale.objects.create(customer=customer, commercial=user, total_amount=Decimal('300.00'))
+        return Debt.objects.create(sale=sale, init_amount=Decimal('300.00'), balance=Decimal('300.00'))
+
+    def test_unchanged_saves_are_not_recorded(self, new_user, new_customer):
+        """Test saves that change none of the saved fields write no history row."""
+        debt = self._debt(new_user, new_customer)
+        debt.save()
+        debt.balance = Decimal('300')  # Same value
+        debt.save(update_fields=['balance'])
+        Debt.objects.get(pk=debt.pk).save()
+        assert debt.history.count() == 1
+
+        debt.balance = Decimal('250.00')
+        debt.save(update_fields=['balance'])
+        assert debt.history.count() == 2
+
+    def test_stale_saves_are_recorded(self, new_user, new_customer):
+        """Test saving an instance loaded before a bulk update records the row it writes back."""
+        debt = self._debt(new_user, new_customer)
+        update_with_history(Debt.objects.filter(pk=debt.pk), balance=Decimal('100.00'))
+        assert debt.history.count() == 2
+        debt.save()
+        assert debt.history.count() == 3
+        assert debt.history.first().balance == Decimal('300.00')
+
+    def test_saves_are_coalesced(self, new_user, new_customer):
+        """Test several saves of a row within coalesce_history() write one row with the final state."""
+        debt = self._debt(new_user, new_customer)
+        with transaction.atomic(), coalesce_history():
+            for balance in ('200.00', '150.00', '100.00'):
+                debt.balance = Decimal(balance)
+                debt.save(update_fields=['balance'])
+            assert debt.history.count() == 1
+        assert debt.history.count() == 2
+        assert debt.history.first().balance == Decimal('100.00')
+
+    def test_status_updates_write_bulk_history(self, new_user, new_customer):
+        """Test the nightly status transitions keep an audit trail, one INSERT ... SELECT and one UPDATE each."""
+        debt = self._debt(new_user, new_customer)
+        Term.objects.bulk_create([
+            Term(debt=debt, term_date=date(2024, 1, day), except_amount=Decimal('100.00')) for day in (1, 2, 3)
+        ])
+        with CaptureQueriesContext(connection) as queries:
+            counts = debt_services.update_financial_statuses()
+        assert counts['terms_overdue'] == 3
+        rows = Term.history.filter(term_status='overdue')
+        assert rows.count() == 3
+        assert {row.history_change_reason for row in rows} == {'terms_overdue'}
+        sqls = [q['sql'] for q in queries.captured_queries]
+        # One statement each per term transition (overdue, partially overdue), no row read in Python
+        assert len([sql for sql in sqls if sql.startswith('INSERT INTO "receivables_historicalterm"')]) == 2
+        assert len([sql for sql in sqls if sql.startswith('UPDATE "receivables_term"')]) == 2
+        assert not [sql for sql in sqls if sql.startswith('SELECT') and 'FROM "receivables_term"' in sql]
@@ -1,11 +1,23 @@
 """receivables/tests/test_views.py"""
 import pytest
+from datetime import date, datetime, time, timedelta
 from decimal import Decimal
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APIClient
-from receivables.models import Debt
+from receivables.models import Debt, DebtStatus, Term, TermStatus, Recovery
 from sales.models import CreditSale
 from crm.models import Portfolio
+from rbac.models import Permission, Role
+from users.models import User
+from core.models import HistoryArchive, JobCheckpoint, KpiRollup, TimelineBucket, TimelineSeries
+from core.services import export_services, kpi_services
+from receivables.services import debt_services
 
 @pytest.fixture
 def api_client():
@@ -13,6 +25,25 @@ def api_client():
 
 @pytest.mark.django_db
 class TestDebtViews:
+    def test_reschedule_debts(self, api_client, new_user, new_customer):
+        """Test renegotiating debts in bulk regenerates their schedules."""
+        sale = CreditSale.objects.create(customer=new_customer, commercial=new_user, total_amount=Decimal('1200.00'))
+        debt = Debt.objects.create(
+            sale=sale, init_amount=Decimal('1200.00'), balance=Decimal('1200.00'), start_date=date(2024, 3, 31)
+        )
+        url = reverse('debt-reschedule')
+        api_client.force_authenticate(user=new_user)
+        response = api_client.post(url, {'debts': [
+            {'debt': debt.pk, 'month_duration': 4, 'monthly_payment': '250.00'}
+        ]}, format='json')
+        assert response.status_code == 200
+        terms = response.data[0]['terms']
+        assert [term['term_date'] for term in terms] == ['2024-04-30', '2024-05-31', '2024-06-30', '2024-07-31']
+        assert [term['except_amount'] for term in terms] == ['250.00', '250.00', '250.00', '450.00']
+
+        response = api_client.post(url, {'debts': [{'debt': 0}]}, format='json')
+        assert response.status_code == 400
+
     def test_list_debts(self, api_client, new_user, new_customer):
         """Test listing debts."""
         # Setup data
@@ -35,6 +66,29 @@ class TestDebtViews:
         assert response.status_code == 200
         assert len(response.data) > 0
 
+    def test_list_debts_query_budget(self, api_client, new_user, new_customer):
+        """Test a debt page costs the same number of queries whatever its size."""
+        url = reverse('debt-list')
+        api_client.force_authenticate(user=new_user)
+
+        def create_debts(count):
+            for _ in range(count):
+                sale = CreditSale.objects.create(customer=new_customer, commercial=new_user, total_amount=Decimal('100.00'))
+                debt = Debt.objects.create(sale=sale, init_amount=Decimal('100.00'), balance=Decimal('100.00'))
+                Term.objects.create(debt=debt, term_date=date.today(), except_amount=Decimal('100.00'))
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as context:
+                response = api_client.get(url)
+            assert response.status_code == 200
+            return len(context.captured_queries)
+
+        create_debts(2)
+        small_page = count_queries()
+        create_debts(23)
+        # COUNT + debts with sale/customer/details + prefetched terms
+        assert count_queries() == small_page == 3
+
     def test_retrieve_debt(self, api_client, new_user, new_customer):
         """Test retrieving a specific debt."""
         portfolio = Portfolio.objects.create(ref='PF_DEBT_VIEW_2', commercial=new_user)
@@ -54,4 +108,430 @@ class TestDebtViews:
         api_client.force_authenticate(user=new_user)
         response = api_client.get(url)
         assert response.status_code == 200
-        assert Decimal(response.data['balance']) == Decimal('1000.00')
\ No newline at end of file
+        assert Decimal(response.data['balance']) == Decimal('1000.00')
+
+    def test_update_financial_statuses(self, api_client, new_user, new_customer):
+        """Test the nightly status job reports per-transition counts."""
+        sale = CreditSale.objects.create(customer=new_customer, commercial=new_user, total_amount=Decimal('600.00'))
+        today = date.today()
+        overdue_debt = Debt.objects.create(
+            sale=sale,
+            init_amount=Decimal('600.00'),
+            balance=Decimal('100.00'),
+            start_date=today - timedelta(days=200),
+            month_duration=6,
+        )
+        Term.objects.create(debt=overdue_debt, term_date=today - timedelta(days=5), except_amount=Decimal('100.00'))
+        Term.objects.create(
+            debt=overdue_debt, term_date=today - timedelta(days=5),
+            except_amount=Decimal('100.00'), pay_amount=Decimal('50.00'), term_status=TermStatus.PARTIALLY_PAID
+        )
+        Term.objects.create(debt=overdue_debt, term_date=today + timedelta(days=5), except_amount=Decimal('100.00'))
+        kpi_services.apply_kpi_deltas(new_user.pk, None, today - timedelta(days=400), sales_count=7)
+        assert overdue_debt.due_date == today - timedelta(days=200) + timedelta(days=182)
+
+        url = reverse('debt-status-update')
+        api_client.force_authenticate(user=new_user)
+        response = api_client.post(url)
+        assert response.status_code == 200
+        assert response.data['terms_overdue'] == 1
+        assert response.data['terms_partially_overdue'] == 1
+        assert response.data['debts_ongoing'] == 0
+        assert response.data['debts_overdue'] == 1
+        overdue_debt.refresh_from_db()
+        assert overdue_debt.debt_status == DebtStatus.OVERDUE
+
+        # Only the rollups of the changed debts' days are reconciled
+        rollup = KpiRollup.objects.get(day=kpi_services.kpi_day(sale.sale_date))
+        assert (rollup.overdue_count, rollup.balance) == (1, Decimal('100.00'))
+        assert KpiRollup.objects.get(day=today - timedelta(days=400)).sales_count == 7
+
+
+@pytest.mark.django_db
+class TestRecoveryViews:
+    def test_create_recovery_updates_balances(self, api_client, new_user, new_customer, django_assert_max_num_queries):
+        """Test posting a payment updates term, debt and portfolio in a constant number of queries."""
+        portfolio = Portfolio.objects.create(ref='PF_RECOVERY', commercial=new_user, balance=Decimal('300.00'))
+        sale = CreditSale.objects.create(
+            customer=new_customer, commercial=new_user, portfolio=portfolio, total_amount=Decimal('300.00')
+        )
+        debt = Debt.objects.create(sale=sale, init_amount=Decimal('300.00'), balance=Decimal('300.00'))
+        term = Term.objects.create(debt=debt, term_date=date.today(), except_amount=Decimal('300.00'))
+
+        url = reverse('recovery-list')
+        api_client.force_authenticate(user=new_user)
+        # Term lookup by the serializer + debt and term locks + 4 writes + 3 history rows
+        # + search document and KPI rollup updates + savepoints
+        with django_assert_max_num_queries(14):
+            response = api_client.post(url, {'term': term.pk, 'amount': '100.00', 'payment_mode': 'cash'})
+        assert response.status_code == 201
+
+        term.refresh_from_db()
+        assert term.pay_amount == Decimal('100.00')
+        assert term.term_status == TermStatus.PARTIALLY_PAID
+
+        response = api_client.post(url, {'term': term.pk, 'amount': '200.00', 'payment_mode': 'cash'})
+        assert response.status_code == 201
+        term.refresh_from_db()
+        debt.refresh_from_db()
+        portfolio.refresh_from_db()
+        assert term.term_status == TermStatus.PAID
+        assert term.payment_date is not None
+        assert debt.balance == Decimal('0.00')
+        assert debt.debt_status == DebtStatus.PAID
+        assert debt.close_date == date.today()
+        assert portfolio.balance == Decimal('0.00')
+
+
+    def test_bulk_create_recoveries(self, api_client, new_user, new_customer, django_assert_max_num_queries):
+        """Test a batch of payments is posted with a constant number of queries."""
+        portfolio = Portfolio.objects.create(ref='PF_BULK', commercial=new_user, balance=Decimal('1000.00'))
+        terms = []
+        for i in range(5):
+            sale = CreditSale.objects.create(
+                customer=new_customer, commercial=new_user, portfolio=portfolio, total_amount=Decimal('200.00')
+            )
+            debt = Debt.objects.create(sale=sale, init_amount=Decimal('200.00'), balance=Decimal('200.00'))
+            terms += [
+                Term.objects.create(debt=debt, term_date=date.today(), except_amount=Decimal('100.00')),
+                Term.objects.create(debt=debt, term_date=date.today(), except_amount=Decimal('100.00')),
+            ]
+
+        payload = {'recoveries': [
+            {'term': term.pk, 'amount': '50.00', 'payment_mode': 'cash'} for term in terms
+        ] + [{'term': terms[0].pk, 'amount': '50.00'}, {'term': 0, 'amount': '10.00'}]}
+
+        url = reverse('recovery-bulk-create')
+        api_client.force_authenticate(user=new_user)
+        # Locks (debts, terms, portfolios) and set-based writes, whatever the batch size
+        with django_assert_max_num_queries(14):
+            response = api_client.post(url, payload, format='json')
+        assert response.status_code == 201
+
+        results = response.data['results']
+        assert len(results) == 12
+        assert results[-1]['error'] == "Term not found."
+        assert results[-2]['term_status'] == TermStatus.PAID
+        assert results[-2]['debt_balance'] == Decimal('50.00')
+        assert Recovery.objects.count() == 11
+        assert Recovery.history.count() == 11
+
+        portfolio.refresh_from_db()
+        assert portfolio.balance == Decimal('450.00')
+        terms[0].refresh_from_db()
+        assert terms[0].pay_amount == Decimal('100.00')
+        assert Debt.objects.get(pk=terms[0].debt_id).balance == Decimal('50.00')
+
+    def test_replayed_idempotency_key_does_not_post_twice(self, api_client, new_user, new_customer):
+        """Test retries carrying the same idempotency key return the original recovery."""
+        sale = CreditSale.objects.create(customer=new_customer, commercial=new_user, total_amount=Decimal('300.00'))
+        debt = Debt.objects.create(sale=sale, init_amount=Decimal('300.00'), balance=Decimal('300.00'))
+        term = Term.objects.create(debt=debt, term_date=date.today(), except_amount=Decimal('300.00'))
+        api_client.force_authenticate(user=new_user)
+
+        data = {'term': term.pk, 'amount': '100.00', 'payment_mode': 'cash'}
+        first = api_client.post(reverse('recovery-list'), data, HTTP_IDEMPOTENCY_KEY='sync-1')
+        retry = api_client.post(reverse('recovery-list'), {**data, 'idempotency_key': 'sync-1'})
+        assert first.status_code == retry.status_code == 201
+        assert retry.data['id'] == first.data['id']
+
+        payload = {'recoveries': [
+            {'term': term.pk, 'amount': '100.00', 'idempotency_key': 'sync-1'},
+            {'term': term.pk, 'amount': '50.00', 'idempotency_key': 'sync-2'},
+            {'term': term.pk, 'amount': '50.00', 'idempotency_key': 'sync-2'},
+        ]}
+        results = api_client.post(reverse('recovery-bulk-create'), payload, format='json').data['results']
+        assert [result['replayed'] for result in results] == [True, False, True]
+        assert results[0]['id'] == first.data['id']
+        assert results[2]['id'] == results[1]['id']
+
+        debt.refresh_from_db()
+        assert debt.balance == Decimal('150.00')
+        assert Recovery.objects.count() == 2
+
+        # The same key for a different posting is a conflict, not a replay
+        conflict = api_client.post(reverse('recovery-list'), {**data, 'amount': '90.00', 'idempotency_key': 'sync-1'})
+        assert conflict.status_code == 409
+        payload = {'recoveries': [{'term': term.pk, 'amount': '90.00', 'idempotency_key': 'sync-2'}]}
+        results = api_client.post(reverse('recovery-bulk-create'), payload, format='json').data['results']
+        assert 'already used' in results[0]['error']
+        assert Recovery.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_update_financial_statuses_command_resumes(new_user, new_customer):
+    """Test the chunked status command resumes an interrupted run from its checkpoint."""
+    today = date.today()
+    debts = []
+    for i in range(3):
+        sale = CreditSale.objects.create(customer=new_customer, commercial=new_user, total_amount=Decimal('100.00'))
+        debts.append(Debt.objects.create(
+            sale=sale, init_amount=Decimal('100.00'), balance=Decimal('100.00'),
+            start_date=today - timedelta(days=90), month_duration=1,
+        ))
+
+    # Simulate a run that crashed after processing the first debt
+    JobCheckpoint.objects.create(
+        name=debt_services.STATUS_JOB_NAME, run_date=today,
+        phase='debts_overdue', last_pk=debts[0].pk, counts={'debts_overdue': 1},
+    )
+    out = StringIO()
+    call_command('update_financial_statuses', '--batch-size=1', stdout=out)
+
+    assert 'debts_overdue: 3' in out.getvalue()
+    # The first debt was left to the (simulated) interrupted run
+    assert Debt.objects.filter(debt_status=DebtStatus.OVERDUE).count() == 2
+    assert JobCheckpoint.objects.get(name=debt_services.STATUS_JOB_NAME).completed is True
+
+
+@pytest.mark.django_db
+def test_update_financial_statuses_command_restarts_old_runs(new_user, new_customer):
+    """Test an unfinished run of an earlier day is started over with today's cutoff."""
+    today = date.today()
+    sale = CreditSale.objects.create(customer=new_customer, commercial=new_user, total_amount=Decimal('100.00'))
+    debt = Debt.objects.create(
+        sale=sale, init_amount=Decimal('100.00'), balance=Decimal('100.00'), debt_status=DebtStatus.ONGOING,
+    )
+    # Became due yesterday: overdue from today on
+    Debt.objects.filter(pk=debt.pk).update(due_date=today - timedelta(days=1))
+    JobCheckpoint.objects.create(
+        name=debt_services.STATUS_JOB_NAME, run_date=today - timedelta(days=1),
+        phase='debts_overdue', last_pk=0, counts={},
+    )
+    call_command('update_financial_statuses', '--batch-size=10', stdout=StringIO())
+
+    debt.refresh_from_db()
+    assert debt.debt_status == DebtStatus.OVERDUE
+    checkpoint = JobCheckpoint.objects.get(name=debt_services.STATUS_JOB_NAME)
+    assert (checkpoint.run_date, checkpoint.completed) == (today, True)
+
+
+@pytest.mark.django_db
+def test_stats_are_cached_with_validators(
+    api_client, new_user, new_customer, django_assert_num_queries, django_capture_on_commit_callbacks
+):
+    """Test stats responses are cached, revalidated with ETags and invalidated by writes."""
+    sale = CreditSale.objects.create(customer=new_customer, commercial=new_user, total_amount=Decimal('500.00'))
+    debt = Debt.objects.create(sale=sale, init_amount=Decimal('500.00'), balance=Decimal('500.00'))
+    url = reverse('debt-stats')
+    api_client.force_authenticate(user=new_user)
+
+    response = api_client.get(url, {'debt_status': DebtStatus.ONGOING})
+    assert response.status_code == 200
+    assert response.data['total_balance'] == Decimal('500.00')
+    etag = response.headers['ETag']
+    assert response.headers['Last-Modified']
+
+    with django_assert_num_queries(0):
+        response = api_client.get(url, {'debt_status': DebtStatus.ONGOING}, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+
+    # The version is only bumped once the write commits
+    with django_capture_on_commit_callbacks() as callbacks:
+        debt.balance = Decimal('300.00')
+        debt.save()
+        response = api_client.get(url, {'debt_status': DebtStatus.ONGOING}, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+    for callback in callbacks:
+        callback()
+    response = api_client.get(url, {'debt_status': DebtStatus.ONGOING}, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response.data['total_balance'] == Decimal('300.00')
+    assert response.headers['ETag'] != etag
+
+
+@pytest.mark.django_db
+def test_timeline_persists_closed_periods(api_client, new_user, new_customer):
+    """Test closed periods of a timeline are persisted, invalidated by back-dated writes, and bucketed by granularity."""
+    sale = CreditSale.objects.create(customer=new_customer, commercial=new_user, total_amount=Decimal('500.00'))
+    debt = Debt.objects.create(sale=sale, init_amount=Decimal('500.00'), balance=Decimal('500.00'))
+    term = Term.objects.create(debt=debt, term_date=date.today(), except_amount=Decimal('500.00'))
+    old = Recovery.objects.create(commercial=new_user, term=term, amount=Decimal('100.00'))
+    Recovery.objects.create(commercial=new_user, term=term, amount=Decimal('50.00'))
+    past = timezone.now() - timedelta(days=70)
+    Recovery.objects.filter(pk=old.pk).update(recovery_date=past)
+
+    url = reverse('recovery-timeline')
+    api_client.force_authenticate(user=new_user)
+    response = api_client.get(url)
+    assert response.status_code == 200
+    assert [point['total_collected'] for point in response.data] == [Decimal('100.00'), Decimal('50.00')]
+    assert response.data[0]['month'] == past.date().replace(day=1)
+    assert TimelineBucket.objects.get().total == Decimal('100.00')
+
+    # Closed periods are read back from their bucket, not re-aggregated
+    Recovery.objects.filter(pk=old.pk).update(amount=Decimal('80.00'))
+    cache.clear()
+    assert api_client.get(url).data[0]['total_collected'] == Decimal('100.00')
+
+    # A write through the model drops the persisted buckets
+    old.refresh_from_db()
+    old.save()
+    cache.clear()
+    assert api_client.get(url).data[0]['total_collected'] == Decimal('80.00')
+
+    response = api_client.get(url, {'granularity': 'week'})
+    assert response.data[-1]['week'] == date.today() - timedelta(days=date.today().weekday())
+    assert api_client.get(url, {'granularity': 'year'}).status_code == 400
+
+    # Only validated filterset values identify a series: unknown parameters reuse it
+    series = TimelineSeries.objects.count()
+    api_client.get(url, {'page': 3, 'junk': 'x'})
+    assert TimelineSeries.objects.count() == series
+    assert api_client.get(url, {'min_date': 'bogus'}).status_code == 400
+
+    # Filters across a relation are not invalidated by writes to it: aggregated live
+    response = api_client.get(reverse('debt-timeline'), {'sale__commercial': new_user.pk})
+    assert response.status_code == 200
+    assert TimelineSeries.objects.count() == series
+
+
+@pytest.mark.django_db
+def test_timeline_invalidation_is_per_bucket(api_client, new_user, new_customer):
+    """Test a back-dated write only drops the buckets of its periods, and unused series are pruned."""
+    sale = CreditSale.objects.create(customer=new_customer, commercial=new_user, total_amount=Decimal('500.00'))
+    debt = Debt.objects.create(sale=sale, init_amount=Decimal('500.00'), balance=Decimal('500.00'))
+    term = Term.objects.create(debt=debt, term_date=date.today(), except_amount=Decimal('500.00'))
+    months = [date.today().replace(day=1)]
+    for _ in range(3):
+        months.append((months[-1] - timedelta(days=1)).replace(day=1))
+    moved, kept = (
+        Recovery.objects.create(commercial=new_user, term=term, amount=Decimal(amount))
+        for amount in ('100.00', '40.00')
+    )
+    for recovery, month in ((moved, months[1]), (kept, months[2])):
+        recovery_date = timezone.make_aware(datetime.combine(month, time(12)))
+        Recovery.objects.filter(pk=recovery.pk).update(recovery_date=recovery_date)
+
+    url = reverse('recovery-timeline')
+    api_client.force_authenticate(user=new_user)
+    api_client.get(url)
+    kept_bucket = TimelineBucket.objects.get(period_start=months[2])
+
+    # Moved to another closed month: the buckets of its old and new months are recomputed, not the others
+    moved = Recovery.objects.get(pk=moved.pk)
+    moved.recovery_date = timezone.make_aware(datetime.combine(months[3], time(12)))
+    moved.save()
+    assert list(TimelineBucket.objects.values_list('period_start', flat=True)) == [months[2]]
+    cache.clear()
+    response = api_client.get(url)
+    assert [(point['month'], point['total_collected']) for point in response.data] == [
+        (months[3], Decimal('100.00')), (months[2], Decimal('40.00'))
+    ]
+    assert TimelineBucket.objects.get(period_start=months[2]).pk == kept_bucket.pk
+
+    # Series nobody read for TIMELINE_SERIES_TTL_DAYS are deleted with their buckets
+    TimelineSeries.objects.update(last_used_at=timezone.now() - timedelta(days=31))
+    call_command('prune_timelines', stdout=StringIO())
+    assert not TimelineSeries.objects.exists() and not TimelineBucket.objects.exists()
+
+
+@pytest.mark.django_db
+def test_export_debts_csv(api_client, new_user, new_customer, monkeypatch):
+    """Test the CSV export streams the filtered debts, scoped to the commercial."""
+    portfolio = Portfolio.objects.create(ref='PF_EXPORT', commercial=new_user)
+    sale = CreditSale.objects.create(
+        customer=new_customer, commercial=new_user, portfolio=portfolio, total_amount=Decimal('500.00')
+    )
+    debt = Debt.objects.create(sale=sale, init_amount=Decimal('500.00'), balance=Decimal('500.00'))
+    other_sale = CreditSale.objects.create(customer=new_customer, commercial=new_user, total_amount=Decimal('90.00'))
+    Debt.objects.create(
+        sale=other_sale, init_amount=Decimal('90.00'), balance=Decimal('0.00'), debt_status=DebtStatus.PAID
+    )
+    url = reverse('debt-export')
+    api_client.force_authenticate(user=new_user)
+
+    response = api_client.get(url, {'debt_status': DebtStatus.ONGOING})
+    assert response.status_code == 200
+    assert response.streaming
+    assert response['Content-Disposition'].startswith('attachment; filename="debt_')
+    lines = b''.join(response.streaming_content).decode().splitlines()
+    assert lines[0].startswith('id,sale,customer,commercial,portfolio,init_amount,balance')
+    assert lines[1:] == [
+        f"{debt.id},{sale.id},{new_customer.display_name},{new_user.username},PF_EXPORT,500.00,500.00,"
+        f"0.00,1,{debt.start_date},{debt.due_date},,{DebtStatus.ONGOING},"
+    ]
+
+    commercial = User.objects.create_user(username='export_commercial', password='password123')
+    role = Role.objects.create(name='Debt reader')
+    role.permissions.add(Permission.objects.create(code='debt.list', label='List debts'))
+    commercial.roles.add(role)
+    api_client.force_authenticate(user=commercial)
+    response = api_client.get(url)
+    assert len(b''.join(response.streaming_content).decode().splitlines()) == 1
+    assert api_client.get(url, {'file_format': 'pdf'}).status_code == 400
+    monkeypatch.setattr(export_services, 'XLSX_AVAILABLE', False)
+    assert api_client.get(url, {'file_format': 'xlsx'}).status_code == 501
+
+
+@pytest.mark.django_db
+class TestHistoryViews:
+    def _debt_with_updates(self, user, customer, updates):
+        sale = CreditSale.objects.create(customer=customer, commercial=user, total_amount=Decimal('500.00'))
+        debt = Debt.objects.create(sale=sale, init_amount=Decimal('500.00'), balance=Decimal('500.00'))
+        for balance in updates:
+            debt.balance = Decimal(balance)
+            debt.save()
+        return debt
+
+    def test_history_list_diffs_in_constant_queries(self, api_client, new_user, new_customer):
+        """Test history pages compute diffs from predecessors fetched in one batched query."""
+        url = reverse('debt-histories-list')
+        api_client.force_authenticate(user=new_user)
+        self._debt_with_updates(new_user, new_customer, ['400.00', '300.00'])
+
+        with CaptureQueriesContext(connection) as small:
+            response = api_client.get(url)
+        assert response.status_code == 200
+        changes = [row['changes'] for row in response.data['results'] if row['changes']]
+        assert {'old': Decimal('500.00'), 'new': Decimal('400.00')} in [c['balance'] for c in changes]
+        assert {'old': Decimal('400.00'), 'new': Decimal('300.00')} in [c['balance'] for c in changes]
+
+        for _ in range(3):
+            self._debt_with_updates(new_user, new_customer, ['450.00', '200.00', '100.00'])
+        with CaptureQueriesContext(connection) as large:
+            response = api_client.get(url)
+        assert response.data['count'] == 15
+        assert len(large) == len(small)
+
+    def test_archived_history_is_excluded_or_included(self, api_client, new_user, new_customer):
+        """Test archived history rows are hidden by default and read back with ?archive=include."""
+        debt = self._debt_with_updates(new_user, new_customer, ['400.00', '300.00'])
+        for age, row in zip((401, 400), Debt.history.filter(id=debt.pk).order_by('history_date')[:2]):
+            Debt.history.filter(history_id=row.history_id).update(history_date=timezone.now() - timedelta(days=age))
+        out = StringIO()
+        call_command('archive_history', '--model', 'receivables.HistoricalDebt', stdout=out)
+        assert '2 history rows archived' in out.getvalue()
+        assert Debt.history.filter(id=debt.pk).count() == 1
+
+        url = reverse('debt-histories-list')
+        api_client.force_authenticate(user=new_user)
+        response = api_client.get(url)
+        assert response.data['count'] == 1
+        # The predecessor of the oldest live row is read from the archive
+        assert response.data['results'][0]['changes']['balance'] == {
+            'old': Decimal('400.00'), 'new': Decimal('300.00')
+        }
+
+        response = api_client.get(url, {'archive': 'include'})
+        assert response.data['count'] == 3
+        results = response.data['results']
+        assert [row['balance'] for row in results] == ['300.00', '400.00', '500.00']
+        assert results[1]['changes']['balance'] == {'old': Decimal('500.00'), 'new': Decimal('400.00')}
+
+        response = api_client.get(url, {'archive': 'only', 'page_size': 1, 'page': 2})
+        assert response.data['count'] == 2
+        assert response.data['results'][0]['balance'] == '500.00'
+
+        response = api_client.get(url, {'archive': 'everything'})
+        assert response.status_code == 400
+
+        # Archived rows are only listed: their id is not found by the detail route
+        archived_id = HistoryArchive.objects.values_list('history_id', flat=True).first()
+        assert api_client.get(reverse('debt-histories-detail', args=[archived_id])).status_code == 404
+
+        # A live row older than the archive (back-dated) is merged in date order
+        live = Debt.history.get(id=debt.pk)
+        Debt.history.filter(history_id=live.history_id).update(history_date=timezone.now() - timedelta(days=500))
+        results = api_client.get(url, {'archive': 'include'}).data['results']
+        assert [row['balance'] for row in results] == ['400.00', '500.00', '300.00']
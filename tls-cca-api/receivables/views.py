@@ -1,4 +1,5 @@
 # receivables/views.py
+from decimal import Decimal
 from rest_framework import viewsets, status, views
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -9,6 +10,8 @@ from drf_spectacular.utils import extend_schema
 
 from rbac.services.permission_services import AutoPermissionMixin
 from core.mixins.stats import StatsMixin
+from core.mixins.export import ExportMixin
+from core.mixins.history import HistoryArchiveMixin
 from .models import *
 from .serializers import *
 from .filters import DebtFilter, TermFilter, RecoveryFilter
@@ -16,24 +19,58 @@ from .services import debt_services
 
 # Debts viewsets
 @extend_schema(tags=["Debts"])
-class DebtViewSet(AutoPermissionMixin, StatsMixin, viewsets.ModelViewSet):
+class DebtViewSet(AutoPermissionMixin, StatsMixin, ExportMixin, viewsets.ModelViewSet):
     """
 
     """
-    queryset = Debt.objects.all()
+    # Everything DebtSerializer reads: nested terms and the customer's display name
+    queryset = Debt.objects.select_related('sale__customer').prefetch_related('terms')
     resource = "debt"
     serializer_class = DebtSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = DebtFilter
+    permission_code_map = {'reschedule': 'update', 'export': 'list'}
 
     stats_aggregates = {
-        'total_initial_amount': Coalesce(Sum('init_amount'), 0.0),
-        'total_balance': Coalesce(Sum('balance'), 0.0),
+        'total_initial_amount': Coalesce(Sum('init_amount'), Decimal('0')),
+        'total_balance': Coalesce(Sum('balance'), Decimal('0')),
         'count': Count('id')
     }
     timeline_date_field = 'start_date'
     timeline_amount_field = 'init_amount'
     timeline_amount_alias = 'total_amount'
+    timeline_live_filters = ('debt_status',)
+
+    export_fields = [
+        ('id', 'id'),
+        ('sale', 'sale'),
+        ('customer', 'sale__customer__display_name'),
+        ('commercial', 'sale__commercial__username'),
+        ('portfolio', 'sale__portfolio__ref'),
+        ('init_amount', 'init_amount'),
+        ('balance', 'balance'),
+        ('monthly_payment', 'monthly_payment'),
+        ('month_duration', 'month_duration'),
+        ('start_date', 'start_date'),
+        ('due_date', 'due_date'),
+        ('close_date', 'close_date'),
+        ('debt_status', 'debt_status'),
+        ('regulation_mode', 'regulation_mode'),
+    ]
+    export_owner_fields = ('sale__commercial', 'sale__portfolio__commercial')
+
+    @extend_schema(request=DebtRescheduleSerializer, responses={200: DebtSerializer(many=True)})
+    @action(detail=False, methods=['post'], url_path='reschedule')
+    def reschedule(self, request):
+        """
+        Applies renegotiated conditions to a batch of debts and regenerates their unpaid terms.
+        """
+        serializer = DebtRescheduleSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        debts = serializer.save()
+
+        queryset = self.get_queryset().filter(pk__in=[debt.pk for debt in debts])
+        return Response(DebtSerializer(queryset, many=True).data, status=status.HTTP_200_OK)
 
 @extend_schema(tags=["Debts"])
 class DebtStatusUpdateView(AutoPermissionMixin, views.APIView):
@@ -48,12 +85,15 @@ class DebtStatusUpdateView(AutoPermissionMixin, views.APIView):
         return {'POST': f"{self.permission_suffix}"}
 
     def post(self, request, *args, **kwargs):
-        updated_count = debt_services.update_financial_statuses()
-        return Response({'detail': f'Statuses updated. {updated_count} debts marked as overdue.'}, status=status.HTTP_200_OK)
+        counts = debt_services.update_financial_statuses()
+        return Response({
+            **counts,
+            'detail': f"Statuses updated. {counts['debts_overdue']} debts marked as overdue."
+        }, status=status.HTTP_200_OK)
 
 # Terms viewsets
 @extend_schema(tags=["Terms"])
-class TermViewSet(AutoPermissionMixin, StatsMixin, viewsets.ModelViewSet):
+class TermViewSet(AutoPermissionMixin, StatsMixin, ExportMixin, viewsets.ModelViewSet):
     """
 
     """
@@ -62,19 +102,33 @@ class TermViewSet(AutoPermissionMixin, StatsMixin, viewsets.ModelViewSet):
     serializer_class = TermSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = TermFilter
+    permission_code_map = {'export': 'list'}
 
     stats_aggregates = {
-        'total_expected': Coalesce(Sum('except_amount'), 0.0),
-        'total_paid': Coalesce(Sum('pay_amount'), 0.0),
+        'total_expected': Coalesce(Sum('except_amount'), Decimal('0')),
+        'total_paid': Coalesce(Sum('pay_amount'), Decimal('0')),
         'count': Count('id')
     }
     timeline_date_field = 'term_date'
     timeline_amount_field = 'except_amount'
     timeline_amount_alias = 'total_expected'
+    timeline_live_filters = ('term_status',)
+
+    export_fields = [
+        ('id', 'id'),
+        ('debt', 'debt'),
+        ('customer', 'debt__sale__customer__display_name'),
+        ('term_date', 'term_date'),
+        ('except_amount', 'except_amount'),
+        ('pay_amount', 'pay_amount'),
+        ('payment_date', 'payment_date'),
+        ('term_status', 'term_status'),
+    ]
+    export_owner_fields = ('debt__sale__commercial', 'debt__sale__portfolio__commercial')
 
 # Recoveries viewsets
 @extend_schema(tags=["Recoveries"])
-class RecoveryViewSet(AutoPermissionMixin, StatsMixin, viewsets.ModelViewSet):
+class RecoveryViewSet(AutoPermissionMixin, StatsMixin, ExportMixin, viewsets.ModelViewSet):
     """
 
     """
@@ -83,19 +137,48 @@ class RecoveryViewSet(AutoPermissionMixin, StatsMixin, viewsets.ModelViewSet):
     serializer_class = RecoverySerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecoveryFilter
+    permission_code_map = {'bulk_create': 'create', 'export': 'list'}
 
     stats_aggregates = {
-        'total_collected': Coalesce(Sum('amount'), 0.0),
+        'total_collected': Coalesce(Sum('amount'), Decimal('0')),
         'count': Count('id')
     }
     timeline_date_field = 'recovery_date'
     timeline_amount_field = 'amount'
     timeline_amount_alias = 'total_collected'
 
+    export_fields = [
+        ('id', 'id'),
+        ('recovery_date', 'recovery_date'),
+        ('amount', 'amount'),
+        ('payment_mode', 'payment_mode'),
+        ('term', 'term'),
+        ('debt', 'term__debt'),
+        ('customer', 'term__debt__sale__customer__display_name'),
+        ('commercial', 'commercial__username'),
+    ]
+    export_owner_fields = ('commercial', 'term__debt__sale__commercial', 'term__debt__sale__portfolio__commercial')
+
+    @extend_schema(request=RecoveryBulkSerializer, responses={201: dict})
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_create(self, request):
+        """
+        Posts a batch of recoveries at once and returns one result per item.
+        """
+        serializer = RecoveryBulkSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        results = serializer.save()
+
+        created = any('id' in result for result in results)
+        return Response(
+            {'results': results},
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST
+        )
+
 
 """ Historical ViewSets """
 @extend_schema(tags=["Debts"])
-class DebtHistoryViewSet(AutoPermissionMixin, viewsets.ReadOnlyModelViewSet):
+class DebtHistoryViewSet(AutoPermissionMixin, HistoryArchiveMixin, viewsets.ReadOnlyModelViewSet):
     """
     
     """
@@ -104,7 +187,7 @@ class DebtHistoryViewSet(AutoPermissionMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = HistoricalDebtSerializer
 
 @extend_schema(tags=["Terms"])
-class TermHistoryViewSet(AutoPermissionMixin, viewsets.ReadOnlyModelViewSet):
+class TermHistoryViewSet(AutoPermissionMixin, HistoryArchiveMixin, viewsets.ReadOnlyModelViewSet):
     """
     
     """
@@ -113,7 +196,7 @@ class TermHistoryViewSet(AutoPermissionMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = HistoricalTermSerializer
 
 @extend_schema(tags=["Recoveries"])
-class RecoveryHistoryViewSet(AutoPermissionMixin, viewsets.ReadOnlyModelViewSet):
+class RecoveryHistoryViewSet(AutoPermissionMixin, HistoryArchiveMixin, viewsets.ReadOnlyModelViewSet):
     """
     
     """
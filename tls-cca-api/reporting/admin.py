@@ -1,3 +1,8 @@
 from django.contrib import admin
+from .models import ReportJob
 
-# Register your models here.
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'progress', 'requested_by', 'worker', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status')
+    readonly_fields = ('created_at', 'started_at', 'heartbeat_at', 'finished_at')
@@ -0,0 +1,40 @@
+"""
+Management command running a report worker: it takes pending ReportJobs from the
+database queue and computes them. Start one per core (and per node) to scale.
+"""
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+
+from reporting.services import job_services
+
+class Command(BaseCommand):
+    help = "Process queued report jobs (aging, exports)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit when the queue is empty.")
+        parser.add_argument('--sleep', type=float, default=2.0, help="Seconds between polls of an empty queue.")
+        parser.add_argument(
+            '--stale-after', type=int, default=5,
+            help="Requeue running jobs without a heartbeat for this many minutes (crashed workers)."
+        )
+
+    def handle(self, *args, **options):
+        worker = job_services.get_worker_name()
+        requeued = job_services.requeue_stale_jobs(timedelta(minutes=options['stale_after']))
+        if requeued:
+            self.stdout.write(f"{requeued} stale jobs requeued.")
+        self.stdout.write(f"Report worker {worker} started.")
+
+        processed = 0
+        while True:
+            job = job_services.claim_next_job(worker)
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+            job = job_services.run_job(job)
+            processed += 1
+            self.stdout.write(f"{job}")
+        self.stdout.write(self.style.SUCCESS(f"✔️  {processed} report jobs processed."))
@@ -1,3 +1,49 @@
+""" Reporting Models """
 from django.db import models
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
 
-# Create your models here.
+
+class ReportJobKind(models.TextChoices):
+    AGING = 'aging', _('Aging report')
+    DEBTS_EXPORT = 'debts_export', _('Debts export')
+    TERMS_EXPORT = 'terms_export', _('Terms export')
+    RECOVERIES_EXPORT = 'recoveries_export', _('Recoveries export')
+
+
+class ReportJobStatus(models.TextChoices):
+    PENDING = 'pending', _('Pending')
+    RUNNING = 'running', _('Running')
+    DONE = 'done', _('Done')
+    FAILED = 'failed', _('Failed')
+
+
+class ReportJob(models.Model):
+    """
+    A report computed in the background by the `run_report_worker` command.
+    The table is the queue: workers claim pending jobs with SELECT ... FOR UPDATE SKIP LOCKED.
+    """
+    kind = models.CharField(max_length=30, choices=ReportJobKind.choices)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=ReportJobStatus.choices, default=ReportJobStatus.PENDING)
+    progress = models.PositiveSmallIntegerField(default=0, help_text="Percentage")
+    result_file = models.FileField(upload_to='reports/', null=True, blank=True)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='report_jobs')
+    worker = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Touched periodically by the worker running the job, see job_services.requeue_stale_jobs
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Report job"
+        verbose_name_plural = "Report jobs"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Report job #{self.pk} ({self.kind}, {self.status})"
@@ -0,0 +1,57 @@
+# reporting/serializers.py
+from rest_framework import serializers
+from rest_framework.exceptions import PermissionDenied
+
+from .models import ReportJob, ReportJobKind
+from .services import job_services
+from .services.aging_services import AGING_GROUPS
+
+
+class AgingReportQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of the aging report.
+    """
+    group_by = serializers.ChoiceField(choices=list(AGING_GROUPS), default='commercial')
+    as_of = serializers.DateField(required=False, help_text="Reference date (default: today).")
+
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    """
+    Serializer for report jobs: `kind` and `params` on submit, the rest is set by the worker.
+    Aging params: {"group_by": ..., "as_of": ...}; export params: {"filters": {...}}
+    with the filters of the corresponding list endpoint.
+    """
+    class Meta:
+        model = ReportJob
+        fields = [
+            'id', 'kind', 'params', 'status', 'progress', 'result_file', 'error',
+            'created_at', 'started_at', 'finished_at',
+        ]
+        read_only_fields = (
+            'status', 'progress', 'result_file', 'error', 'created_at', 'started_at', 'finished_at'
+        )
+
+    def validate(self, attrs):
+        # Submitting a report reads the data of its endpoint: same permission required
+        if not job_services.can_submit(self.context['request'].user, attrs['kind']):
+            raise PermissionDenied(
+                f"Permission '{job_services.KIND_PERMISSIONS[attrs['kind']]}' is required for this report."
+            )
+        params = attrs.get('params') or {}
+        if attrs['kind'] == ReportJobKind.AGING:
+            query = AgingReportQuerySerializer(data=params)
+            query.is_valid(raise_exception=True)
+            attrs['params'] = {key: str(value) for key, value in query.validated_data.items()}
+        else:
+            filters = params.get('filters', {})
+            if not isinstance(filters, dict):
+                raise serializers.ValidationError({'params': "'filters' must be an object."})
+            filterset = job_services.get_export_filterset(attrs['kind'], filters)
+            if not filterset.is_valid():
+                raise serializers.ValidationError({'params': {'filters': filterset.errors}})
+        return attrs
+
+    def create(self, validated_data):
+        return job_services.submit_job(
+            self.context['request'].user, validated_data['kind'], validated_data.get('params')
+        )
@@ -0,0 +1,111 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.db.models import F, Q, Sum, Count, DecimalField, ExpressionWrapper
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from receivables.models import Term, TermStatus
+
+# (key, first day past due, last day past due) — None means unbounded
+AGING_BUCKETS = [
+    ('days_0_30', 0, 30),
+    ('days_31_60', 31, 60),
+    ('days_61_90', 61, 90),
+    ('days_90_plus', 91, None),
+]
+
+# group_by -> (id field, label fields) on Term
+AGING_GROUPS = {
+    'commercial': ('debt__sale__commercial', [
+        'debt__sale__commercial__username',
+        'debt__sale__commercial__first_name',
+        'debt__sale__commercial__last_name',
+    ]),
+    'portfolio': ('debt__sale__portfolio', ['debt__sale__portfolio__ref']),
+    'customer': ('debt__sale__customer', ['debt__sale__customer__display_name']),
+}
+
+OUTSTANDING = ExpressionWrapper(
+    F('except_amount') - F('pay_amount'), output_field=DecimalField(max_digits=12, decimal_places=2)
+)
+
+
+def get_aging_scope(user):
+    """
+    Terms visible to the user, with the same rule as stats_services.get_global_stats:
+    everything for admins, otherwise the sales they own or that sit in their portfolios.
+    """
+    if user.is_superuser or user.has_permission('dashboard.view_all_stats'):
+        return Term.objects.all()
+    return Term.objects.filter(Q(debt__sale__commercial=user) | Q(debt__sale__portfolio__commercial=user))
+
+
+def _bucket_filter(as_of, first_day, last_day) -> Q:
+    """Terms whose due date is between `first_day` and `last_day` days before `as_of`."""
+    condition = Q(term_date__lte=as_of - timedelta(days=first_day))
+    if last_day is not None:
+        condition &= Q(term_date__gte=as_of - timedelta(days=last_day))
+    return condition
+
+
+def _label(group_by, row) -> str:
+    _, label_fields = AGING_GROUPS[group_by]
+    if group_by == 'commercial':
+        username, first_name, last_name = (row[field] for field in label_fields)
+        return f"{first_name} {last_name}".strip() or username or ""
+    return row[label_fields[0]] or ""
+
+
+def get_aging_report(user, group_by='commercial', as_of=None) -> dict:
+    """
+    Buckets the outstanding amount (except_amount - pay_amount) of unpaid terms by days
+    past their due date (0-30, 31-60, 61-90, 90+, plus not yet due), per commercial,
+    portfolio or customer.
+
+    All buckets are computed in a single GROUP BY query with conditional aggregation;
+    the date thresholds are precomputed so the database only compares term_date.
+    """
+    if group_by not in AGING_GROUPS:
+        raise ValueError(f"Unknown group_by '{group_by}'.")
+    as_of = as_of or timezone.localdate()
+    id_field, label_fields = AGING_GROUPS[group_by]
+    zero = Decimal('0')
+
+    aggregates = {
+        'not_due': Coalesce(Sum(OUTSTANDING, filter=Q(term_date__gt=as_of)), zero),
+        **{
+            key: Coalesce(Sum(OUTSTANDING, filter=_bucket_filter(as_of, first_day, last_day)), zero)
+            for key, first_day, last_day in AGING_BUCKETS
+        },
+        'total_outstanding': Coalesce(Sum(OUTSTANDING), zero),
+        'terms_count': Count('id'),
+    }
+    rows = (
+        get_aging_scope(user)
+        .exclude(term_status=TermStatus.PAID)
+        .filter(except_amount__gt=F('pay_amount'))
+        .values(id_field, *label_fields)
+        .annotate(**aggregates)
+        .order_by('-total_outstanding')
+    )
+
+    keys = list(aggregates)
+    totals = dict.fromkeys(keys, zero)
+    totals['terms_count'] = 0
+    results = []
+    for row in rows:
+        for key in keys:
+            totals[key] += row[key]
+        results.append({
+            'id': row[id_field],
+            'label': _label(group_by, row),
+            **{key: row[key] for key in keys},
+        })
+
+    return {
+        'as_of': as_of,
+        'group_by': group_by,
+        'buckets': ['not_due', *(key for key, _, _ in AGING_BUCKETS)],
+        'rows': results,
+        'totals': totals,
+    }
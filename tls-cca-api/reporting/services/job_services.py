@@ -0,0 +1,178 @@
+"""
+Background report jobs. The ReportJob table is the queue: any number of
+`run_report_worker` processes, on any node, claim pending jobs with
+SELECT ... FOR UPDATE SKIP LOCKED, so no external broker is needed.
+"""
+import json
+import os
+import socket
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import date, timedelta
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.services import export_services
+from reporting.models import ReportJob, ReportJobKind, ReportJobStatus
+from reporting.services.aging_services import get_aging_report
+
+# Export jobs reuse the filters, columns and owner scope of the list endpoints
+EXPORT_VIEWSETS = {
+    ReportJobKind.DEBTS_EXPORT: 'receivables.views.DebtViewSet',
+    ReportJobKind.TERMS_EXPORT: 'receivables.views.TermViewSet',
+    ReportJobKind.RECOVERIES_EXPORT: 'receivables.views.RecoveryViewSet',
+}
+
+# Seconds between two heartbeats of a running job
+HEARTBEAT_INTERVAL = 30
+
+# Permission needed to submit each kind: the one of the endpoint it reproduces
+KIND_PERMISSIONS = {
+    ReportJobKind.AGING: 'report.view',
+    ReportJobKind.DEBTS_EXPORT: 'debt.list',
+    ReportJobKind.TERMS_EXPORT: 'term.list',
+    ReportJobKind.RECOVERIES_EXPORT: 'recovery.list',
+}
+
+
+def can_submit(user, kind) -> bool:
+    """Whether `user` may run reports of `kind`, i.e. read the data of its endpoint."""
+    return user.is_superuser or user.has_permission(KIND_PERMISSIONS[kind])
+
+
+def get_export_filterset(kind, filters):
+    """Filterset of the list endpoint of an export kind, bound to `filters`."""
+    viewset = import_string(EXPORT_VIEWSETS[kind])
+    return viewset.filterset_class(data=filters, queryset=viewset.queryset.all())
+
+
+def get_worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def submit_job(user, kind, params=None) -> ReportJob:
+    """Queues a report for the worker."""
+    return ReportJob.objects.create(requested_by=user, kind=kind, params=params or {})
+
+
+def claim_next_job(worker=None):
+    """
+    Marks the oldest pending job as running for this worker and returns it (None if
+    the queue is empty). Rows locked by other workers are skipped, not waited for.
+    """
+    with transaction.atomic():
+        job = (
+            ReportJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=ReportJobStatus.PENDING)
+            .order_by('created_at', 'pk')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = ReportJobStatus.RUNNING
+        job.worker = worker or get_worker_name()
+        job.started_at = job.heartbeat_at = timezone.now()
+        job.save(update_fields=['status', 'worker', 'started_at', 'heartbeat_at'])
+    return job
+
+
+def requeue_stale_jobs(timeout: timedelta) -> int:
+    """
+    Puts back in the queue the running jobs whose worker sent no heartbeat for
+    `timeout` (e.g. a killed worker). Jobs that run long but are alive are kept.
+    """
+    cutoff = timezone.now() - timeout
+    return ReportJob.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+        status=ReportJobStatus.RUNNING,
+    ).update(status=ReportJobStatus.PENDING, worker='', progress=0)
+
+
+def _owned(job):
+    """The job's row, as long as it is still run by the worker that claimed it."""
+    return ReportJob.objects.filter(pk=job.pk, status=ReportJobStatus.RUNNING, worker=job.worker)
+
+
+@contextmanager
+def _heartbeat(job, interval=HEARTBEAT_INTERVAL):
+    """Touches the job's heartbeat every `interval` seconds from a thread, while the block runs."""
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(interval) and _owned(job).update(heartbeat_at=timezone.now()):
+                pass
+        finally:
+            connections.close_all()  # This thread's connections only
+
+    thread = threading.Thread(target=beat, name=f"report-job-{job.pk}-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _set_progress(job, progress):
+    job.progress = progress
+    _owned(job).update(progress=progress, heartbeat_at=timezone.now())
+
+
+def _run_aging(job, output):
+    params = dict(job.params)
+    if params.get('as_of'):
+        params['as_of'] = date.fromisoformat(params['as_of'])
+    report = get_aging_report(job.requested_by, **params)
+    output.write(json.dumps(report, cls=DjangoJSONEncoder).encode())
+    return 'json'
+
+
+def _run_export(job, output):
+    viewset = import_string(EXPORT_VIEWSETS[job.kind])
+    filterset = get_export_filterset(job.kind, job.params.get('filters', {}))
+    if not filterset.is_valid():
+        raise ValueError(json.dumps(filterset.errors))
+    queryset = export_services.scope_to_owner(filterset.qs, viewset.export_owner_fields, job.requested_by)
+
+    total = queryset.count()
+    for index, line in enumerate(export_services.iter_csv_lines(
+        export_services.iter_export_rows(queryset, viewset.export_fields), viewset.export_fields
+    )):
+        output.write(line.encode())
+        if index and index % export_services.EXPORT_CHUNK_SIZE == 0:
+            _set_progress(job, min(99, index * 100 // total))
+    return 'csv'
+
+
+def run_job(job) -> ReportJob:
+    """
+    Computes a claimed job and stores its result file (or its error), sending
+    heartbeats meanwhile. If the job was requeued in the meantime (see
+    `requeue_stale_jobs`), its row is left to the worker now running it and the
+    result is discarded.
+    """
+    runner = _run_aging if job.kind == ReportJobKind.AGING else _run_export
+    try:
+        with _heartbeat(job), tempfile.TemporaryFile() as output:
+            extension = runner(job, output)
+            output.seek(0)
+            job.result_file.save(f"{job.kind}_{job.pk}.{extension}", File(output), save=False)
+        job.status = ReportJobStatus.DONE
+        job.progress = 100
+    except Exception as exc:
+        job.status = ReportJobStatus.FAILED
+        job.error = str(exc)
+    job.finished_at = timezone.now()
+    fields = ['result_file', 'status', 'progress', 'error', 'finished_at']
+    if not _owned(job).update(**{field: getattr(job, field) for field in fields}):
+        if job.result_file:
+            job.result_file.delete(save=False)
+        job.refresh_from_db()
+    return job
@@ -0,0 +1,158 @@
+"""reporting/tests/test_views.py"""
+import json
+import pytest
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from crm.models import Portfolio
+from rbac.models import Permission, Role
+from receivables.models import Debt, Term, TermStatus
+from reporting.models import ReportJob, ReportJobKind, ReportJobStatus
+from reporting.services import job_services
+from sales.models import CreditSale
+from users.models import User
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+@pytest.mark.django_db
+class TestAgingReportView:
+    def test_aging_buckets(self, api_client, new_user, new_customer, django_assert_num_queries):
+        """Test outstanding amounts are bucketed by days past due and grouped in one query."""
+        portfolio = Portfolio.objects.create(ref='PF_AGING', commercial=new_user)
+        sale = CreditSale.objects.create(
+            customer=new_customer, commercial=new_user, portfolio=portfolio, total_amount=Decimal('1000.00')
+        )
+        debt = Debt.objects.create(sale=sale, init_amount=Decimal('1000.00'), balance=Decimal('1000.00'))
+        today = date.today()
+        for days, amount, paid in [(10, '100.00', '40.00'), (45, '200.00', '0'), (100, '300.00', '0'), (-5, '50.00', '0')]:
+            Term.objects.create(
+                debt=debt, term_date=today - timedelta(days=days),
+                except_amount=Decimal(amount), pay_amount=Decimal(paid)
+            )
+        Term.objects.create(
+            debt=debt, term_date=today - timedelta(days=20), except_amount=Decimal('70.00'),
+            pay_amount=Decimal('70.00'), term_status=TermStatus.PAID
+        )
+
+        url = reverse('aging-report')
+        api_client.force_authenticate(user=new_user)
+        with django_assert_num_queries(1):
+            response = api_client.get(url, {'group_by': 'portfolio'})
+        assert response.status_code == 200
+        row = response.data['rows'][0]
+        assert (row['id'], row['label']) == (portfolio.id, 'PF_AGING')
+        assert row['not_due'] == Decimal('50.00')
+        assert row['days_0_30'] == Decimal('60.00')
+        assert row['days_31_60'] == Decimal('200.00')
+        assert row['days_61_90'] == Decimal('0')
+        assert row['days_90_plus'] == Decimal('300.00')
+        assert row['total_outstanding'] == Decimal('610.00') and row['terms_count'] == 4
+        assert response.data['totals'] == {key: row[key] for key in response.data['totals']}
+
+        assert api_client.get(url, {'group_by': 'vendor'}).status_code == 400
+
+    def test_aging_scope(self, api_client, new_user, new_customer, django_capture_on_commit_callbacks):
+        """Test a commercial only sees the receivables of their sales, with report.view."""
+        sale = CreditSale.objects.create(customer=new_customer, commercial=new_user, total_amount=Decimal('100.00'))
+        debt = Debt.objects.create(sale=sale, init_amount=Decimal('100.00'), balance=Decimal('100.00'))
+        Term.objects.create(debt=debt, term_date=date.today(), except_amount=Decimal('100.00'))
+        commercial = User.objects.create_user(username='aging_commercial', password='password123')
+        api_client.force_authenticate(user=commercial)
+        url = reverse('aging-report')
+
+        assert api_client.get(url).status_code == 403
+        with django_capture_on_commit_callbacks(execute=True):
+            role = Role.objects.create(name='Reporting')
+            role.permissions.add(Permission.objects.create(code='report.view', label='View receivables reports'))
+            commercial.roles.add(role)
+        response = api_client.get(url)
+        assert response.status_code == 200
+        assert response.data['rows'] == []
+
+
+@pytest.mark.django_db
+class TestReportJobViews:
+    def test_submit_process_and_download(self, api_client, new_user, new_customer, settings, tmp_path):
+        """Test jobs are queued, processed by the worker command and downloadable."""
+        settings.MEDIA_ROOT = tmp_path
+        sale = CreditSale.objects.create(customer=new_customer, commercial=new_user, total_amount=Decimal('100.00'))
+        debt = Debt.objects.create(sale=sale, init_amount=Decimal('100.00'), balance=Decimal('100.00'))
+        Term.objects.create(debt=debt, term_date=date.today() - timedelta(days=40), except_amount=Decimal('100.00'))
+        api_client.force_authenticate(user=new_user)
+
+        response = api_client.post(
+            reverse('report-job-list'), {'kind': 'aging', 'params': {'group_by': 'customer'}}, format='json'
+        )
+        assert response.status_code == 202
+        aging_id = response.data['id']
+        response = api_client.post(
+            reverse('report-job-list'),
+            {'kind': 'debts_export', 'params': {'filters': {'debt_status': 'ongoing'}}}, format='json'
+        )
+        export_id = response.data['id']
+        assert api_client.get(reverse('report-job-download', args=[export_id])).status_code == 409
+
+        out = StringIO()
+        call_command('run_report_worker', '--once', stdout=out)
+        assert "2 report jobs processed" in out.getvalue()
+
+        response = api_client.get(reverse('report-job-detail', args=[aging_id]))
+        assert (response.data['status'], response.data['progress']) == (ReportJobStatus.DONE, 100)
+        report = json.loads(b''.join(api_client.get(reverse('report-job-download', args=[aging_id])).streaming_content))
+        assert Decimal(report['rows'][0]['days_31_60']) == Decimal('100.00')
+
+        content = b''.join(api_client.get(reverse('report-job-download', args=[export_id])).streaming_content)
+        assert content.decode().splitlines()[1].startswith(f"{debt.id},{sale.id},")
+
+    def test_submit_requires_kind_permission(self, api_client, django_capture_on_commit_callbacks):
+        """Test a job needs the permission of the data it reads, and valid export filters."""
+        commercial = User.objects.create_user(username='job_commercial', password='password123')
+        role = Role.objects.create(name='Report jobs')
+        role.permissions.add(Permission.objects.create(code='report_job.create', label='Submit report jobs'))
+        commercial.roles.add(role)
+        api_client.force_authenticate(user=commercial)
+        url = reverse('report-job-list')
+
+        assert api_client.post(url, {'kind': 'debts_export', 'params': {}}, format='json').status_code == 403
+        with django_capture_on_commit_callbacks(execute=True):
+            role.permissions.add(Permission.objects.create(code='debt.list', label='List debts'))
+        response = api_client.post(
+            url, {'kind': 'debts_export', 'params': {'filters': {'min_date': 'bogus'}}}, format='json'
+        )
+        assert response.status_code == 400
+        assert 'min_date' in response.data['params']['filters']
+        assert api_client.post(url, {'kind': 'debts_export', 'params': {}}, format='json').status_code == 202
+        assert api_client.post(url, {'kind': 'aging', 'params': {}}, format='json').status_code == 403
+
+    def test_claim_skips_taken_jobs(self, new_user):
+        """Test a claimed job is not handed to another worker."""
+        job = job_services.submit_job(new_user, ReportJobKind.AGING)
+        assert job_services.claim_next_job('worker-1').pk == job.pk
+        assert job_services.claim_next_job('worker-2') is None
+        job.refresh_from_db()
+        assert (job.status, job.worker) == (ReportJobStatus.RUNNING, 'worker-1')
+
+    def test_stale_jobs_follow_the_heartbeat(self, new_user, settings, tmp_path):
+        """Test only jobs without a recent heartbeat are requeued, and their first worker's result is dropped."""
+        settings.MEDIA_ROOT = tmp_path
+        job = job_services.submit_job(new_user, ReportJobKind.AGING)
+        claimed = job_services.claim_next_job('worker-1')
+        long_ago = timezone.now() - timedelta(hours=3)
+        ReportJob.objects.filter(pk=job.pk).update(started_at=long_ago)
+        assert job_services.requeue_stale_jobs(timedelta(minutes=5)) == 0
+
+        ReportJob.objects.filter(pk=job.pk).update(heartbeat_at=long_ago)
+        assert job_services.requeue_stale_jobs(timedelta(minutes=5)) == 1
+        assert job_services.claim_next_job('worker-2').pk == job.pk
+
+        job_services.run_job(claimed)
+        job.refresh_from_db()
+        assert (job.status, job.worker) == (ReportJobStatus.RUNNING, 'worker-2')
+        assert not job.result_file
+        assert not list(tmp_path.rglob('*.json'))
@@ -0,0 +1,11 @@
+from django.urls import path
+from rest_framework.routers import DefaultRouter
+from .views import AgingReportView, ReportJobViewSet
+
+router = DefaultRouter()
+router.register(r'jobs', ReportJobViewSet, basename='report-job')
+
+urlpatterns = [
+    path('aging/', AgingReportView.as_view(), name='aging-report'),
+    *router.urls
+]
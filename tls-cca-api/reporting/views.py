@@ -1,3 +1,62 @@
-from django.shortcuts import render
+# reporting/views.py
+from django.http import FileResponse
+from rest_framework import views, status, mixins, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from drf_spectacular.utils import extend_schema
 
-# Create your views here.
+from rbac.services.permission_services import AutoPermissionMixin
+from .models import ReportJob, ReportJobStatus
+from .serializers import AgingReportQuerySerializer, ReportJobSerializer
+from .services import aging_services
+
+@extend_schema(tags=["Reports"])
+class AgingReportView(AutoPermissionMixin, views.APIView):
+    """
+    Receivables aging report: outstanding term amounts bucketed by days past due
+    (0-30, 31-60, 61-90, 90+), grouped by commercial, portfolio or customer.
+    Scoped like the dashboard: all receivables for admins, own receivables otherwise.
+    """
+    resource = "report"
+
+    @extend_schema(parameters=[AgingReportQuerySerializer], responses={200: dict})
+    def get(self, request):
+        serializer = AgingReportQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        report = aging_services.get_aging_report(request.user, **serializer.validated_data)
+        return Response(report, status=status.HTTP_200_OK)
+
+
+@extend_schema(tags=["Reports"])
+class ReportJobViewSet(AutoPermissionMixin, mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                       mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    Background reports: submit a job (202 Accepted), poll it until `status` is done,
+    then download its result file. Users only see the jobs they submitted.
+    """
+    queryset = ReportJob.objects.all()
+    resource = "report_job"
+    serializer_class = ReportJobSerializer
+    permission_code_map = {'download': 'view'}
+
+    def get_queryset(self):
+        user = self.request.user
+        if user.is_superuser:
+            return self.queryset
+        return self.queryset.filter(requested_by=user)
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
+    @extend_schema(responses={200: bytes})
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """
+        Downloads the result file of a finished job.
+        """
+        job = self.get_object()
+        if job.status != ReportJobStatus.DONE or not job.result_file:
+            return Response({"detail": "The report is not ready."}, status=status.HTTP_409_CONFLICT)
+        return FileResponse(job.result_file.open('rb'), as_attachment=True, filename=job.result_file.name.split('/')[-1])
@@ -37,6 +37,14 @@ class ChangeCreditSaleStatusSerializer(serializers.Serializer):
     status = serializers.ChoiceField(choices=CreditSaleStatus.choices)
 
 
+class BulkChangeCreditSaleStatusSerializer(serializers.Serializer):
+    """
+    Serializer for a batch status transition (e.g. month-end approvals).
+    """
+    sales = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=5000)
+    status = serializers.ChoiceField(choices=CreditSaleStatus.choices)
+
+
 class HistoricalCreditSaleSerializer(serializers.ModelSerializer, HistoricalChangesMixin):
     """
     Serializer for the CreditSale history model.
@@ -1,28 +1,148 @@
+from django.db import transaction
 from django.db.models import Q
+from simple_history.utils import bulk_create_with_history, bulk_update_with_history
 from sales.models import CreditSale, CreditSaleStatus
 from receivables.models import Debt, DebtStatus
+from receivables.services import term_services
+from core.services import search_index_services
+from core.services.kpi_services import apply_kpi_deltas, apply_kpi_delta_groups, kpi_day, kpi_delta_groups
+from core.services.stats_services import invalidate_stats_cache, invalidate_timelines_for_dates
+
+# Allowed status transitions of the bulk pipeline (current status -> new statuses)
+CREDIT_SALE_TRANSITIONS = {
+    CreditSaleStatus.PENDING_APPROVAL: {
+        CreditSaleStatus.APPROVED, CreditSaleStatus.REJECTED, CreditSaleStatus.CANCELLED
+    },
+    CreditSaleStatus.REJECTED: {CreditSaleStatus.PENDING_APPROVAL},
+    CreditSaleStatus.APPROVED: {CreditSaleStatus.CANCELLED},
+    CreditSaleStatus.CANCELLED: set(),
+}
 
 def update_credit_sale_status(sale, new_status):
     """
     Updates the status of a CreditSale.
-    If the status becomes APPROVED, automatically creates the associated Debt.
+    If the status becomes APPROVED, automatically creates the associated Debt
+    and its instalment schedule.
     """
     # If transitioning to APPROVED, create the Debt if it doesn't exist
     if new_status == CreditSaleStatus.APPROVED and sale.status != CreditSaleStatus.APPROVED:
         if not Debt.objects.filter(sale=sale).exists():
             debt_amount = sale.total_amount - sale.deposit
-            Debt.objects.create(
+            debt = Debt.objects.create(
                 sale=sale,
                 init_amount=debt_amount,
                 balance=debt_amount,
-                status=DebtStatus.NOT_STARTED,
+                debt_status=DebtStatus.NOT_STARTED,
                 regulation_mode="UNDEFINED" # Placeholder, needs to be defined later
             )
+            term_services.generate_schedules([debt])
 
+    approved_delta = int(new_status == CreditSaleStatus.APPROVED) - int(sale.status == CreditSaleStatus.APPROVED)
     sale.status = new_status
-    sale.save()
+    sale.save(update_fields=['status'])
+    apply_kpi_deltas(sale.commercial_id, sale.portfolio_id, kpi_day(sale.sale_date), approved_count=approved_delta)
     return sale
 
+def _new_debt(sale):
+    """Builds (without saving) the debt of an approved sale."""
+    debt_amount = sale.total_amount - sale.deposit
+    debt = Debt(
+        sale=sale,
+        init_amount=debt_amount,
+        balance=debt_amount,
+        debt_status=DebtStatus.NOT_STARTED,
+        regulation_mode="UNDEFINED" # Placeholder, needs to be defined later
+    )
+    # bulk_create bypasses Debt.save()
+    debt.due_date = debt.compute_due_date()
+    return debt
+
+def bulk_update_credit_sale_status(sale_ids, new_status, queryset=None, user=None):
+    """
+    Moves many credit sales to `new_status` within a single atomic transaction
+    (e.g. month-end approval runs).
+
+    The sales (restricted to `queryset`, e.g. the user's visible sales) are locked with
+    one query and each transition is checked against CREDIT_SALE_TRANSITIONS. The valid
+    ones are written with one bulk UPDATE; approved sales without a debt get theirs with
+    one bulk INSERT, and their schedules with another. Search documents and dashboard
+    figures are then refreshed with set-based statements, so the number of queries does
+    not depend on the batch size (only on its commercial/portfolio pairs).
+
+    Returns one result per requested id, in input order.
+    """
+    queryset = CreditSale.objects.all() if queryset is None else queryset
+    sale_ids = list(dict.fromkeys(sale_ids))
+    # Resolve the scope first: a DISTINCT scope cannot be locked directly
+    visible = set(queryset.filter(pk__in=sale_ids).values_list('pk', flat=True))
+    results = {}
+
+    with transaction.atomic():
+        # 1. Lock the sales in a consistent (primary key) order
+        sales = (
+            CreditSale.objects
+            .select_for_update()
+            .filter(pk__in=visible)
+            .order_by('pk')
+            .in_bulk()
+        )
+
+        # 2. Validate the transitions
+        changed = []
+        for sale_id in sale_ids:
+            sale = sales.get(sale_id)
+            if sale is None:
+                results[sale_id] = {'id': sale_id, 'error': "Credit sale not found."}
+            elif new_status == sale.status:
+                results[sale_id] = {'id': sale_id, 'status': sale.status, 'updated': False}
+            elif new_status not in CREDIT_SALE_TRANSITIONS.get(sale.status, ()):
+                results[sale_id] = {
+                    'id': sale_id,
+                    'error': f"Cannot change status from '{sale.status}' to '{new_status}'."
+                }
+            else:
+                results[sale_id] = {
+                    'id': sale_id, 'previous_status': sale.status, 'status': new_status, 'updated': True
+                }
+                changed.append(sale)
+
+        # 3. Create the missing debts (and their schedules) of approved sales
+        new_debts = []
+        if new_status == CreditSaleStatus.APPROVED and changed:
+            with_debt = set(
+                Debt.objects.filter(sale__in=[sale.pk for sale in changed]).values_list('sale_id', flat=True)
+            )
+            new_debts = [_new_debt(sale) for sale in changed if sale.pk not in with_debt]
+            if new_debts:
+                bulk_create_with_history(new_debts, Debt, default_user=user)
+                term_services.generate_schedules(new_debts, user=user)
+
+        # 4. Write the statuses back with one bulk UPDATE
+        kpi_deltas = kpi_delta_groups()
+        for sale in changed:
+            kpi_deltas[(sale.commercial_id, sale.portfolio_id, kpi_day(sale.sale_date))]['approved_count'] += (
+                int(new_status == CreditSaleStatus.APPROVED) - int(sale.status == CreditSaleStatus.APPROVED)
+            )
+            sale.status = new_status
+        if changed:
+            bulk_update_with_history(changed, CreditSale, ['status'], default_user=user)
+
+        # 5. Side effects normally run by the model signals
+        for debt in new_debts:
+            deltas = kpi_deltas[(debt.sale.commercial_id, debt.sale.portfolio_id, kpi_day(debt.sale.sale_date))]
+            deltas['initial_debt'] += debt.init_amount
+            deltas['balance'] += debt.balance
+            results[debt.sale_id]['debt'] = debt.pk
+        if changed:
+            search_index_services.index_sales([sale.pk for sale in changed])
+        if new_debts:
+            search_index_services.index_debts([debt.pk for debt in new_debts])
+            invalidate_stats_cache(Debt)
+            invalidate_timelines_for_dates(Debt, [debt.start_date for debt in new_debts])
+        apply_kpi_delta_groups(kpi_deltas)
+
+    return [results[sale_id] for sale_id in sale_ids]
+
 def get_sales_for_user(user):
     """
     Returns sales based on user role:
@@ -1,10 +1,13 @@
 """sales/tests/test_views.py"""
 import pytest
 from decimal import Decimal
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APIClient
-from sales.models import CreditSale
+from sales.models import CreditSale, CreditSaleStatus
 from crm.models import Portfolio
+from receivables.models import Debt, Term
 
 @pytest.fixture
 def api_client():
@@ -43,4 +46,60 @@ class TestCreditSaleViews:
         }
         response = api_client.post(url, data)
         assert response.status_code == 201
-        assert CreditSale.objects.count() >= 1
\ No newline at end of file
+        assert CreditSale.objects.count() >= 1
+
+    def test_bulk_change_status(self, api_client, new_user, new_customer):
+        """Test approving a batch of sales creates their debts and schedules, with per-sale results."""
+        portfolio = Portfolio.objects.create(ref='PF_BULK', commercial=new_user)
+        sales = [
+            CreditSale.objects.create(
+                customer=new_customer, commercial=new_user, portfolio=portfolio,
+                total_amount=Decimal('1000.00'), deposit=Decimal('100.00')
+            )
+            for _ in range(3)
+        ]
+        rejected = CreditSale.objects.create(
+            customer=new_customer, commercial=new_user, portfolio=portfolio,
+            total_amount=Decimal('500.00'), status=CreditSaleStatus.REJECTED
+        )
+
+        url = reverse('creditsale-bulk-change-status')
+        api_client.force_authenticate(user=new_user)
+        ids = [sale.pk for sale in sales] + [rejected.pk, 0]
+        response = api_client.post(url, {'sales': ids, 'status': 'approved'}, format='json')
+        assert response.status_code == 200
+        results = response.data['results']
+        assert [result['id'] for result in results] == ids
+        assert all(result['updated'] for result in results[:3])
+        assert 'error' in results[3] and 'error' in results[4]
+
+        assert CreditSale.objects.filter(status=CreditSaleStatus.APPROVED).count() == 3
+        assert Debt.objects.filter(init_amount=Decimal('900.00')).count() == 3
+        assert Term.objects.count() == 3
+        assert results[0]['debt'] == Debt.objects.get(sale=sales[0]).pk
+
+        # Replaying the batch changes nothing
+        response = api_client.post(url, {'sales': ids[:3], 'status': 'approved'}, format='json')
+        assert [result['updated'] for result in response.data['results']] == [False] * 3
+        assert Debt.objects.count() == 3
+
+    def test_bulk_change_status_query_count_is_constant(self, api_client, new_user, new_customer):
+        """Test the number of queries does not grow with the batch size."""
+        portfolio = Portfolio.objects.create(ref='PF_BULK_Q', commercial=new_user)
+        url = reverse('creditsale-bulk-change-status')
+        api_client.force_authenticate(user=new_user)
+
+        counts = []
+        for size in (2, 6):
+            ids = [
+                CreditSale.objects.create(
+                    customer=new_customer, commercial=new_user, portfolio=portfolio,
+                    total_amount=Decimal('100.00')
+                ).pk
+                for _ in range(size)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                response = api_client.post(url, {'sales': ids, 'status': 'approved'}, format='json')
+            assert response.status_code == 200
+            counts.append(len(queries))
+        assert counts[0] == counts[1]
@@ -6,6 +6,7 @@ from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 
 from rbac.services.permission_services import AutoPermissionMixin
+from core.mixins.history import HistoryArchiveMixin
 from .models import *
 from .serializers import *
 from .services import creditsale_services
@@ -20,9 +21,12 @@ class CreditSaleViewSet(AutoPermissionMixin, viewsets.ModelViewSet):
     serializer_class = CreditSaleSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = CreditSaleFilter
+    permission_code_map = {'bulk_change_status': 'update'}
 
     def get_queryset(self):
-        return creditsale_services.get_sales_for_user(self.request.user)
+        return creditsale_services.get_sales_for_user(self.request.user).select_related(
+            'customer', 'commercial', 'portfolio'
+        )
 
     @extend_schema(request=ChangeCreditSaleStatusSerializer, responses={200: None})
     @action(detail=True, methods=['post'], url_path='change-status')
@@ -34,6 +38,24 @@ class CreditSaleViewSet(AutoPermissionMixin, viewsets.ModelViewSet):
         creditsale_services.update_credit_sale_status(sale, serializer.validated_data['status'])
         return Response({'detail': 'Status updated successfully.'}, status=status.HTTP_200_OK)
 
+    @extend_schema(request=BulkChangeCreditSaleStatusSerializer, responses={200: dict})
+    @action(detail=False, methods=['post'], url_path='bulk-change-status')
+    def bulk_change_status(self, request):
+        """
+        Moves a batch of credit sales to a new status and returns one result per sale.
+        Approved sales get their debt and instalment schedule.
+        """
+        serializer = BulkChangeCreditSaleStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        results = creditsale_services.bulk_update_credit_sale_status(
+            serializer.validated_data['sales'],
+            serializer.validated_data['status'],
+            queryset=self.get_queryset(),
+            user=request.user,
+        )
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
     @action(detail=False, methods=['get'], url_path='list_all')
     def list_all(self, request):
         """
@@ -52,7 +74,7 @@ class CreditSaleViewSet(AutoPermissionMixin, viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 @extend_schema(tags=["Credit-Sales"])
-class CreditSaleHistoryViewSet(AutoPermissionMixin, viewsets.ReadOnlyModelViewSet):
+class CreditSaleHistoryViewSet(AutoPermissionMixin, HistoryArchiveMixin, viewsets.ReadOnlyModelViewSet):
     """
     
     """
@@ -4,4 +4,6 @@ class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
     def ready(self):
-        import users.signals
\ No newline at end of file
+        import users.signals
+        from users.services.token_services import check_token_permissions_settings
+        check_token_permissions_settings()
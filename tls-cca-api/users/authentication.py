@@ -0,0 +1,21 @@
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from rbac.services.permission_services import memoize_permission_codes
+from .services import token_services
+
+
+class PermissionClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that primes the user's permission codes from the token
+    claims (when present), so authorization checks don't hit the database.
+    The claims of tokens issued before a role, group or permission change are
+    ignored: the permissions are then resolved as for a token without claims.
+    """
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        codes = token_services.get_token_permission_codes(validated_token)
+        if codes is not None:
+            version = validated_token[token_services.PERMISSION_VERSION_CLAIM]
+            memoize_permission_codes(user, codes, version)
+        return user
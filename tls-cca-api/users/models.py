@@ -34,8 +34,13 @@ class User(AbstractUser):
         from rbac.services import permission_services
         return permission_services.get_user_permissions(self)
     
+    @property
+    def permission_codes(self) -> frozenset[str]:
+        from rbac.services import permission_services
+        return permission_services.get_user_permission_codes(self)
+
     def has_permission(self, code: str) -> bool:
-        return self.all_permissions.filter(code=code).exists()
+        return code in self.permission_codes
     
     def __str__(self):
         return f"{self.first_name} {self.last_name} {self.username}"
@@ -4,12 +4,17 @@
 # - Defining the structure of data exposed or expected by the API
 import json
 from rest_framework import serializers
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.tokens import RefreshToken, AccessToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.exceptions import InvalidToken
 from .models import User
 from django.contrib.auth.password_validation import validate_password
-from .services import user_services
+from .services import user_services, token_services
 from rbac.models import Group, Role
 from drf_spectacular.utils import extend_schema_field
+from core.mixins.serializers import HistoricalChangesMixin
+from core.services import history_services
 
 # Show the User model without exposing the password field
 class UserSerializer(serializers.ModelSerializer):
@@ -100,6 +105,35 @@ class ResetPasswordSerializer(serializers.Serializer):
         return data
 
 
+# --- JWT Serializers ---
+# When RBAC_TOKEN_PERMISSIONS is enabled, the access token carries the user's
+# permission codes and the RBAC version they were resolved at. Claims older than the
+# current version are ignored (permissions resolved from the database), not rejected.
+class PermissionTokenObtainPairSerializer(TokenObtainPairSerializer):
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        if token_services.is_token_permissions_enabled():
+            access = AccessToken(data['access'])
+            token_services.add_permission_claims(access, self.user)
+            data['access'] = str(access)
+        return data
+
+class PermissionTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        # A refresh token can outlive its user (SimpleJWT's own lookup lets it through)
+        try:
+            data = super().validate(attrs)
+            if token_services.is_token_permissions_enabled():
+                access = AccessToken(data['access'])
+                user = User.objects.get(**{api_settings.USER_ID_FIELD: access[api_settings.USER_ID_CLAIM]})
+                # Permissions are resolved again, so a refresh picks up RBAC changes
+                token_services.add_permission_claims(access, user)
+                data['access'] = str(access)
+        except User.DoesNotExist:
+            raise InvalidToken({"detail": "User not found.", "code": "user_not_found"})
+        return data
+
+
 # Serializer for the logout endpoint to ensure refresh token is provided
 class LogoutSerializer(serializers.Serializer):
     refresh = serializers.CharField()
@@ -121,7 +155,7 @@ class LogoutSerializer(serializers.Serializer):
 
 
 # Serializer for the historical records of the User model
-class HistoricalUserSerializer(serializers.ModelSerializer):
+class HistoricalUserSerializer(serializers.ModelSerializer, HistoricalChangesMixin):
     # The user who made the change, represented by their username for clarity.
     history_user = serializers.StringRelatedField()
     # Add a human-readable field for the history type (+, ~, -)
@@ -149,8 +183,9 @@ class HistoricalUserSerializer(serializers.ModelSerializer):
         
     @extend_schema_field(serializers.ListField(child=serializers.DictField()))
     def get_changes(self, obj):
-        if obj.history_type == '~' and obj.prev_record:
-            delta = obj.diff_against(obj.prev_record)
+        prev_record = history_services.get_prev_record(obj) if obj.history_type == '~' else None
+        if prev_record is not None:
+            delta = obj.diff_against(prev_record)
             changes_list = []
             for change in delta.changes:
                 if change.field == 'date_joined':
@@ -0,0 +1,76 @@
+from collections import defaultdict
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from rbac.services.permission_services import (
+    get_permission_cache_version,
+    get_user_permission_codes,
+)
+
+PERMISSIONS_CLAIM = 'perms'
+PERMISSION_VERSION_CLAIM = 'perm_ver'
+
+
+# Cache backends whose entries are private to a process: the RBAC version bumped by
+# one worker would not be seen by the others, which would keep accepting stale claims
+NON_SHARED_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def is_token_permissions_enabled() -> bool:
+    """Returns True when access tokens must carry the user's permission codes."""
+    return getattr(settings, 'RBAC_TOKEN_PERMISSIONS', False)
+
+
+def check_token_permissions_settings():
+    """Refuses RBAC_TOKEN_PERMISSIONS without a cache shared by all the processes."""
+    backend = settings.CACHES['default']['BACKEND']
+    if is_token_permissions_enabled() and backend in NON_SHARED_CACHE_BACKENDS:
+        raise ImproperlyConfigured(
+            f"RBAC_TOKEN_PERMISSIONS requires a cache shared by all processes (e.g. Redis), not {backend}."
+        )
+
+
+def encode_permission_codes(codes) -> dict[str, str]:
+    """
+    Encodes permission codes compactly by grouping actions per resource.
+    Example: {"debt.list", "debt.view"} -> {"debt": "list view"}
+    """
+    grouped = defaultdict(list)
+    for code in sorted(codes):
+        resource, _, action = code.rpartition('.')
+        grouped[resource].append(action)
+    return {resource: ' '.join(actions) for resource, actions in grouped.items()}
+
+
+def decode_permission_codes(claim: dict[str, str]) -> frozenset[str]:
+    """Reverses `encode_permission_codes`."""
+    return frozenset(
+        f"{resource}.{action}" if resource else action
+        for resource, actions in claim.items()
+        for action in actions.split()
+    )
+
+
+def add_permission_claims(token, user):
+    """
+    Stamps the user's permission codes and the current RBAC version on a token.
+    """
+    token[PERMISSIONS_CLAIM] = encode_permission_codes(get_user_permission_codes(user))
+    token[PERMISSION_VERSION_CLAIM] = get_permission_cache_version()
+    return token
+
+
+def get_token_permission_codes(token) -> frozenset[str] | None:
+    """
+    Returns the permission codes carried by a token, or None if the token has none
+    or if roles, groups or permissions changed since it was issued: the caller then
+    resolves them from the database (and cache), like for a token without claims.
+    """
+    if PERMISSION_VERSION_CLAIM not in token:
+        return None
+    if token[PERMISSION_VERSION_CLAIM] != get_permission_cache_version():
+        return None
+    return decode_permission_codes(token.get(PERMISSIONS_CLAIM, {}))
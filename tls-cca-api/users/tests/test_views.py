@@ -2,7 +2,8 @@
 import pytest
 from django.urls import reverse
 from rest_framework.test import APIClient
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.tokens import RefreshToken, AccessToken
+from rbac.models import Permission, Role
 from users.models import User, OTP
 from users.tests.factories import UserFactory
 
@@ -50,6 +51,38 @@ class TestAuthViews:
         assert 'access' in response.data
         assert 'refresh' in response.data
 
+    def test_token_permissions_mode(self, api_client, user, settings, django_capture_on_commit_callbacks):
+        settings.RBAC_TOKEN_PERMISSIONS = True
+        permission = Permission.objects.create(code='user.view', label='View a user')
+        role = Role.objects.create(name='VIEWER')
+        role.permissions.add(permission)
+        user.roles.add(role)
+
+        response = api_client.post(reverse('token_obtain_pair'), {'username': user.username, 'password': 'password123'})
+        assert AccessToken(response.data['access'])['perms'] == {'user': 'view'}
+        refresh = response.data['refresh']
+
+        url = reverse('user-rud', kwargs={'pk': user.pk})
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        assert api_client.get(url).status_code == 200
+
+        # A role change makes the embedded permissions stale: resolved from the database
+        with django_capture_on_commit_callbacks(execute=True):
+            role.permissions.remove(permission)
+        assert api_client.get(url).status_code == 403
+
+        response = api_client.post(reverse('token_refresh'), {'refresh': refresh})
+        assert response.status_code == 200
+        refresh = response.data.get('refresh', refresh)
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        assert api_client.get(url).status_code == 403
+
+        # A refresh token outliving its user is rejected, not a server error
+        api_client.credentials()
+        user.delete()
+        response = api_client.post(reverse('token_refresh'), {'refresh': refresh})
+        assert response.status_code == 401
+
 @pytest.mark.django_db
 class TestUserViews:
     def test_get_user_detail_authenticated(self, api_client, user):
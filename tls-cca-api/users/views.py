@@ -7,6 +7,7 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from rbac.services.permission_services import AutoPermissionMixin
+from core.mixins.history import HistoryArchiveMixin
 from .models import User
 from .serializers import *
 from .services import otp_services, user_services
@@ -93,17 +94,18 @@ class LogoutView(AutoPermissionMixin, generics.GenericAPIView):
 
 # ----- Historical Read -----
 @extend_schema(tags=["Users"])
-class UserHistoryListView(AutoPermissionMixin, generics.ListAPIView):
+class UserHistoryListView(AutoPermissionMixin, HistoryArchiveMixin, generics.ListAPIView):
     # Retrieves the change history for a specific user.
     serializer_class = HistoricalUserSerializer
     resource = "user_history"
+    history_object_kwarg = 'pk'
 
     def get_queryset(self):
         user_pk = self.kwargs['pk']
         return User.history.filter(id=user_pk).order_by('-history_date')
 
 @extend_schema_view(get=extend_schema(operation_id="all_user_history", tags=["Users"]))
-class AllUserHistoryListView(AutoPermissionMixin, generics.ListAPIView):
+class AllUserHistoryListView(AutoPermissionMixin, HistoryArchiveMixin, generics.ListAPIView):
     """
     Retrieves the complete change history for all users, ordered by most recent first.
     This provides a full audit trail for the system.